@@ -0,0 +1,264 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import contextlib
+import http.client
+from urllib.parse import quote, urlsplit
+
+from bench_results import summarize_seconds, write_results
+from generate_data import generate_dataset
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def build_snapshot(json_folder, snapshot_path):
+    """Clean the JSON exports and write the DuckDB snapshot the API serves from, without AWS access."""
+    sys.path.append(os.path.join(BENCHMARKS_DIR, "..", "load_to_redshift_script"))
+    from load_json_to_redshift import run_load_pipeline
+
+    run_load_pipeline(json_folder, ["users", "chargers", "transactions"], skip_load=True, snapshot_path=snapshot_path)
+
+
+def sample_ids(snapshot_path):
+    """Users, chargers and transaction months to build requests from, read from the snapshot."""
+    import duckdb
+
+    connection = duckdb.connect(snapshot_path, read_only=True)
+    try:
+        users = connection.execute("SELECT user_id, last_name FROM users ORDER BY user_id LIMIT 10000").fetchall()
+        chargers = connection.execute(
+            "SELECT charger_id, location_lat, location_lon FROM chargers WHERE location_lat IS NOT NULL"
+        ).fetchall()
+        months = [row[0] for row in connection.execute(
+            "SELECT DISTINCT date_trunc('month', start_time) FROM transactions WHERE start_time IS NOT NULL ORDER BY 1"
+        ).fetchall()]
+    finally:
+        connection.close()
+    return users, chargers, months
+
+
+def build_scenarios(users, chargers, months):
+    """
+    One request generator per endpoint, named after what it exercises.
+
+    Each generator takes a `random.Random` and returns `(method, path, body)`.
+    Parameters are drawn from the sampled ids, so the result caches are warm for
+    popular requests but not for all of them, as with real traffic.
+    """
+    charger_ids = [row[0] for row in chargers]
+    user_ids = [row[0] for row in users]
+    last_names = sorted({row[1].split()[-1][:4] for row in users if row[1]})
+
+    def point(rng):
+        _, lat, lon = rng.choice(chargers)
+        return {"lat": round(lat + rng.uniform(-0.02, 0.02), 5), "lon": round(lon + rng.uniform(-0.02, 0.02), 5)}
+
+    def month_range(rng):
+        start = rng.choice(months)
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        return f"start_datetime={start.isoformat()}&end_datetime={end.isoformat()}"
+
+    def get(path):
+        return "GET", path, None
+
+    return {
+        "users": lambda rng: get("/users?limit=100"),
+        "users_by_id": lambda rng: get(f"/users?user_id={rng.choice(user_ids)}"),
+        "users_search": lambda rng: get(f"/users?last_name={quote(rng.choice(last_names))}&limit=100"),
+        "users_ndjson": lambda rng: get("/users?format=ndjson&limit=1000"),
+        "users_lookup": lambda rng: ("POST", "/users/lookup", {"ids": rng.sample(user_ids, min(1000, len(user_ids)))}),
+        "chargers": lambda rng: get("/chargers"),
+        "chargers_by_city": lambda rng: get(f"/chargers?city={rng.choice(['zur', 'bern', 'gallen'])}"),
+        "chargers_lookup": lambda rng: (
+            "POST", "/chargers/lookup", {"ids": rng.sample(charger_ids, min(100, len(charger_ids)))}
+        ),
+        "chargers_nearby": lambda rng: get("/chargers/nearby?{}&k=5".format(
+            "&".join(f"{name}={value}" for name, value in point(rng).items())
+        )),
+        "chargers_nearby_batch": lambda rng: (
+            "POST", "/chargers/nearby/batch", {"points": [point(rng) for _ in range(20)], "k": 5}
+        ),
+        "usage_analytics": lambda rng: get(f"/chargers/{rng.choice(charger_ids)}/usage-analytics"),
+        "usage_analytics_range": lambda rng: get(
+            f"/chargers/{rng.choice(charger_ids)}/usage-analytics?{month_range(rng)}&status=completed"
+        ),
+        "usage_analytics_approx": lambda rng: get(
+            f"/chargers/{rng.choice(charger_ids)}/usage-analytics?approx=true&quantiles=0.5,0.9,0.99"
+        ),
+        "usage_analytics_batch": lambda rng: get(
+            "/chargers/usage-analytics?charger_ids=" + ",".join(rng.sample(charger_ids, min(10, len(charger_ids))))
+        ),
+        "usage_timeseries": lambda rng: get(
+            f"/chargers/{rng.choice(charger_ids)}/usage-timeseries?bucket=day&tz=Europe/Zurich"
+        ),
+        "transactions": lambda rng: get("/transactions-extended?limit=100"),
+        "transactions_by_charger": lambda rng: get(f"/transactions-extended?charger_id={rng.choice(charger_ids)}&limit=100"),
+        "transactions_sorted": lambda rng: get(
+            f"/transactions-extended?min_kwh={rng.randint(1, 40)}&sort=-amount&fields=session_id,amount&limit=100"
+        ),
+        "transactions_csv": lambda rng: get(f"/transactions-extended?format=csv&charger_id={rng.choice(charger_ids)}")
+    }
+
+
+def send_request(host, port, method, path, body, timeout):
+    """Send one request on a new connection; returns `(status, body_bytes)`."""
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        connection.request(method, path, payload, headers)
+        response = connection.getresponse()
+        return response.status, len(response.read())
+    finally:
+        connection.close()
+
+
+def load_test(host, port, scenario, duration, concurrency, seed, timeout=30):
+    """
+    Send requests of one scenario from `concurrency` client threads for `duration` seconds.
+
+    Every client waits for its response before sending the next request (a closed
+    loop), so throughput is what the server sustains at that concurrency.
+    """
+    latencies = []
+    statuses = {}
+    errors = []
+    response_bytes = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(number):
+        rng = random.Random(seed * 1000 + number)
+        while time.perf_counter() < deadline:
+            method, path, body = scenario(rng)
+            started = time.perf_counter()
+            try:
+                status, size = send_request(host, port, method, path, body, timeout)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                response_bytes.append(size)
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(number,)) for number in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    failed = len(errors) + sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        "requests": len(latencies) + len(errors),
+        "errors": failed,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "error_samples": errors[:5],
+        "duration_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency": summarize_seconds(latencies),
+        "mean_response_bytes": round(sum(response_bytes) / len(response_bytes)) if response_bytes else None
+    }
+
+
+def configure_api(snapshot_path, load_version_dir):
+    """Point the API at the snapshot; must run before the loader or the API modules are imported."""
+    os.environ["API_BACKEND"] = "duckdb"
+    os.environ["DUCKDB_SNAPSHOT_PATH"] = snapshot_path
+    os.environ["LOAD_VERSION_DIR"] = load_version_dir
+
+
+@contextlib.contextmanager
+def serve_app():
+    """Serve the Flask app with werkzeug's threaded server, configured by `configure_api`; yields `(host, port)`."""
+    sys.path.append(os.path.join(BENCHMARKS_DIR, "..", "src"))
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    # One access log line per request would cost the server more than some endpoints do
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "127.0.0.1", server.server_port
+    finally:
+        server.shutdown()
+        thread.join()
+
+
+def run_api_benchmark(host, port, scenarios, duration, concurrency, warmup, seed):
+    results = []
+    print(f"Endpoint load test ({concurrency} clients, {duration}s per endpoint):")
+    for name, scenario in scenarios.items():
+        # Warm up caches and lazily built indexes; the API logs every query on stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            if warmup:
+                load_test(host, port, scenario, warmup, concurrency, seed + 1)
+            result = load_test(host, port, scenario, duration, concurrency, seed)
+        result["endpoint"] = name
+        results.append(result)
+        print(
+            f"  {name:<24} {result['throughput_rps'] or 0:9.1f} req/s  p50 {result['latency'].get('p50_ms', 0):8.2f}ms  "
+            f"p99 {result['latency'].get('p99_ms', 0):8.2f}ms  errors {result['errors']}"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test every API endpoint against a local DuckDB snapshot.")
+    parser.add_argument("--snapshot", help="Existing DuckDB snapshot to serve; built from --json-folder or generated data if omitted.")
+    parser.add_argument("--json-folder", help="JSON exports to build the snapshot from.")
+    parser.add_argument("--sessions", type=int, default=100_000, help="Sessions to generate when neither --snapshot nor --json-folder is given.")
+    parser.add_argument("--url", help="Benchmark an already running server (e.g. http://127.0.0.1:8000) instead of starting one; requests are still built from the snapshot.")
+    parser.add_argument("--endpoints", nargs="+", help="Only these scenarios (default: all).")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load per endpoint.")
+    parser.add_argument("--warmup", type=float, default=2, help="Seconds of unmeasured load per endpoint first.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="api_benchmark.json", help="Path of the JSON results.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        snapshot_path = args.snapshot or os.path.join(work_folder, "snapshot.duckdb")
+        configure_api(snapshot_path, os.path.join(work_folder, "load_versions"))
+        parameters = {"duration": args.duration, "warmup": args.warmup, "concurrency": args.concurrency, "seed": args.seed}
+        if not args.snapshot:
+            json_folder = args.json_folder
+            if not json_folder:
+                json_folder = os.path.join(work_folder, "data")
+                generate_dataset(json_folder, args.sessions, seed=args.seed)
+                parameters["sessions"] = args.sessions
+            with contextlib.redirect_stdout(io.StringIO()):
+                build_snapshot(json_folder, snapshot_path)
+
+        scenarios = build_scenarios(*sample_ids(snapshot_path))
+        if args.endpoints:
+            unknown = set(args.endpoints) - set(scenarios)
+            if unknown:
+                parser.error(f"unknown endpoints {sorted(unknown)}; choose from {sorted(scenarios)}")
+            scenarios = {name: scenarios[name] for name in args.endpoints}
+        parameters["endpoints"] = list(scenarios)
+
+        if args.url:
+            url = urlsplit(args.url)
+            parameters["url"] = args.url
+            results = run_api_benchmark(url.hostname, url.port or 80, scenarios, args.duration, args.concurrency, args.warmup, args.seed)
+        else:
+            with serve_app() as (host, port):
+                results = run_api_benchmark(host, port, scenarios, args.duration, args.concurrency, args.warmup, args.seed)
+    write_results("api", parameters, results, args.output)
@@ -0,0 +1,56 @@
+import os
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+def summarize_seconds(samples):
+    """Count, mean and percentiles of a list of durations in seconds, reported in milliseconds."""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples, dtype=float) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "min_ms": round(float(values.min()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p90_ms": round(float(np.percentile(values, 90)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3)
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(benchmark, parameters, results, path):
+    """
+    Write one benchmark run as JSON: what ran, on which commit and machine, and its results.
+
+    Runs of the same benchmark and `parameters` on different commits can be
+    compared result by result to track throughput and latency across releases.
+    """
+    report = {
+        "benchmark": benchmark,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "parameters": parameters,
+        "results": results
+    }
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Benchmark results written to {path}")
+    return report
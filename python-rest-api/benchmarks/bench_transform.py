@@ -0,0 +1,134 @@
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+
+import pandas as pd
+
+from bench_results import summarize_seconds, write_results
+from generate_data import generate_dataset
+
+# The loader is a script directory rather than a package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load_to_redshift_script"))
+import load_json_to_redshift as loader
+
+
+def table_stages(table_name, json_folder, output_folder):
+    """
+    The stages of `transform_json_to_csv` for one table, in order, as `(stage, run)` pairs.
+
+    `run` takes the previous stage's DataFrame (None for the first) and returns
+    its own, or the number of rows written for stages that only write files.
+    """
+    fields = loader.TABLE_FIELDS[table_name]
+    csv_path = os.path.join(output_folder, f"{table_name}.csv")
+
+    def parse(_):
+        if table_name == "chargers":
+            return loader.parse_chargers(json_folder, fields)
+        data = []
+        if table_name == "users":
+            loader.parse_users(json_folder, fields, data)
+        else:
+            loader.parse_transactions_and_payments(json_folder, fields, data)
+        return pd.DataFrame(data)
+
+    def timestamps(df):
+        loader.transform_time_field(df)
+        return df
+
+    def dedup(df):
+        loader.remove_duplicates(df)
+        return df
+
+    def validate_ids(df):
+        loader.validate_unique_primary_ids(table_name, df)
+        return df
+
+    def write_csv(df):
+        df.to_csv(csv_path, index=False, date_format=loader.TIMESTAMP_FORMAT)
+        return df
+
+    stages = [("parse", parse)]
+    if table_name == "users":
+        stages.append(("split names", loader.split_name_into_first_and_last_name))
+    stages += [("timestamps", timestamps), ("dedup", dedup), ("validate ids", validate_ids)]
+    if table_name == "chargers":
+        stages.append(("clean cities", loader.clean_city_names))
+    stages.append(("write csv", write_csv))
+    if table_name == "transactions":
+        stream_path = os.path.join(output_folder, "transactions_streamed.csv")
+        rollup_path = os.path.join(output_folder, f"{loader.ROLLUP_TABLE}.csv")
+        stages.append(("stream", lambda _: loader.stream_transactions_to_csv(json_folder, stream_path, fields)))
+        stages.append(("rollup", lambda _: loader.build_charger_daily_usage(csv_path, rollup_path)))
+    return stages
+
+
+def bench_table(table_name, json_folder, output_folder, repeats):
+    """
+    Time every transform stage of a table `repeats` times.
+
+    Each repeat gets a fresh copy of the previous stage's output, so in-place
+    stages see the same input every time; the copy is not timed.
+    """
+    results = []
+    df = None
+    for stage, run in table_stages(table_name, json_folder, output_folder):
+        samples = []
+        for _ in range(repeats):
+            stage_input = df.copy() if isinstance(df, pd.DataFrame) else None
+            started = time.perf_counter()
+            # The loader reports every step on stdout
+            with contextlib.redirect_stdout(io.StringIO()):
+                output = run(stage_input)
+            samples.append(time.perf_counter() - started)
+        rows_in = len(stage_input) if stage_input is not None else None
+        rows_out = len(output) if isinstance(output, pd.DataFrame) else output
+        if isinstance(output, pd.DataFrame):
+            df = output
+        median = sorted(samples)[len(samples) // 2]
+        result = {
+            "table": table_name,
+            "stage": stage,
+            "rows_in": rows_in,
+            "rows_out": rows_out,
+            "latency": summarize_seconds(samples),
+            "rows_per_second": round((rows_in or rows_out or 0) / median, 1) if median else None
+        }
+        print(
+            f"  {table_name:<14} {stage:<13} {result['latency']['p50_ms']:10.2f}ms "
+            f"{result['rows_per_second'] or 0:14,.0f} rows/s"
+        )
+        results.append(result)
+    return results
+
+
+def run_transform_benchmark(json_folder, tables, repeats):
+    print(f"Transform stage timings ({repeats} repeats, median):")
+    with tempfile.TemporaryDirectory() as output_folder:
+        return [result for table_name in tables for result in bench_table(table_name, json_folder, output_folder, repeats)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark every stage of the loader's JSON to CSV transform.")
+    parser.add_argument("--json-folder", help="Folder with the JSON exports; generated into a temporary folder if omitted.")
+    parser.add_argument("--sessions", type=int, default=100_000, help="Sessions to generate when no --json-folder is given.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tables", nargs="+", default=["users", "chargers", "transactions"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default="transform_benchmark.json", help="Path of the JSON results.")
+    args = parser.parse_args()
+
+    parameters = {"tables": args.tables, "repeats": args.repeats}
+    if args.json_folder:
+        parameters["json_folder"] = args.json_folder
+        results = run_transform_benchmark(args.json_folder, args.tables, args.repeats)
+    else:
+        parameters.update(sessions=args.sessions, seed=args.seed)
+        with tempfile.TemporaryDirectory() as json_folder:
+            generate_dataset(json_folder, args.sessions, seed=args.seed)
+            results = run_transform_benchmark(json_folder, args.tables, args.repeats)
+    write_results("transform", parameters, results, args.output)
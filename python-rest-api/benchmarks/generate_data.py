@@ -0,0 +1,248 @@
+import os
+import json
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Records generated and written per batch; bounds the generator's memory at any scale
+GENERATOR_CHUNK_SIZE = int(os.getenv("GENERATOR_CHUNK_SIZE", 100_000))
+
+FIRST_NAMES = ["Anna", "Lea", "Mathew", "John", "Laura", "Noah", "Mia", "Luca", "Elena", "David", "Sara", "Jonas"]
+LAST_NAMES = ["Doe", "Muster", "Meier", "Keller", "Brunner", "Perry von Smith", "Schmid", "Weber", "De la Cruz"]
+NAME_PREFIXES = ["Mr.", "Mrs.", "Ms.", "Dr.", "Prof."]
+NAME_SUFFIXES = ["Jr.", "PhD", "MD", "III"]
+TIERS = ["basic", "silver", "gold"]
+# Canonical city, its spellings in the exports and its centre
+CITIES = [
+    ("Zurich", ["Zurich", "Zuerich", "Zürich"], 47.3769, 8.5417),
+    ("St. Gallen", ["St. Gallen", "Sankt Gallen"], 47.4245, 9.3767),
+    ("Bern", ["Bern"], 46.9480, 7.4474),
+    ("Basel", ["Basel"], 47.5596, 7.5886),
+    ("Lausanne", ["Lausanne"], 46.5197, 6.6323)
+]
+PAYMENT_METHODS = ["card", "card", "card", "app", "invoice"]
+CHARGER_POWER_KW = [3.7, 7.4, 11.0, 22.0, 50.0]
+
+
+def _timestamp_formats(rng, seconds, dirty_fraction):
+    """
+    Format epoch seconds as ISO strings in UTC, with a `dirty_fraction` missing, empty or not a timestamp.
+
+    The loader coerces those to NULL. The first value of a batch stays clean, as
+    pandas infers the format of a column from it. Other offsets are left out: the
+    loader expects one zone per column.
+    """
+    values = [datetime.fromtimestamp(int(second), timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ") for second in seconds]
+    for index in np.flatnonzero(rng.random(len(values)) < dirty_fraction):
+        if index > 0:
+            values[index] = [None, "", "not a timestamp"][rng.integers(3)]
+    return values
+
+
+def _skewed_ids(rng, prefix, count, size):
+    """Draw `size` ids out of `count`, the low ids far more often, like regular users and busy chargers."""
+    return [f"{prefix}{index}" for index in (count * rng.random(size) ** 2).astype(np.int64)]
+
+
+class JsonArrayWriter:
+    """Write a JSON array one batch of records at a time, so the file never has to fit in memory."""
+
+    def __init__(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+        self.file.write("[")
+        self.count = 0
+
+    def write(self, records):
+        if not records:
+            return
+        self.file.write(("\n" if self.count == 0 else ",\n") + ",\n".join(map(json.dumps, records)))
+        self.count += len(records)
+
+    def close(self):
+        self.file.write("\n]\n")
+        self.file.close()
+
+
+def generate_users(rng, path, count, dirty_fraction):
+    """
+    Write `count` users, plus exact duplicates of a `dirty_fraction` of them.
+
+    Names carry honorifics and post-nominals, repeated or odd whitespace, single
+    words, or are missing, as the loader's name splitting expects.
+    """
+    writer = JsonArrayWriter(path)
+    start = datetime(2022, 1, 1, tzinfo=timezone.utc).timestamp()
+    for offset in range(0, count, GENERATOR_CHUNK_SIZE):
+        size = min(GENERATOR_CHUNK_SIZE, count - offset)
+        first = rng.choice(FIRST_NAMES, size)
+        last = rng.choice(LAST_NAMES, size)
+        created = _timestamp_formats(rng, start + rng.integers(0, 3 * 365 * 86400, size), dirty_fraction)
+        tiers = rng.choice(TIERS, size, p=[0.6, 0.3, 0.1])
+        dirty = rng.random(size) < dirty_fraction * 5
+        records = []
+        for i in range(size):
+            user_id = offset + i
+            name = f"{first[i]} {last[i]}"
+            if dirty[i]:
+                shape = rng.integers(5)
+                if shape == 0:
+                    name = f"{rng.choice(NAME_PREFIXES)} {name}"
+                elif shape == 1:
+                    name = f"{name} {rng.choice(NAME_SUFFIXES)}"
+                elif shape == 2:
+                    name = f"  {first[i]}\t {last[i]} "
+                elif shape == 3:
+                    name = first[i]
+                else:
+                    name = None
+            record = {
+                "user_id": f"u{user_id}",
+                "name": name,
+                "email": f"{first[i].lower()}.{user_id}@example.ch",
+                "tier": tiers[i],
+                "created_at": created[i]
+            }
+            if dirty[i] and rng.random() < 0.1:
+                del record["tier"]  # Missing fields become NULL
+            records.append(record)
+        records.extend([records[i] for i in np.flatnonzero(rng.random(size) < dirty_fraction)])
+        writer.write(records)
+    writer.close()
+    return writer.count
+
+
+def generate_chargers(rng, path, count, dirty_fraction):
+    """
+    Write `count` chargers around a few Swiss cities.
+
+    A `dirty_fraction` uses another spelling of the city, has coordinates out of
+    range or far from any city (z-score outliers), lacks a location, or is an
+    exact duplicate.
+    """
+    writer = JsonArrayWriter(path)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp()
+    for offset in range(0, count, GENERATOR_CHUNK_SIZE):
+        size = min(GENERATOR_CHUNK_SIZE, count - offset)
+        cities = rng.integers(len(CITIES), size=size)
+        lat_noise, lon_noise = rng.normal(0, 0.05, size), rng.normal(0, 0.05, size)
+        installed = _timestamp_formats(rng, start + rng.integers(0, 4 * 365 * 86400, size), dirty_fraction)
+        dirty = rng.random(size) < dirty_fraction
+        records = []
+        for i in range(size):
+            _, spellings, lat, lon = CITIES[cities[i]]
+            record = {
+                "charger_id": f"c{offset + i}",
+                "city": spellings[rng.integers(len(spellings))],
+                "location": {"lat": round(lat + lat_noise[i], 6), "lon": round(lon + lon_noise[i], 6)},
+                "installed_at": installed[i]
+            }
+            if dirty[i]:
+                shape = rng.integers(3)
+                if shape == 0:
+                    record["location"] = {"lat": 95.0, "lon": lon}
+                elif shape == 1:
+                    record["location"] = {"lat": 10.0, "lon": 8.0}
+                else:
+                    del record["location"]
+            records.append(record)
+        records.extend([records[i] for i in np.flatnonzero(rng.random(size) < dirty_fraction)])
+        writer.write(records)
+    writer.close()
+    return writer.count
+
+
+def generate_sessions(rng, transactions_path, payments_path, count, users, chargers, dirty_fraction, days):
+    """
+    Write `count` charging sessions over `days` days and the payments of the completed ones.
+
+    Users and chargers are drawn with a skew, so a few are much busier. About a
+    tenth of the sessions fail; most of those have no end_time and no payment.
+    A `dirty_fraction` of the sessions is repeated as an exact duplicate, has an
+    unparsable timestamp, no kWh, or no payment.
+    """
+    transactions = JsonArrayWriter(transactions_path)
+    payments = JsonArrayWriter(payments_path)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+    for offset in range(0, count, GENERATOR_CHUNK_SIZE):
+        size = min(GENERATOR_CHUNK_SIZE, count - offset)
+        user_ids = _skewed_ids(rng, "u", users, size)
+        charger_ids = _skewed_ids(rng, "c", chargers, size)
+        starts = start + rng.integers(0, days * 86400, size)
+        durations = np.clip(rng.lognormal(np.log(5400), 0.7, size), 300, 12 * 3600).astype(np.int64)
+        power = rng.choice(CHARGER_POWER_KW, size)
+        kwh = np.round(durations / 3600 * power * rng.uniform(0.3, 0.9, size), 2)
+        failed = rng.random(size) < 0.1
+        start_times = _timestamp_formats(rng, starts, dirty_fraction)
+        end_times = _timestamp_formats(rng, starts + durations, dirty_fraction)
+        methods = rng.choice(PAYMENT_METHODS, size)
+        dirty = rng.random(size) < dirty_fraction
+        session_records, payment_records = [], []
+        for i in range(size):
+            session_id = f"s{offset + i}"
+            record = {
+                "session_id": session_id,
+                "user_id": user_ids[i],
+                "charger_id": charger_ids[i],
+                "start_time": start_times[i],
+                "end_time": end_times[i],
+                "kWh_consumed": float(kwh[i]),
+                "status": "completed",
+                "payment_method": methods[i]
+            }
+            if failed[i]:
+                record["status"] = "failed"
+                record["kWh_consumed"] = 0
+                if rng.random() < 0.9:
+                    record["end_time"] = None
+            if dirty[i] and rng.random() < 0.5:
+                record["kWh_consumed"] = None
+            session_records.append(record)
+            if not failed[i] and not (dirty[i] and rng.random() < 0.5):
+                payment_records.append({
+                    "session_id": session_id, "amount": round(float(kwh[i]) * 0.45, 2), "currency": "CHF"
+                })
+        session_records.extend([session_records[i] for i in np.flatnonzero(rng.random(size) < dirty_fraction)])
+        transactions.write(session_records)
+        payments.write(payment_records)
+    transactions.close()
+    payments.close()
+    return transactions.count, payments.count
+
+
+def generate_dataset(output_folder, sessions, users=None, chargers=None, dirty_fraction=0.02, days=365, seed=42):
+    """
+    Write users.json, chargers.json, transactions.json and payments.json into `output_folder`.
+
+    By default there is one user per ten sessions and one charger per two thousand
+    (at least 100 and 40). The same `seed` and sizes always yield the same files.
+    Returns the number of records written per file.
+    """
+    users = users or max(100, sessions // 10)
+    chargers = chargers or max(40, sessions // 2000)
+    os.makedirs(output_folder, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    counts = {
+        "users": generate_users(rng, os.path.join(output_folder, "users.json"), users, dirty_fraction),
+        "chargers": generate_chargers(rng, os.path.join(output_folder, "chargers.json"), chargers, dirty_fraction)
+    }
+    counts["transactions"], counts["payments"] = generate_sessions(
+        rng, os.path.join(output_folder, "transactions.json"), os.path.join(output_folder, "payments.json"),
+        sessions, users, chargers, dirty_fraction, days
+    )
+    print(f"Generated {counts} in {output_folder}")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic EV charging exports in the loader's JSON format.")
+    parser.add_argument("--output-folder", required=True)
+    parser.add_argument("--sessions", type=int, default=10_000, help="Number of charging sessions (e.g. 10000 to 100000000).")
+    parser.add_argument("--users", type=int, help="Number of users (default: sessions / 10).")
+    parser.add_argument("--chargers", type=int, help="Number of chargers (default: sessions / 2000).")
+    parser.add_argument("--dirty-fraction", type=float, default=0.02, help="Share of records with the defects the loader cleans.")
+    parser.add_argument("--days", type=int, default=365, help="Days the sessions are spread over, from 2024-01-01.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generate_dataset(args.output_folder, args.sessions, args.users, args.chargers, args.dirty_fraction, args.days, args.seed)
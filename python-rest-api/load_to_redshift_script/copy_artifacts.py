@@ -0,0 +1,177 @@
+import os
+import gzip
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:  # zstd part files are optional, gzip works out of the box
+    zstandard = None
+
+try:
+    from boto3.s3.transfer import TransferConfig
+except ImportError:
+    TransferConfig = None
+
+# Number of part files per table; set it to (a multiple of) the number of slices in the cluster
+COPY_PARTS = int(os.getenv("COPY_PARTS", 4))
+# Compression of the part files: gzip, zstd or none
+COPY_COMPRESSION = os.getenv("COPY_COMPRESSION", "gzip").lower()
+COPY_COMPRESSION_LEVEL = int(os.getenv("COPY_COMPRESSION_LEVEL", 3))
+# Multipart upload settings: files above the threshold are sent as concurrent chunks
+MULTIPART_THRESHOLD_BYTES = int(os.getenv("MULTIPART_THRESHOLD_MB", 16)) * 1024 * 1024
+MULTIPART_CHUNK_BYTES = int(os.getenv("MULTIPART_CHUNK_MB", 16)) * 1024 * 1024
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 8))
+# When set, "uploads" are copied into this directory instead of S3 (for local testing)
+S3_LOCAL_DIR = os.getenv("S3_LOCAL_DIR")
+
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+# Keyword added to the COPY command for each compression
+COPY_COMPRESSION_OPTIONS = {"gzip": "GZIP", "zstd": "ZSTD", "none": ""}
+
+# Bytes read at a time while compressing a part
+READ_BLOCK_BYTES = 4 * 1024 * 1024
+
+
+class LocalS3Client:
+    """
+    Stand-in for the boto3 S3 client that stores objects under a local directory.
+
+    Objects end up at `<root>/<bucket>/<key>`. Only the calls the loader makes are
+    implemented.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def upload_file(self, Filename, Bucket, Key, Config=None):
+        destination = os.path.join(self.root, Bucket or "local", Key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(Filename, destination)
+
+    def list_objects_v2(self, Bucket, Prefix=""):
+        bucket_root = os.path.join(self.root, Bucket or "local")
+        contents = []
+        for directory, _, files in os.walk(bucket_root):
+            for name in files:
+                key = os.path.relpath(os.path.join(directory, name), bucket_root).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    contents.append({"Key": key, "Size": os.path.getsize(os.path.join(directory, name))})
+        return {"Contents": contents} if contents else {}
+
+
+def create_transfer_config():
+    """Return the boto3 multipart transfer settings, or None where boto3 is unavailable."""
+    if TransferConfig is None:
+        return None
+    return TransferConfig(
+        multipart_threshold=MULTIPART_THRESHOLD_BYTES,
+        multipart_chunksize=MULTIPART_CHUNK_BYTES,
+        max_concurrency=UPLOAD_CONCURRENCY
+    )
+
+
+def find_part_boundaries(csv_path, parts):
+    """
+    Return the byte ranges `[(start, end), ...]` of the header and of up to `parts` row ranges.
+
+    Ranges only end at record boundaries: a newline inside a quoted field (an
+    odd number of quotes seen so far in the record) does not end a record.
+    """
+    size = os.path.getsize(csv_path)
+    target = max(1, size // max(1, parts))
+    ranges = []
+    with open(csv_path, "rb") as file:
+        header_end = len(file.readline())
+        position = header_end
+        start = header_end
+        open_quotes = 0
+        for line in file:
+            position += len(line)
+            open_quotes += line.count(b'"')
+            if open_quotes % 2:
+                continue  # The record continues on the next line
+            open_quotes = 0
+            if position - start >= target and len(ranges) < parts - 1:
+                ranges.append((start, position))
+                start = position
+    if position > start or not ranges:
+        ranges.append((start, position))
+    return (0, header_end), ranges
+
+
+def _open_compressed(path, compression):
+    if compression == "gzip":
+        return gzip.open(path, "wb", compresslevel=COPY_COMPRESSION_LEVEL)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("zstd part files require the zstandard package.")
+        return zstandard.ZstdCompressor(level=COPY_COMPRESSION_LEVEL).stream_writer(open(path, "wb"), closefd=True)
+    return open(path, "wb")
+
+
+def _write_part(csv_path, header_range, row_range, part_path, compression):
+    with open(csv_path, "rb") as source, _open_compressed(part_path, compression) as target:
+        source.seek(header_range[0])
+        target.write(source.read(header_range[1] - header_range[0]))
+        source.seek(row_range[0])
+        remaining = row_range[1] - row_range[0]
+        while remaining > 0:
+            block = source.read(min(READ_BLOCK_BYTES, remaining))
+            if not block:
+                break
+            target.write(block)
+            remaining -= len(block)
+    return part_path
+
+
+def split_csv_for_copy(csv_path, parts=COPY_PARTS, compression=COPY_COMPRESSION, output_dir=None):
+    """
+    Split a CSV file into `parts` compressed part files of similar size for a parallel COPY.
+
+    Every part repeats the header, so COPY ... IGNOREHEADER 1 works per file. The
+    parts are compressed concurrently (zlib and zstd release the GIL). Returns the
+    part paths in order.
+    """
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unsupported COPY compression '{compression}'; use gzip, zstd or none.")
+    output_dir = output_dir or os.path.join(os.path.dirname(os.path.abspath(csv_path)), "copy_parts")
+    os.makedirs(output_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(csv_path))[0]
+    header_range, row_ranges = find_part_boundaries(csv_path, parts)
+    part_paths = [
+        os.path.join(output_dir, f"{base_name}.part{index:04d}.csv{COMPRESSION_EXTENSIONS[compression]}")
+        for index in range(len(row_ranges))
+    ]
+    with ThreadPoolExecutor(max_workers=len(row_ranges)) as pool:
+        list(pool.map(
+            lambda args: _write_part(csv_path, header_range, *args, compression),
+            zip(row_ranges, part_paths)
+        ))
+    compressed_bytes = sum(os.path.getsize(path) for path in part_paths)
+    print(
+        f"Split {csv_path} into {len(part_paths)} {compression} parts "
+        f"({os.path.getsize(csv_path)} -> {compressed_bytes} bytes)"
+    )
+    return part_paths
+
+
+def write_copy_manifest(s3_urls, manifest_path):
+    """Write a Redshift COPY manifest listing every part file as mandatory."""
+    manifest = {"entries": [{"url": url, "mandatory": True} for url in s3_urls]}
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest_path
+
+
+def upload_files_concurrently(uploads, upload_file, max_workers=UPLOAD_CONCURRENCY):
+    """
+    Run `upload_file(path, key)` for every `(path, key)` pair on a thread pool.
+
+    Returns whether every upload succeeded.
+    """
+    if not uploads:
+        return True
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(uploads))) as pool:
+        return all(pool.map(lambda upload: upload_file(*upload), uploads))
@@ -0,0 +1,160 @@
+import os
+import re
+import shutil
+
+try:
+    import duckdb
+except ImportError:  # Only needed when a snapshot is requested
+    duckdb = None
+
+from table_design import TABLE_COLUMNS
+from incremental_load import PRIMARY_KEYS
+
+# Redshift-only column encoding clause, dropped from the DuckDB DDL
+ENCODING_PATTERN = re.compile(r" ENCODE \w+$")
+
+
+def snapshot_table_sql(table_name):
+    """Return the CREATE TABLE statement of a table for DuckDB (the Redshift DDL without encodings)."""
+    columns = ",\n    ".join(
+        f"{name} {ENCODING_PATTERN.sub('', definition)}" for name, definition in TABLE_COLUMNS[table_name]
+    )
+    return f"CREATE TABLE {table_name} (\n    {columns}\n);"
+
+
+def rollup_rebuild_sql(rollup_table, sketch_gamma, sketch_min_value, hll_registers):
+    """Return the DuckDB statement that recomputes the whole daily rollup from `transactions`."""
+    return f"""
+    INSERT INTO {rollup_table}
+    WITH scoped AS (
+        SELECT charger_id, CAST(start_time AS DATE) AS usage_date, status, kWh_consumed AS kwh, end_time,
+               user_id, CAST('0x' || SUBSTR(MD5(user_id), 5, 8) AS BIGINT) AS user_hash
+        FROM transactions
+        WHERE start_time IS NOT NULL AND end_time IS NOT NULL
+    ),
+    stats AS (
+        SELECT charger_id, usage_date, status,
+               COUNT(*) AS session_count, COUNT(kwh) AS kwh_count, COALESCE(SUM(kwh), 0) AS kwh_sum,
+               MIN(kwh) AS kwh_min, MAX(kwh) AS kwh_max, MAX(end_time) AS max_end_time
+        FROM scoped
+        GROUP BY charger_id, usage_date, status
+    ),
+    sketch_bins AS (
+        SELECT charger_id, usage_date, status,
+               CASE WHEN kwh > {sketch_min_value}
+                    THEN CAST(CAST(CEIL(LN(kwh) / LN({sketch_gamma!r})) AS BIGINT) AS VARCHAR)
+                    ELSE 'z' END AS sketch_bin,
+               COUNT(*) AS bin_count
+        FROM scoped
+        WHERE kwh IS NOT NULL
+        GROUP BY charger_id, usage_date, status, sketch_bin
+    ),
+    sketches AS (
+        SELECT charger_id, usage_date, status,
+               '{{' || STRING_AGG('"' || sketch_bin || '":' || bin_count, ',' ORDER BY sketch_bin) || '}}' AS kwh_sketch
+        FROM sketch_bins
+        GROUP BY charger_id, usage_date, status
+    ),
+    hll_ranks AS (
+        SELECT charger_id, usage_date, status,
+               CAST('0x' || SUBSTR(MD5(user_id), 1, 4) AS BIGINT) % {hll_registers} AS hll_register,
+               MAX(CASE WHEN user_hash = 0 THEN 33
+                        ELSE 32 - CAST(FLOOR(LN(user_hash) / LN(2) + 1e-12) AS INTEGER) END) AS hll_rank
+        FROM scoped
+        WHERE user_id IS NOT NULL
+        GROUP BY charger_id, usage_date, status, hll_register
+    ),
+    hlls AS (
+        SELECT charger_id, usage_date, status,
+               '{{' || STRING_AGG('"' || hll_register || '":' || hll_rank, ',' ORDER BY hll_register) || '}}' AS user_hll
+        FROM hll_ranks
+        GROUP BY charger_id, usage_date, status
+    )
+    SELECT s.charger_id, s.usage_date, s.status, s.session_count, s.kwh_count, s.kwh_sum,
+           s.kwh_min, s.kwh_max, s.max_end_time, COALESCE(q.kwh_sketch, '{{}}'), COALESCE(u.user_hll, '{{}}')
+    FROM stats s
+    LEFT JOIN sketches q
+      ON s.charger_id IS NOT DISTINCT FROM q.charger_id AND s.usage_date = q.usage_date
+     AND s.status IS NOT DISTINCT FROM q.status
+    LEFT JOIN hlls u
+      ON s.charger_id IS NOT DISTINCT FROM u.charger_id AND s.usage_date = u.usage_date
+     AND s.status IS NOT DISTINCT FROM u.status;
+    """
+
+
+def _read_csv(csv_path):
+    # Read every field as text; inserting BY NAME casts them to the table's column types
+    escaped_path = csv_path.replace("'", "''")
+    return f"read_csv('{escaped_path}', header = true, all_varchar = true)"
+
+
+def refresh_duckdb_snapshot(
+    csv_files, snapshot_path, incremental=False, rollup_table=None,
+    sketch_gamma=None, sketch_min_value=None, hll_registers=None
+):
+    """
+    Apply cleaned CSV files to the local DuckDB snapshot served by the API's duckdb backend.
+
+    Full loads replace a table's rows; incremental loads upsert the delta on the
+    primary key and then recompute `rollup_table` from the updated transactions.
+    Tables not in `csv_files` keep their contents; columns added to a table's DDL
+    since the snapshot was written are added empty, columns removed from it are
+    dropped, and a rollup that gained columns is recomputed. The new snapshot is written
+    next to the old one and swapped in atomically, so readers never see a
+    partial load.
+    """
+    if duckdb is None:
+        raise ImportError("Writing a DuckDB snapshot requires the duckdb package.")
+    snapshot_path = os.path.abspath(snapshot_path)
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    if os.path.exists(snapshot_path):
+        shutil.copyfile(snapshot_path, tmp_path)
+
+    connection = duckdb.connect(tmp_path)
+    try:
+        existing = {row[0] for row in connection.execute("SELECT table_name FROM duckdb_tables()").fetchall()}
+        refresh_rollup = False
+        for table_name in TABLE_COLUMNS:
+            if table_name not in existing:
+                connection.execute(snapshot_table_sql(table_name))
+                continue
+            columns = {
+                row[0].lower() for row in connection.execute(
+                    "SELECT column_name FROM duckdb_columns() WHERE table_name = ?", [table_name]
+                ).fetchall()
+            }
+            for name, definition in TABLE_COLUMNS[table_name]:
+                if name.lower() not in columns:
+                    connection.execute(f"ALTER TABLE {table_name} ADD COLUMN {name} {ENCODING_PATTERN.sub('', definition)}")
+                    refresh_rollup = refresh_rollup or table_name == rollup_table
+            for name in columns - {name.lower() for name, _ in TABLE_COLUMNS[table_name]}:
+                connection.execute(f"ALTER TABLE {table_name} DROP COLUMN {name}")
+
+        for csv_path, table_name in csv_files:
+            source = _read_csv(csv_path)
+            if incremental and table_name in PRIMARY_KEYS:
+                primary_key = PRIMARY_KEYS[table_name]
+                connection.execute(f"DELETE FROM {table_name} WHERE {primary_key} IN (SELECT {primary_key} FROM {source})")
+                refresh_rollup = refresh_rollup or table_name == "transactions"
+            else:
+                connection.execute(f"DELETE FROM {table_name}")
+            connection.execute(f"INSERT INTO {table_name} BY NAME SELECT * FROM {source}")
+            count = connection.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+            print(f"Snapshot table {table_name} now holds {count} rows.")
+
+        if refresh_rollup and rollup_table and rollup_table not in {table_name for _, table_name in csv_files}:
+            connection.execute(f"DELETE FROM {rollup_table}")
+            connection.execute(rollup_rebuild_sql(rollup_table, sketch_gamma, sketch_min_value, hll_registers))
+            print(f"Rebuilt snapshot table {rollup_table} from the merged transactions.")
+        connection.execute("CHECKPOINT")
+    except BaseException:
+        connection.close()
+        os.remove(tmp_path)
+        raise
+    connection.close()
+    os.replace(tmp_path, snapshot_path)
+    print(f"DuckDB snapshot written to {snapshot_path}")
+    return snapshot_path
@@ -0,0 +1,221 @@
+import os
+import json
+import threading
+
+import pandas as pd
+
+# Column(s) whose maximum marks how far each table has been loaded
+WATERMARK_COLUMNS = {
+    "transactions": ["start_time", "session_id"],
+    "users": ["created_at"],
+    "chargers": ["installed_at"]
+}
+PRIMARY_KEYS = {
+    "transactions": "session_id",
+    "users": "user_id",
+    "chargers": "charger_id"
+}
+
+# File holding the persisted watermark of every table
+WATERMARK_FILE = os.getenv(
+    "WATERMARK_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "load_watermarks.json")
+)
+# Records up to this many hours before the watermark are re-extracted and upserted again,
+# which picks up sessions that were still running or unpaid at the previous load
+INCREMENTAL_LOOKBACK_HOURS = float(os.getenv("INCREMENTAL_LOOKBACK_HOURS", 24))
+
+_watermark_lock = threading.Lock()
+
+
+def read_watermark(table_name):
+    """Return the persisted watermark of a table as a dict, or None before the first load."""
+    with _watermark_lock:
+        try:
+            with open(WATERMARK_FILE, "r") as file:
+                return json.load(file).get(table_name)
+        except FileNotFoundError:
+            return None
+
+
+def write_watermark(table_name, watermark):
+    """Persist the watermark of a table once its delta has been merged."""
+    with _watermark_lock:
+        try:
+            with open(WATERMARK_FILE, "r") as file:
+                watermarks = json.load(file)
+        except FileNotFoundError:
+            watermarks = {}
+        watermarks[table_name] = watermark
+        tmp_path = f"{WATERMARK_FILE}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(watermarks, file, indent=2)
+        os.replace(tmp_path, WATERMARK_FILE)
+    print(f"Advanced watermark of {table_name} to {watermark}")
+
+
+def filter_after_watermark(df, table_name, watermark):
+    """
+    Keep the rows of a cleaned table that are newer than its watermark.
+
+    Rows within `INCREMENTAL_LOOKBACK_HOURS` before the watermark are kept as well.
+    Without a lookback, transactions that share the watermark start_time are
+    ordered by session_id. Rows without a watermark timestamp are only loaded by a
+    full load.
+    """
+    if not watermark:
+        return df
+    column = WATERMARK_COLUMNS[table_name][0]
+    since = pd.Timestamp(watermark[column]) - pd.Timedelta(hours=INCREMENTAL_LOOKBACK_HOURS)
+    timestamps = pd.to_datetime(df[column])
+    if table_name == "transactions" and INCREMENTAL_LOOKBACK_HOURS == 0:
+        newer = (timestamps > since) | ((timestamps == since) & (df["session_id"] > watermark["session_id"]))
+    else:
+        # Ties are loaded again; the MERGE makes that idempotent
+        newer = timestamps >= since
+    return df[newer]
+
+
+def compute_watermark(csv_path, table_name):
+    """Return `(row_count, watermark)` of an extracted delta CSV; the watermark is None if it is empty."""
+    columns = WATERMARK_COLUMNS[table_name]
+    df = pd.read_csv(csv_path, usecols=columns, parse_dates=[columns[0]])
+    df = df.dropna(subset=[columns[0]])
+    if df.empty:
+        return 0, None
+    latest = df[columns[0]].max()
+    watermark = {columns[0]: latest.isoformat(sep=" ")}
+    if len(columns) > 1:
+        watermark[columns[1]] = str(df.loc[df[columns[0]] == latest, columns[1]].max())
+    return len(df), watermark
+
+
+def build_merge_statements(table_name, columns, s3_path, iam_role, copy_options=""):
+    """
+    Build the statements that upsert a delta CSV from S3 into a table.
+
+    The delta is COPYed into a temporary staging table shaped like the target and
+    then MERGEd on the primary key. `copy_options` are appended to the COPY.
+    """
+    staging_table = f"{table_name}_staging"
+    primary_key = PRIMARY_KEYS[table_name]
+    updates = ", ".join(f"{column} = {staging_table}.{column}" for column in columns if column != primary_key)
+    column_list = ", ".join(columns)
+    values = ", ".join(f"{staging_table}.{column}" for column in columns)
+    return [
+        f"CREATE TEMP TABLE {staging_table} (LIKE {table_name});",
+        f"""
+        COPY {staging_table} ({column_list})
+        FROM '{s3_path}'
+        IAM_ROLE '{iam_role}'
+        FORMAT AS CSV
+        IGNOREHEADER 1
+        {copy_options};
+        """,
+        f"""
+        MERGE INTO {table_name}
+        USING {staging_table}
+        ON {table_name}.{primary_key} = {staging_table}.{primary_key}
+        WHEN MATCHED THEN UPDATE SET {updates}
+        WHEN NOT MATCHED THEN INSERT ({column_list}) VALUES ({values});
+        """
+    ]
+
+
+def build_rollup_refresh_statements(rollup_table, sketch_gamma, sketch_min_value, hll_registers):
+    """
+    Build the statements that recompute the daily rollup for the days touched by a transactions delta.
+
+    Returns `(before_merge, after_merge)` statement lists. The first records the
+    affected (charger_id, day) pairs: those of the delta rows and those the
+    replaced rows had before the MERGE, so a session that moves to another day or
+    charger stops counting on its old one. The second runs after the MERGE and
+    before the staging table is dropped: every affected pair is deleted and
+    re-aggregated from `transactions` in SQL. The quantile sketch and HyperLogLog
+    are built with the same binning and hashing as the loader's pandas rollup.
+    """
+    before_merge = [
+        """
+        CREATE TEMP TABLE rollup_affected_days AS
+        SELECT charger_id, TRUNC(start_time) AS usage_date
+        FROM transactions_staging
+        WHERE start_time IS NOT NULL
+        UNION
+        SELECT t.charger_id, TRUNC(t.start_time) AS usage_date
+        FROM transactions t
+        JOIN transactions_staging s ON t.session_id = s.session_id
+        WHERE t.start_time IS NOT NULL;
+        """
+    ]
+    affected = "SELECT charger_id, usage_date FROM rollup_affected_days"
+    after_merge = [
+        f"""
+        DELETE FROM {rollup_table}
+        USING ({affected}) AS affected
+        WHERE {rollup_table}.charger_id = affected.charger_id
+          AND {rollup_table}.usage_date = affected.usage_date;
+        """,
+        f"""
+        INSERT INTO {rollup_table} (
+            charger_id, usage_date, status, session_count, kwh_count, kwh_sum,
+            kwh_min, kwh_max, max_end_time, kwh_sketch, user_hll
+        )
+        WITH affected AS ({affected}),
+        scoped AS (
+            SELECT t.charger_id, TRUNC(t.start_time) AS usage_date, t.status, t.kwh_consumed, t.end_time,
+                   t.user_id, STRTOL(SUBSTRING(MD5(t.user_id), 5, 8), 16) AS user_hash
+            FROM transactions t
+            JOIN affected a ON t.charger_id = a.charger_id AND TRUNC(t.start_time) = a.usage_date
+            WHERE t.end_time IS NOT NULL
+        ),
+        stats AS (
+            SELECT charger_id, usage_date, status,
+                   COUNT(*) AS session_count, COUNT(kwh_consumed) AS kwh_count, COALESCE(SUM(kwh_consumed), 0) AS kwh_sum,
+                   MIN(kwh_consumed) AS kwh_min, MAX(kwh_consumed) AS kwh_max, MAX(end_time) AS max_end_time
+            FROM scoped
+            GROUP BY charger_id, usage_date, status
+        ),
+        sketch_bins AS (
+            SELECT charger_id, usage_date, status,
+                   CASE WHEN kwh_consumed > {sketch_min_value}
+                        THEN CEIL(LN(kwh_consumed) / LN({sketch_gamma!r}::DOUBLE PRECISION))::BIGINT::VARCHAR
+                        ELSE 'z' END AS sketch_bin,
+                   COUNT(*) AS bin_count
+            FROM scoped
+            WHERE kwh_consumed IS NOT NULL
+            GROUP BY charger_id, usage_date, status, sketch_bin
+        ),
+        sketches AS (
+            SELECT charger_id, usage_date, status,
+                   '{{' || LISTAGG('"' || sketch_bin || '":' || bin_count, ',') WITHIN GROUP (ORDER BY sketch_bin) || '}}' AS kwh_sketch
+            FROM sketch_bins
+            GROUP BY charger_id, usage_date, status
+        ),
+        hll_ranks AS (
+            SELECT charger_id, usage_date, status,
+                   STRTOL(SUBSTRING(MD5(user_id), 1, 4), 16) % {hll_registers} AS hll_register,
+                   MAX(CASE WHEN user_hash = 0 THEN 33
+                            ELSE 32 - FLOOR(LN(user_hash) / LN(2) + 1e-12)::INT END) AS hll_rank
+            FROM scoped
+            WHERE user_id IS NOT NULL
+            GROUP BY charger_id, usage_date, status, hll_register
+        ),
+        hlls AS (
+            SELECT charger_id, usage_date, status,
+                   '{{' || LISTAGG('"' || hll_register || '":' || hll_rank, ',') WITHIN GROUP (ORDER BY hll_register) || '}}' AS user_hll
+            FROM hll_ranks
+            GROUP BY charger_id, usage_date, status
+        )
+        SELECT s.charger_id, s.usage_date, s.status, s.session_count, s.kwh_count, s.kwh_sum,
+               s.kwh_min, s.kwh_max, s.max_end_time, COALESCE(q.kwh_sketch, '{{}}'), COALESCE(u.user_hll, '{{}}')
+        FROM stats s
+        LEFT JOIN sketches q
+          ON s.charger_id = q.charger_id AND s.usage_date = q.usage_date
+         AND COALESCE(s.status, '') = COALESCE(q.status, '')
+        LEFT JOIN hlls u
+          ON s.charger_id = u.charger_id AND s.usage_date = u.usage_date
+         AND COALESCE(s.status, '') = COALESCE(u.status, '');
+        """,
+        "DROP TABLE rollup_affected_days;"
+    ]
+    return before_merge, after_merge
@@ -1,6 +1,12 @@
 import os
+import re
+import sys
 import json
 import glob
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import boto3
 import redshift_connector
 import pandas as pd
@@ -10,6 +16,29 @@ import numpy as np
 from datetime import datetime
 import pytz
 
+# Helpers shared with the REST API (e.g. load version stamps) live in its src package
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from utils.load_version import bump_load_version
+from db.backends import DUCKDB_SNAPSHOT_PATH
+from utils.sketches import (
+    quantile_sketch_bins, encode_quantile_sketch, hll_register, encode_hll,
+    QUANTILE_SKETCH_GAMMA, QUANTILE_SKETCH_MIN_VALUE, HLL_REGISTERS
+)
+from streaming_ingestion import iter_json_array, iter_chunks, SpillableIndex
+from incremental_load import (
+    read_watermark, write_watermark, filter_after_watermark, compute_watermark,
+    build_merge_statements, build_rollup_refresh_statements
+)
+from duckdb_snapshot import refresh_duckdb_snapshot
+from table_design import ensure_table_layout, run_post_load_maintenance
+from copy_artifacts import (
+    COPY_PARTS, COPY_COMPRESSION, COPY_COMPRESSION_OPTIONS, S3_LOCAL_DIR, LocalS3Client,
+    create_transfer_config, split_csv_for_copy, write_copy_manifest, upload_files_concurrently
+)
+from load_profile import (
+    start_profile, finish_profile, profile_stage, build_report, write_report, read_report, print_comparison
+)
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -25,6 +54,41 @@ REDSHIFT_USER = os.getenv("REDSHIFT_USER")
 REDSHIFT_PASSWORD = os.getenv("REDSHIFT_PASSWORD")
 REDSHIFT_IAM_ROLE = os.getenv("REDSHIFT_IAM_ROLE")
 
+# Format of all timestamps in the cleaned CSV files
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Honorifics and post-nominals stripped from user names before splitting them
+NAME_PREFIXES = ["Mr.", "Mrs.", "Ms.", "Miss", "Mx", "Prof.", "Dr.", "Rev.", "Fr", "Lord", "Lady", "Sir", "Dame", "Capt.", "Col.", "Gen.", "Lt.", "Maj.", "Sgt.", "Cpl.", "Pvt.", "Adm."]
+NAME_SUFFIXES = ["Jr.", "Sr.", "MD", "PhD", "DDS", "DVM", "DSc", "DPhil", "JD", "Esq.", "CPA", "CFA", "MBA", "LLB", "LLM", "BSc", "BA", "MA", "MSc", "PharmD", "EdD", "RN", "PE", "II", "III", "IV", "V"]
+# Titles contain no spaces, so at most one prefix and one suffix can match a name. The patterns are
+# plain strings so pandas can run them with pyarrow's regex engine as well as with Python's re.
+NAME_PREFIX_PATTERN = r"^(?:" + "|".join(map(re.escape, NAME_PREFIXES)) + r") "
+NAME_SUFFIX_PATTERN = r" (?:" + "|".join(map(re.escape, NAME_SUFFIXES)) + r")$"
+# Every character str.split() splits on, spelled out since the engines disagree on \s
+WHITESPACE_PATTERN = "[" + "".join(chr(code) for code in range(0x3001) if chr(code).isspace()) + "]+"
+
+# Fields extracted from the JSON exports of each table
+TABLE_FIELDS = {
+    "transactions": [
+        "session_id", "user_id", "charger_id", "start_time", "end_time",
+        "kWh_consumed", "status", "payment_method", "amount", "currency"
+    ],
+    "users": [
+        "user_id", "name", "email", "tier", "created_at"
+    ],
+    "chargers": [
+        "charger_id", "city", "location.lat", "location.lon", "installed_at"
+    ]
+}
+
+# Streaming ingestion of transactions/payments for exports that do not fit in memory
+STREAMING_INGESTION = os.getenv("STREAMING_INGESTION", "false").lower() == "true"
+STREAMING_CHUNK_SIZE = int(os.getenv("STREAMING_CHUNK_SIZE", 200_000))
+INDEX_MEMORY_BUDGET_BYTES = int(os.getenv("INDEX_MEMORY_BUDGET_MB", 512)) * 1024 * 1024
+
+# Daily per-charger rollup of transactions used by the usage analytics endpoint
+ROLLUP_TABLE = "charger_daily_usage"
+
 def connect_to_redshift():
     """Establish a connection to the Redshift database."""
     return redshift_connector.connect(
@@ -44,13 +108,23 @@ def test_redshift_connection():
     except Exception as e:
         print(f"Failed to connect to the Redshift database: {e}")
 
-def test_s3_connection():
-    """Test the connection to the S3 bucket."""
-    s3_client = boto3.client(
+def create_s3_client():
+    """
+    Create an S3 client; boto3 clients are thread-safe, so one can be shared by all uploads.
+
+    With `S3_LOCAL_DIR` set, a local directory stands in for the bucket.
+    """
+    if S3_LOCAL_DIR:
+        return LocalS3Client(S3_LOCAL_DIR)
+    return boto3.client(
         's3',
         aws_access_key_id=AWS_ACCESS_KEY,
         aws_secret_access_key=AWS_SECRET_KEY
     )
+
+def test_s3_connection():
+    """Test the connection to the S3 bucket."""
+    s3_client = create_s3_client()
     try:
         response = s3_client.list_objects_v2(Bucket=S3_BUCKET_NAME)
         if 'Contents' in response:
@@ -61,114 +135,225 @@ def test_s3_connection():
     except Exception as e:
         print(f"Failed to connect to S3 bucket '{S3_BUCKET_NAME}': {e}")
 
-def upload_to_s3(file_path, bucket_name, s3_key):
-    """Upload a file to an S3 bucket."""
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY
-    )
+def upload_to_s3(file_path, bucket_name, s3_key, s3_client=None, transfer_config=None):
+    """
+    Upload a file to an S3 bucket, reusing `s3_client` if given; returns whether it succeeded.
+
+    Files above the multipart threshold of `transfer_config` are uploaded as
+    concurrent chunks.
+    """
+    s3_client = s3_client or create_s3_client()
     try:
-        s3_client.upload_file(file_path, bucket_name, s3_key)
+        s3_client.upload_file(file_path, bucket_name, s3_key, Config=transfer_config)
         print(f"Uploaded {file_path} to s3://{bucket_name}/{s3_key}")
+        return True
     except Exception as e:
         print(f"Failed to upload {file_path} to S3: {e}")
-
-def copy_from_s3_to_redshift(s3_path, table_name):
-    """Trigger the Redshift COPY command to load data from S3."""
-    connection = connect_to_redshift()
+        return False
+
+def copy_from_s3_to_redshift(s3_path, table_name, replace=False, connection=None, copy_options=""):
+    """
+    Trigger the Redshift COPY command to load data from S3; returns whether it succeeded.
+
+    With `replace=True` the existing rows are deleted in the same transaction as the
+    COPY, so readers switch from the old to the new contents atomically. A passed-in
+    `connection` is reused and left open. `copy_options` (e.g. "MANIFEST GZIP") are
+    appended to the COPY command.
+    """
+    owns_connection = connection is None
+    connection = connection or connect_to_redshift()
     try:
         with connection.cursor() as cursor:
+            if replace:
+                cursor.execute(f"DELETE FROM {table_name};")
             sql = f"""
             COPY {table_name}
             FROM '{s3_path}'
             IAM_ROLE '{REDSHIFT_IAM_ROLE}'
             FORMAT AS CSV
-            IGNOREHEADER 1;
+            IGNOREHEADER 1
+            {copy_options};
             """
             cursor.execute(sql)
             connection.commit()
             print(f"Data successfully copied from {s3_path} to Redshift table {table_name}.")
+            return True
     except Exception as e:
         print(f"Failed to copy data from S3 to Redshift: {e}")
+        try:
+            connection.rollback()
+        except Exception:
+            pass  # The connection itself may be what failed
+        return False
     finally:
-        connection.close()
-
-def transform_json_to_csv(json_folder, csv_output_path, table_name):
-    """Transform JSON files into a CSV file with the required fields and clean the data."""
-    # Define the fields for each table
-    table_fields = {
-        "transactions": [
-            "session_id", "user_id", "charger_id", "start_time", "end_time",
-            "kWh_consumed", "status", "payment_method", "amount", "currency"
-        ],
-        "users": [
-            "user_id", "name", "email", "tier", "created_at"
-        ],
-        "chargers": [
-            "charger_id", "city", "location.lat", "location.lon", "installed_at"
-        ]
-    }
-
+        if owns_connection:
+            connection.close()
+
+def merge_from_s3_into_redshift(s3_path, table_name, columns, connection=None, copy_options=""):
+    """
+    Upsert a delta CSV from S3 into a table through a staging table; returns whether it succeeded.
+
+    For transactions, the charger_daily_usage rows of every day touched by the delta
+    are recomputed in the same transaction.
+    """
+    owns_connection = connection is None
+    connection = connection or connect_to_redshift()
+    statements = build_merge_statements(table_name, columns, s3_path, REDSHIFT_IAM_ROLE, copy_options)
+    if table_name == "transactions":
+        before_merge, after_merge = build_rollup_refresh_statements(
+            ROLLUP_TABLE, QUANTILE_SKETCH_GAMMA, QUANTILE_SKETCH_MIN_VALUE, HLL_REGISTERS
+        )
+        # The MERGE is the last statement; the days of the rows it replaces are recorded before it runs
+        statements = statements[:-1] + before_merge + statements[-1:] + after_merge
+    statements.append(f"DROP TABLE {table_name}_staging;")
+    try:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+            connection.commit()
+            print(f"Data successfully merged from {s3_path} into Redshift table {table_name}.")
+            return True
+    except Exception as e:
+        print(f"Failed to merge data from S3 into Redshift: {e}")
+        try:
+            connection.rollback()
+        except Exception:
+            pass  # The connection itself may be what failed
+        return False
+    finally:
+        if owns_connection:
+            connection.close()
+
+def s3_key_for(file_name, *subfolders):
+    """Return the S3 key of a file below `S3_FOLDER`."""
+    return "/".join(part for part in (S3_FOLDER, *subfolders, file_name) if part)
+
+def stage_copy_artifacts(csv_path, s3_client=None, timings=None, table_name=None, rows=None):
+    """
+    Upload a CSV file in the form the COPY command should read it.
+
+    With `COPY_PARTS` > 1 or compression enabled, the file is split into compressed
+    part files that are uploaded concurrently, plus a manifest listing them, so
+    every slice of the cluster loads one part. Returns `(s3_path, copy_options)`,
+    or None if an upload failed. `rows` is the number of rows in the CSV file, if known.
+    """
+    if COPY_PARTS <= 1 and COPY_COMPRESSION == "none":
+        s3_key = s3_key_for(os.path.basename(csv_path))
+        with profile_stage(table_name, "upload", timings, rows_in=rows) as stage:
+            uploaded = upload_to_s3(csv_path, S3_BUCKET_NAME, s3_key, s3_client)
+            stage["rows_out"] = rows if uploaded else 0
+        return (f"s3://{S3_BUCKET_NAME}/{s3_key}", "") if uploaded else None
+
+    with profile_stage(table_name, "split", timings, rows_in=rows) as stage:
+        part_paths = split_csv_for_copy(csv_path, COPY_PARTS, COPY_COMPRESSION)
+        stage["rows_out"] = rows
+
+    with profile_stage(table_name, "upload", timings, rows_in=rows) as stage:
+        s3_client = s3_client or create_s3_client()
+        transfer_config = create_transfer_config()
+        table_folder = os.path.splitext(os.path.basename(csv_path))[0]
+        uploads = [(path, s3_key_for(os.path.basename(path), table_folder)) for path in part_paths]
+        uploaded = upload_files_concurrently(
+            uploads, lambda path, key: upload_to_s3(path, S3_BUCKET_NAME, key, s3_client, transfer_config)
+        )
+        if uploaded:
+            manifest_path = write_copy_manifest(
+                [f"s3://{S3_BUCKET_NAME}/{key}" for _, key in uploads],
+                os.path.join(os.path.dirname(part_paths[0]), f"{table_folder}.manifest")
+            )
+            manifest_key = s3_key_for(os.path.basename(manifest_path), table_folder)
+            uploaded = upload_to_s3(manifest_path, S3_BUCKET_NAME, manifest_key, s3_client)
+        stage["rows_out"] = rows if uploaded else 0
+    if not uploaded:
+        return None
+    copy_options = " ".join(option for option in ("MANIFEST", COPY_COMPRESSION_OPTIONS[COPY_COMPRESSION]) if option)
+    return f"s3://{S3_BUCKET_NAME}/{manifest_key}", copy_options
+
+def transform_json_to_csv(json_folder, csv_output_path, table_name, streaming=False, watermark=None):
+    """
+    Transform JSON files into a CSV file with the required fields and clean the data.
+
+    With `streaming=True` transactions are processed in bounded-memory chunks, see
+    `stream_transactions_to_csv`. With a `watermark`, the whole table is still
+    cleaned and validated, but only rows newer than the watermark are written.
+    """
     # Ensure the table name is valid
-    if table_name not in table_fields:
+    if table_name not in TABLE_FIELDS:
         raise ValueError(f"Unknown table name: {table_name}")
 
     # Get the required fields for the table
-    required_fields = table_fields[table_name]
+    required_fields = TABLE_FIELDS[table_name]
 
-    # Collect data from the relevant JSON files
-    data = []
-    if table_name == "transactions":
-        parse_transactions_and_payments(json_folder, required_fields, data)
+    if streaming and table_name == "transactions":
+        with profile_stage(table_name, "stream") as stage:
+            stage["rows_out"] = stream_transactions_to_csv(json_folder, csv_output_path, required_fields, watermark=watermark)
+        return
 
-    elif table_name == "users":
-        parse_users(json_folder, required_fields, data)
+    # Collect data from the relevant JSON files
+    with profile_stage(table_name, "parse") as stage:
+        if table_name == "chargers":
+            df = parse_chargers(json_folder, required_fields)
+        else:
+            data = []
+            if table_name == "transactions":
+                parse_transactions_and_payments(json_folder, required_fields, data)
 
-    elif table_name == "chargers":
-        parse_chargers(json_folder, required_fields, data)
+            elif table_name == "users":
+                parse_users(json_folder, required_fields, data)
 
-    # Convert the data to a DataFrame
-    df = pd.DataFrame(data)
+            # Convert the data to a DataFrame
+            df = pd.DataFrame(data)
+        stage["rows_out"] = len(df)
 
     # Process the name column to extract first_name and last_name
     if table_name == "users" and "name" in df.columns:
-        df = split_name_into_first_and_last_name(df)
+        with profile_stage(table_name, "split names", rows_in=len(df)) as stage:
+            df = split_name_into_first_and_last_name(df)
+            stage["rows_out"] = len(df)
 
     # Transform timestamps to the required format and ensure they are in the same timezone
-    transform_time_field(df)
+    with profile_stage(table_name, "timestamps", rows_in=len(df)) as stage:
+        transform_time_field(df)
+        stage["rows_out"] = len(df)
 
     # Remove duplicates
-    remove_duplicates(df)
+    with profile_stage(table_name, "dedup", rows_in=len(df)) as stage:
+        remove_duplicates(df)
+        stage["rows_out"] = len(df)
 
     # Check for unique primary IDs
-    validate_unique_primary_ids(table_name, df)
+    with profile_stage(table_name, "validate ids", rows_in=len(df)) as stage:
+        validate_unique_primary_ids(table_name, df)
+        stage["rows_out"] = len(df)
 
     # Clean city names for chargers
     if table_name == "chargers":
-        df = clean_city_names(df)
+        with profile_stage(table_name, "clean cities", rows_in=len(df)) as stage:
+            df = clean_city_names(df)
+            stage["rows_out"] = len(df)
+
+    # Keep only the delta for incremental loads
+    if watermark:
+        with profile_stage(table_name, "watermark", rows_in=len(df)) as stage:
+            df = filter_after_watermark(df, table_name, watermark)
+            stage["rows_out"] = len(df)
+        print(f"Extracted {len(df)} {table_name} rows newer than the watermark {watermark}.")
 
     # Save the cleaned DataFrame to a CSV file
-    df.to_csv(csv_output_path, index=False)
+    with profile_stage(table_name, "write csv", rows_in=len(df)) as stage:
+        df.to_csv(csv_output_path, index=False, date_format=TIMESTAMP_FORMAT)
+        stage["rows_out"] = len(df)
     print(f"Cleaned CSV file saved to: {csv_output_path}")
 
-def parse_chargers(json_folder, required_fields, data):
-    """Parse and filter charger data from JSON files."""
+def parse_chargers(json_folder, required_fields):
+    """Parse and filter charger data from JSON files, flattening nested fields like "location.lat"."""
     chargers_file = os.path.join(json_folder, "chargers.json")
     with open(chargers_file, "r") as file:
         chargers = json.load(file)
-    for charger in chargers:
-        filtered_record = {}
-        for field in required_fields:
-            if "." in field:  # Handle nested fields like "location.lat"
-                keys = field.split(".")
-                value = charger
-                for key in keys:
-                    value = value.get(key, None) if isinstance(value, dict) else None
-                filtered_record[field.replace(".", "_")] = value
-            else:
-                filtered_record[field] = charger.get(field, None)
-        data.append(filtered_record)
+    # Fields missing in a record (or under a non-object parent) become NaN
+    df = pd.json_normalize(chargers).reindex(columns=required_fields)
+    df.columns = [field.replace(".", "_") for field in required_fields]
+    return df
 
 def parse_users(json_folder, required_fields, data):
     """Parse and filter user data from JSON files."""
@@ -195,43 +380,37 @@ def remove_duplicates(df):
     print(f"Removed {initial_row_count - len(df)} duplicate rows.")
 
 def transform_time_field(df):
-    """Transforms specified timestamp fields in a DataFrame to a consistent datetime format without timezone."""
+    """
+    Transforms specified timestamp fields in a DataFrame to a consistent datetime format without timezone.
+
+    Columns stay datetime64 (truncated to whole seconds) and are formatted once by
+    `to_csv(date_format=TIMESTAMP_FORMAT)` instead of per value with `strftime`.
+    """
     timestamp_fields = ["start_time", "end_time", "created_at", "installed_at"]
     for field in timestamp_fields:
         if field in df.columns:
             # Convert to datetime and ensure timezone is UTC
-            df[field] = pd.to_datetime(df[field], errors="coerce").dt.tz_localize(None).dt.strftime('%Y-%m-%d %H:%M:%S')
+            df[field] = pd.to_datetime(df[field], errors="coerce").dt.tz_localize(None).dt.floor("s")
             print(f"Transformed timestamps in column '{field}' to format 'yyyy-mm-dd hh:mi:ss' and ensured timezone consistency.")
 
 def split_name_into_first_and_last_name(df):
     """Splits the 'name' column in a DataFrame into 'first_name' and 'last_name' while cleaning prefixes and suffixes."""
-    prefixes = ["Mr.", "Mrs.", "Ms.", "Miss", "Mx", "Prof.", "Dr.", "Rev.", "Fr", "Lord", "Lady", "Sir", "Dame", "Capt.", "Col.", "Gen.", "Lt.", "Maj.", "Sgt.", "Cpl.", "Pvt.", "Adm."]
-    suffixes = ["Jr.", "Sr.", "MD", "PhD", "DDS", "DVM", "DSc", "DPhil", "JD", "Esq.", "CPA", "CFA", "MBA", "LLB", "LLM", "BSc", "BA", "MA", "MSc", "PharmD", "EdD", "RN", "PE", "II", "III", "IV", "V"]
-
-    def clean_name(name):
-        # Remove prefixes
-        for prefix in prefixes:
-            if name.startswith(prefix + " "):
-                name = name[len(prefix) + 1:]
-                break
-        # Remove suffixes
-        for suffix in suffixes:
-            if name.endswith(" " + suffix):
-                name = name[:-(len(suffix) + 1)]
-                break
-        return name
-
-    def split_name(name):
-        parts = name.split()
-        first_name = parts[0] if len(parts) > 0 else None
-        last_name = " ".join(parts[1:]) if len(parts) > 1 else None
-        return first_name, last_name
-
-    # Clean and split the name column
-    df["cleaned_name"] = df["name"].apply(clean_name)
-    df["first_name"], df["last_name"] = zip(*df["cleaned_name"].apply(split_name))
+    # Remove one prefix and one suffix with vectorized regex replacements
+    cleaned_name = df["name"].str.replace(NAME_PREFIX_PATTERN, "", regex=True)
+    # Python's `$` also matches before a trailing newline, where endswith() would not
+    ends_with_newline = cleaned_name.str.endswith("\n").fillna(False).astype(bool)
+    cleaned_name = cleaned_name.where(ends_with_newline, cleaned_name.str.replace(NAME_SUFFIX_PATTERN, "", regex=True))
+
+    # First word and the remaining words joined by single spaces, like str.split()
+    collapsed = cleaned_name.str.replace(WHITESPACE_PATTERN, " ", regex=True).str.strip(" ")
+    first_name = collapsed.str.replace(r" .*", "", regex=True)
+    last_name = collapsed.str.replace(r"^[^ ]* ?", "", regex=True)
+    first_name = first_name.where(first_name != "", None)
+    last_name = last_name.where(last_name != "", None)
+
+    df["first_name"] = first_name
+    df["last_name"] = last_name
     df.rename(columns={"name": "full_name"}, inplace=True)  # Rename 'name' to 'full_name'
-    df.drop(columns=["cleaned_name"], inplace=True)
 
     # Ensure the DataFrame includes all required columns
     df = df[["user_id", "full_name", "first_name", "last_name", "email", "tier", "created_at"]]
@@ -263,6 +442,92 @@ def parse_transactions_and_payments(json_folder, required_fields, data):
             combined_record["end_time"] = combined_record["start_time"]
         data.append(combined_record)
 
+def stream_transactions_to_csv(json_folder, csv_output_path, required_fields, chunk_size=STREAMING_CHUNK_SIZE,
+                               memory_budget_bytes=INDEX_MEMORY_BUDGET_BYTES, watermark=None):
+    """
+    Streaming variant of the transactions transform for inputs larger than memory.
+
+    Both JSON arrays are parsed incrementally. Payments are indexed by session_id in
+    a `SpillableIndex` that moves to disk once it exceeds `memory_budget_bytes`.
+    Transactions are then joined, cleaned and appended to the CSV `chunk_size` records
+    at a time. Duplicate rows are dropped across chunks by remembering a hash of every
+    written row per session_id, and duplicate primary IDs raise like the in-memory path.
+    kWh_consumed and amount are written as floats in every chunk. With a `watermark`
+    only newer rows are written, after the duplicate checks have seen every row.
+    Returns the number of rows written.
+    """
+    transactions_file = os.path.join(json_folder, "transactions.json")
+    payments_file = os.path.join(json_folder, "payments.json")
+
+    payments = SpillableIndex(memory_budget_bytes, ["amount", "currency"])
+    written_rows = SpillableIndex(memory_budget_bytes, ["row_hash"])
+    chunks_written = 0
+    rows_written = 0
+    duplicate_rows = 0
+    duplicate_ids = 0
+    try:
+        for batch in iter_chunks(iter_json_array(payments_file), chunk_size):
+            payments.put_many((payment["session_id"], (payment.get("amount"), payment.get("currency"))) for payment in batch)
+        print(f"Indexed payments (spilled to disk: {payments.spilled}).")
+
+        for batch in iter_chunks(iter_json_array(transactions_file), chunk_size):
+            matched_payments = payments.get_many([transaction["session_id"] for transaction in batch])
+            records = []
+            for transaction in batch:
+                combined_record = {field: transaction.get(field, None) for field in required_fields}
+                payment = matched_payments.get(transaction["session_id"])
+                if payment is not None:
+                    combined_record["amount"], combined_record["currency"] = payment
+                # Set end_time to start_time for failed transactions without an end_time
+                if combined_record["status"] == "failed" and not combined_record["end_time"]:
+                    combined_record["end_time"] = combined_record["start_time"]
+                records.append(combined_record)
+
+            df = pd.DataFrame(records, columns=required_fields)
+            for column in ["kWh_consumed", "amount"]:
+                try:
+                    df[column] = df[column].astype(float)
+                except (TypeError, ValueError):
+                    pass  # Leave non-numeric values for Redshift to reject, like the in-memory path
+            transform_time_field(df)
+
+            # Drop rows duplicated inside the chunk or already written by an earlier chunk
+            chunk_rows = len(df)
+            df.drop_duplicates(inplace=True)
+            row_hashes = pd.util.hash_pandas_object(df, index=False).astype(np.int64)
+            previous = written_rows.get_many(df["session_id"].tolist())
+            already_written = np.array([
+                previous.get(session_id, (None,))[0] == row_hash
+                for session_id, row_hash in zip(df["session_id"], row_hashes)
+            ], dtype=bool)
+            conflicting = np.array([session_id in previous for session_id in df["session_id"]], dtype=bool) & ~already_written
+            df = df[~already_written]
+            row_hashes = row_hashes[~already_written]
+            duplicate_rows += chunk_rows - len(df)
+            duplicate_ids += int(conflicting.sum() + df["session_id"].duplicated().sum())
+
+            written_rows.put_many(zip(df["session_id"], ((int(row_hash),) for row_hash in row_hashes)))
+            if watermark:
+                df = filter_after_watermark(df, "transactions", watermark)
+            df.to_csv(
+                csv_output_path, mode="w" if chunks_written == 0 else "a", header=chunks_written == 0,
+                index=False, date_format=TIMESTAMP_FORMAT
+            )
+            chunks_written += 1
+            rows_written += len(df)
+            print(f"Streamed {rows_written} transactions to {csv_output_path}")
+    finally:
+        payments.close()
+        written_rows.close()
+
+    print(f"Removed {duplicate_rows} duplicate rows.")
+    if duplicate_ids:
+        os.remove(csv_output_path)
+        raise ValueError(f"Duplicate primary IDs found in transactions table: {duplicate_ids} duplicates.")
+    print("All primary IDs in the transactions table are unique.")
+    print(f"Cleaned CSV file saved to: {csv_output_path}")
+    return rows_written
+
 def clean_city_names(df):
     """Correct city names and handle invalid coordinates and outliers."""
     city_corrections = {
@@ -289,30 +554,301 @@ def clean_city_names(df):
     df.drop(columns=["z_lat", "z_lon"], inplace=True)
     return df
 
-def load_json_files_to_s3_and_redshift(json_folder, table_name):
+def build_charger_daily_usage(transactions_csv_path, rollup_csv_path, chunk_size=500_000):
+    """
+    Aggregate the cleaned transactions CSV into the charger_daily_usage rollup CSV.
+
+    One row per charger, start_time day and status holds the session count, kWh
+    count/sum/min/max, the latest end_time, and the mergeable sketches of the
+    median and approximate analytics: a relative-error kWh quantile
+    sketch and a HyperLogLog of the users. Only transactions with both timestamps
+    are rolled up. The CSV is read in chunks whose partial aggregates are merged,
+    so memory does not grow with the number of transactions. Returns the number of
+    rollup rows.
+    """
+    keys = ["charger_id", "usage_date", "status"]
+    partial_stats = []
+    partial_sketches = []
+    partial_hlls = []
+    user_registers = {}
+    for chunk in pd.read_csv(
+        transactions_csv_path,
+        usecols=["charger_id", "user_id", "start_time", "end_time", "kWh_consumed", "status"],
+        parse_dates=["start_time", "end_time"],
+        dtype={"user_id": str},
+        chunksize=chunk_size
+    ):
+        chunk = chunk.dropna(subset=["start_time", "end_time"])
+        chunk["usage_date"] = chunk["start_time"].dt.normalize()
+        partial_stats.append(chunk.groupby(keys, dropna=False).agg(
+            session_count=("charger_id", "size"),
+            kwh_count=("kWh_consumed", "count"),
+            kwh_sum=("kWh_consumed", "sum"),
+            kwh_min=("kWh_consumed", "min"),
+            kwh_max=("kWh_consumed", "max"),
+            max_end_time=("end_time", "max")
+        ))
+        consumed = chunk.dropna(subset=["kWh_consumed"])
+        consumed = consumed.assign(sketch_bin=quantile_sketch_bins(consumed["kWh_consumed"]))
+        partial_sketches.append(consumed.groupby(keys + ["sketch_bin"], dropna=False).size())
+
+        # Hash every distinct user once; the register and rank only depend on the user_id
+        users = chunk.dropna(subset=["user_id"])
+        for user_id in users["user_id"].unique():
+            if user_id not in user_registers:
+                user_registers[user_id] = hll_register(user_id)
+        registers = users["user_id"].map(user_registers)
+        users = users.assign(hll_register=registers.str[0], hll_rank=registers.str[1])
+        partial_hlls.append(users.groupby(keys + ["hll_register"], dropna=False)["hll_rank"].max())
+
+    if not partial_stats:
+        pd.DataFrame(columns=keys).to_csv(rollup_csv_path, index=False)
+        return 0
+
+    rollup = pd.concat(partial_stats).groupby(level=keys, dropna=False).agg({
+        "session_count": "sum",
+        "kwh_count": "sum",
+        "kwh_sum": "sum",
+        "kwh_min": "min",
+        "kwh_max": "max",
+        "max_end_time": "max"
+    })
+    sketch_counts = pd.concat(partial_sketches).groupby(level=keys + ["sketch_bin"], dropna=False).sum()
+    sketches = sketch_counts.groupby(level=keys, dropna=False).apply(
+        lambda counts: encode_quantile_sketch(dict(zip(counts.index.get_level_values("sketch_bin"), counts.values)))
+    )
+    rollup["kwh_sketch"] = sketches.reindex(rollup.index).fillna("{}")
+    ranks = pd.concat(partial_hlls).groupby(level=keys + ["hll_register"], dropna=False).max()
+    hlls = ranks.groupby(level=keys, dropna=False).apply(
+        lambda ranks: encode_hll(dict(zip(ranks.index.get_level_values("hll_register"), ranks.values)))
+    )
+    rollup["user_hll"] = hlls.reindex(rollup.index).fillna("{}")
+
+    rollup = rollup.reset_index()
+    rollup["usage_date"] = rollup["usage_date"].dt.strftime("%Y-%m-%d")
+    rollup.to_csv(rollup_csv_path, index=False, date_format=TIMESTAMP_FORMAT)
+    print(f"Built {len(rollup)} {ROLLUP_TABLE} rows: {rollup_csv_path}")
+    return len(rollup)
+
+def transform_table(json_folder, table_name, streaming=STREAMING_INGESTION, incremental=False, profile=False):
+    """
+    Transform one table's JSON files into the CSV files to load.
+
+    Returns `(csv_files, seconds, stages)`, where `csv_files` lists `(csv_path, target_table)`
+    pairs. A full load of transactions also yields the charger_daily_usage rollup;
+    incremental loads refresh the touched rollup days in SQL instead. With `profile=True`
+    `stages` holds the profile records of the transform's stages (see `load_profile`),
+    otherwise it is empty. This runs in a worker process, so the records are returned
+    rather than recorded in the caller's profile.
+    """
+    started = time.perf_counter()
+    if profile:
+        start_profile()
+    try:
+        with profile_stage(table_name, "transform"):
+            watermark = read_watermark(table_name) if incremental else None
+            # Transform JSON files into a single CSV file
+            csv_output_path = os.path.join(json_folder, f"{table_name}.csv")
+            transform_json_to_csv(json_folder, csv_output_path, table_name, streaming=streaming, watermark=watermark)
+            csv_files = [(csv_output_path, table_name)]
+
+        # Rebuild the daily charger rollup from the freshly cleaned transactions
+        if table_name == "transactions" and not incremental:
+            rollup_csv_path = os.path.join(json_folder, f"{ROLLUP_TABLE}.csv")
+            with profile_stage(ROLLUP_TABLE, "transform") as stage:
+                stage["rows_out"] = build_charger_daily_usage(csv_output_path, rollup_csv_path)
+            csv_files.append((rollup_csv_path, ROLLUP_TABLE))
+    finally:
+        stages = finish_profile() if profile else []
+    return csv_files, time.perf_counter() - started, stages
+
+def load_csv_files(csv_files, s3_client=None, connection=None, copy_lock=None, timings=None, incremental=False,
+                   csv_rows=None):
+    """
+    Upload CSV files to S3 and COPY each into its Redshift table.
+
+    `copy_lock` serializes COPYs when several threads share one Redshift
+    connection. Stage durations are appended to `timings` as
+    `(table, stage, seconds)` tuples. With `incremental=True` the CSV files are
+    deltas: they are merged into the tables, and the table watermark advances
+    once the merge has committed. Every table is created (or rebuilt) with its
+    current layout before the COPY and vacuumed and analyzed after it. `csv_rows`
+    maps target tables to the row counts of their CSV files for the load profile.
+    """
+    copy_lock = copy_lock or threading.Lock()
+    owns_connection = connection is None
+    connection = connection or connect_to_redshift()
+    try:
+        for csv_path, target_table in csv_files:
+            load_csv_file(
+                csv_path, target_table, s3_client, connection, copy_lock, timings, incremental,
+                (csv_rows or {}).get(target_table)
+            )
+    finally:
+        if owns_connection:
+            connection.close()
+
+def load_csv_file(csv_path, target_table, s3_client, connection, copy_lock, timings=None, incremental=False,
+                  rows=None):
+    """Upload one CSV file and COPY or MERGE it into its table; see `load_csv_files`."""
+    # Incremental transactions also refresh the rollup, so both tables must exist
+    maintained_tables = [target_table]
+    if incremental and target_table == "transactions":
+        maintained_tables.append(ROLLUP_TABLE)
+    if incremental:
+        delta_rows, watermark = compute_watermark(csv_path, target_table)
+        if delta_rows == 0:
+            print(f"No new {target_table} rows since the last load.")
+            return
+
+    # Upload the CSV file to S3, split into compressed parts unless disabled
+    staged = stage_copy_artifacts(csv_path, s3_client, timings, target_table, rows)
+    if staged is None:
+        return
+
+    # Trigger the Redshift COPY command; a full load replaces the old rows, so running it again never duplicates them
+    s3_path, copy_options = staged
+    with copy_lock:
+        try:
+            for table_name in maintained_tables:
+                ensure_table_layout(connection, table_name)
+        except Exception as e:
+            print(f"Failed to prepare the layout of {target_table}: {e}")
+            return
+        with profile_stage(target_table, "merge" if incremental else "copy", timings, rows_in=rows) as stage:
+            if incremental:
+                columns = list(pd.read_csv(csv_path, nrows=0).columns)
+                copied = merge_from_s3_into_redshift(s3_path, target_table, columns, connection=connection, copy_options=copy_options)
+            else:
+                copied = copy_from_s3_to_redshift(
+                    s3_path, target_table, replace=True, connection=connection, copy_options=copy_options
+                )
+            # COPY runs without MAXERROR, so it loads either every row or none
+            stage["rows_out"] = rows if copied else 0
+
+        # Re-sort the new rows and refresh the statistics the planner prunes with
+        if copied:
+            with profile_stage(target_table, "maintain", timings):
+                for table_name in maintained_tables:
+                    run_post_load_maintenance(connection, table_name)
+
+    # Stamp a new load version so the API drops cached results for this table
+    if copied:
+        bump_load_version(target_table)
+        if incremental:
+            write_watermark(target_table, watermark)
+            if target_table == "transactions":
+                bump_load_version(ROLLUP_TABLE)
+
+def load_json_files_to_s3_and_redshift(json_folder, table_name, streaming=STREAMING_INGESTION, incremental=False):
     """Transform JSON files to CSV, upload to S3, and trigger the Redshift COPY command."""
-    # Transform JSON files into a single CSV file
-    csv_output_path = os.path.join(json_folder, f"{table_name}.csv")
-    transform_json_to_csv(json_folder, csv_output_path, table_name)
-
-    # Upload the CSV file to S3
-#    s3_key = f"{S3_FOLDER}/{os.path.basename(csv_output_path)}" if S3_FOLDER else os.path.basename(csv_output_path)
-#    upload_to_s3(csv_output_path, S3_BUCKET_NAME, s3_key)
-
-    # Trigger the Redshift COPY command
-#    s3_path = f"s3://{S3_BUCKET_NAME}/{s3_key}"
-#    copy_from_s3_to_redshift(s3_path, table_name)
+    csv_files, _, _ = transform_table(json_folder, table_name, streaming, incremental)
+    load_csv_files(csv_files, incremental=incremental)
+
+def run_load_pipeline(json_folder, tables, jobs=3, streaming=STREAMING_INGESTION, skip_load=False, incremental=False,
+                      snapshot_path=None, profile_path=None, compare_path=None):
+    """
+    Transform, upload and COPY several tables concurrently.
+
+    The independent per-table transforms run in a process pool of `jobs` workers.
+    As soon as one finishes, its upload starts on a thread pool while other tables
+    are still transforming. All uploads share one S3 client and all COPYs share one
+    Redshift connection, taking turns on it. Each full load replaces a table's rows in
+    one transaction, so the pipeline can be rerun without duplicating them. Per-stage
+    wall times are printed at the end.
+    With `incremental=True` only rows newer than each table's watermark are extracted
+    and merged. With a `snapshot_path`, the same CSV files are also applied to the
+    DuckDB snapshot the API can serve from. With a `profile_path`, the wall time, CPU
+    time, rows and peak memory of every stage are written there as a JSON report, and
+    compared with the report at `compare_path` if given.
+    """
+    started = time.perf_counter()
+    timings = []
+    profiling = bool(profile_path or compare_path)
+    if profiling:
+        start_profile()
+    worker_stages = []
+    csv_rows = {}
+    s3_client = None if skip_load else create_s3_client()
+    connection = None if skip_load else connect_to_redshift()
+    copy_lock = threading.Lock()
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as transform_pool, ThreadPoolExecutor(max_workers=jobs) as load_pool:
+            transforms = {
+                transform_pool.submit(transform_table, json_folder, table_name, streaming, incremental, profiling): table_name
+                for table_name in tables
+            }
+            loads = []
+            snapshot_files = []
+            for future in as_completed(transforms):
+                csv_files, seconds, stages = future.result()
+                timings.append((transforms[future], "transform", seconds))
+                worker_stages.extend(stages)
+                # The row count of a CSV file is that of the last stage that wrote it
+                for record in stages:
+                    if record["stage"] in ("write csv", "stream") or record["table"] == ROLLUP_TABLE:
+                        csv_rows[record["table"]] = record["rows_out"]
+                snapshot_files.extend(csv_files)
+                if not skip_load:
+                    loads.append(load_pool.submit(
+                        load_csv_files, csv_files, s3_client, connection, copy_lock, timings, incremental, csv_rows
+                    ))
+            for future in loads:
+                future.result()
+
+        # Swap in the new snapshot once; the version bump makes API caches drop results served from the old one
+        if snapshot_path:
+            with profile_stage("duckdb", "snapshot", timings, rows_in=sum(csv_rows.values()) if csv_rows else None):
+                refresh_duckdb_snapshot(
+                    snapshot_files, snapshot_path, incremental, ROLLUP_TABLE,
+                    QUANTILE_SKETCH_GAMMA, QUANTILE_SKETCH_MIN_VALUE, HLL_REGISTERS
+                )
+            for table_name in {table_name for _, table_name in snapshot_files} | ({ROLLUP_TABLE} if "transactions" in tables else set()):
+                bump_load_version(table_name)
+    finally:
+        if connection is not None:
+            connection.close()
+
+    total_seconds = time.perf_counter() - started
+    print_stage_report(timings, total_seconds)
+    if profiling:
+        arguments = {"tables": list(tables), "jobs": jobs, "streaming": streaming, "skip_load": skip_load,
+                     "incremental": incremental, "snapshot": bool(snapshot_path)}
+        report = build_report(worker_stages + finish_profile(), total_seconds, arguments)
+        if profile_path:
+            write_report(report, profile_path)
+        if compare_path:
+            print_comparison(read_report(compare_path), report)
+    return timings
+
+def print_stage_report(timings, total_seconds):
+    """Print the wall time of every (table, stage) and the end-to-end time."""
+    print("\nLoad pipeline stage timings:")
+    for table_name, stage, seconds in sorted(timings):
+        print(f"  {table_name:<22} {stage:<10} {seconds:8.2f}s")
+    print(f"  {'total (wall)':<33} {total_seconds:8.2f}s")
+    print(f"  {'sum of stages':<33} {sum(seconds for _, _, seconds in timings):8.2f}s")
 
 if __name__ == "__main__":
-    # Test the connection to the Redshift database
-    test_redshift_connection()
-
-    # Test the connection to the S3 bucket
-    test_s3_connection()
-
-    JSON_FOLDER ="/Users/jkiesewalter/Documents/autosense_test_assignment/resources"
+    parser = argparse.ArgumentParser(description="Transform the JSON exports and load them into Redshift.")
+    parser.add_argument("--json-folder", default="/Users/jkiesewalter/Documents/autosense_test_assignment/resources")
+    parser.add_argument("--tables", nargs="+", default=["users", "chargers", "transactions"])
+    parser.add_argument("--jobs", type=int, default=3, help="Number of tables transformed and uploaded in parallel.")
+    parser.add_argument("--streaming", action="store_true", default=STREAMING_INGESTION, help="Use bounded-memory streaming ingestion for transactions.")
+    parser.add_argument("--incremental", action="store_true", help="Only extract rows newer than each table's watermark and merge them.")
+    parser.add_argument("--snapshot", nargs="?", const=DUCKDB_SNAPSHOT_PATH, help="Also write the DuckDB snapshot the API's duckdb backend serves from (optionally to this path).")
+    parser.add_argument("--skip-load", action="store_true", help="Only write the cleaned CSV files, without uploading or copying them.")
+    parser.add_argument("--profile", nargs="?", const="load_profile.json", help="Write a JSON report of the time, CPU, rows and peak memory of every stage (optionally to this path).")
+    parser.add_argument("--compare", metavar="BASELINE", help="Compare the stages with the JSON report of an earlier --profile run.")
+    args = parser.parse_args()
+
+    if not args.skip_load:
+        # Test the connection to the Redshift database
+        test_redshift_connection()
+
+        # Test the connection to the S3 bucket
+        test_s3_connection()
 
     # Load JSON files into S3 and trigger the Redshift COPY command
-    load_json_files_to_s3_and_redshift(JSON_FOLDER, "users")
-    load_json_files_to_s3_and_redshift(JSON_FOLDER, "chargers")
-    load_json_files_to_s3_and_redshift(JSON_FOLDER, "transactions")
\ No newline at end of file
+    run_load_pipeline(args.json_folder, args.tables, jobs=args.jobs, streaming=args.streaming, skip_load=args.skip_load, incremental=args.incremental,
+                      snapshot_path=args.snapshot, profile_path=args.profile, compare_path=args.compare)
@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+import platform
+import threading
+from datetime import datetime, timezone
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Stages slower than the baseline by more than this fraction are reported as regressions
+PROFILE_REGRESSION_THRESHOLD = float(os.getenv("PROFILE_REGRESSION_THRESHOLD", 0.2))
+# Stages faster than this in the baseline are too noisy to flag
+PROFILE_MIN_SECONDS = float(os.getenv("PROFILE_MIN_SECONDS", 0.5))
+
+_CLEAR_REFS_PATH = "/proc/self/clear_refs"
+_STATUS_PATH = "/proc/self/status"
+
+
+def _reset_peak_rss():
+    """Reset the process's peak RSS (Linux); returns whether per-stage peaks are available."""
+    try:
+        with open(_CLEAR_REFS_PATH, "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """Peak resident memory of the process in MB since the last reset (or since start)."""
+    try:
+        with open(_STATUS_PATH) as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is not None:
+        # ru_maxrss is in kB on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    return None
+
+
+class LoadProfile:
+    """
+    Per-(table, stage) wall time, CPU time, rows in/out and peak memory of one loader process.
+
+    CPU time is that of the thread running the stage. Peak memory is the process's
+    resident high-water mark, reset at the start of every stage where Linux allows
+    it; stages running concurrently in one process share it. Nested stages pass
+    their peak on to the enclosing stage.
+    """
+
+    def __init__(self):
+        self.stages = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, table_name, stage, rows_in=None):
+        record = {"table": table_name, "stage": stage, "rows_in": rows_in, "rows_out": None}
+        parents = getattr(self._local, "stack", None)
+        if parents is None:
+            parents = self._local.stack = []
+        record["depth"] = len(parents)
+        record["peak_scope"] = "stage" if _reset_peak_rss() else "process"
+        record["peak_rss_mb"] = 0.0
+        parents.append(record)
+        wall_started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = round(time.perf_counter() - wall_started, 4)
+            record["cpu_seconds"] = round(time.thread_time() - cpu_started, 4)
+            record["peak_rss_mb"] = round(max(record["peak_rss_mb"], _peak_rss_mb() or 0.0), 1)
+            parents.pop()
+            if parents:
+                parents[-1]["peak_rss_mb"] = max(parents[-1]["peak_rss_mb"], record["peak_rss_mb"])
+            with self._lock:
+                self.stages.append(record)
+
+
+_profile = None
+
+
+def start_profile():
+    """Start profiling the stages of this process."""
+    global _profile
+    _profile = LoadProfile()
+    return _profile
+
+
+def finish_profile():
+    """Stop profiling and return the recorded stages."""
+    global _profile
+    profile, _profile = _profile, None
+    return profile.stages if profile is not None else []
+
+
+@contextmanager
+def profile_stage(table_name, stage, timings=None, rows_in=None):
+    """
+    Time a loader stage.
+
+    Yields a dict whose `rows_out` (and `rows_in`) the stage can fill in. The wall
+    time is appended to `timings` as `(table, stage, seconds)` when given; the
+    full record is kept only while a profile is active.
+    """
+    started = time.perf_counter()
+    try:
+        if _profile is None:
+            yield {"rows_in": rows_in, "rows_out": None}
+        else:
+            with _profile.stage(table_name, stage, rows_in) as record:
+                yield record
+    finally:
+        if timings is not None:
+            timings.append((table_name, stage, time.perf_counter() - started))
+
+
+def build_report(stages, total_seconds, arguments):
+    """Assemble the JSON profile report of one loader run."""
+    tables = {}
+    for record in stages:
+        totals = tables.setdefault(record["table"], {"wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_mb": 0.0})
+        # Nested stages are already counted in the stage enclosing them
+        if record["depth"] == 0:
+            totals["wall_seconds"] = round(totals["wall_seconds"] + record["wall_seconds"], 4)
+            totals["cpu_seconds"] = round(totals["cpu_seconds"] + record["cpu_seconds"], 4)
+        totals["peak_rss_mb"] = max(totals["peak_rss_mb"], record["peak_rss_mb"])
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "arguments": arguments,
+        "total_wall_seconds": round(total_seconds, 4),
+        "tables": tables,
+        "stages": sorted(stages, key=lambda record: (record["table"], record["stage"]))
+    }
+
+
+def write_report(report, path):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Load profile written to {path}")
+
+
+def read_report(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare_reports(baseline, current, threshold=PROFILE_REGRESSION_THRESHOLD, min_seconds=PROFILE_MIN_SECONDS):
+    """
+    Compare two profile reports stage by stage.
+
+    Returns `(rows, regressions)`: one row per (table, stage) present in either
+    report with the wall time, CPU time and peak memory of both, and the rows whose
+    wall time, CPU time or peak memory grew by more than `threshold`. Stages that
+    took less than `min_seconds` in the baseline are not flagged for time.
+    """
+    def index(report):
+        return {(record["table"], record["stage"]): record for record in report["stages"]}
+
+    before, after = index(baseline), index(current)
+    rows, regressions = [], []
+    for key in sorted(set(before) | set(after)):
+        old, new = before.get(key), after.get(key)
+        row = {"table": key[0], "stage": key[1], "before": old, "after": new, "regressed": []}
+        if old is not None and new is not None:
+            for metric in ("wall_seconds", "cpu_seconds"):
+                if old[metric] >= min_seconds and new[metric] > old[metric] * (1 + threshold):
+                    row["regressed"].append(metric)
+            if old["peak_rss_mb"] and new["peak_rss_mb"] > old["peak_rss_mb"] * (1 + threshold):
+                row["regressed"].append("peak_rss_mb")
+        rows.append(row)
+        if row["regressed"]:
+            regressions.append(row)
+    return rows, regressions
+
+
+def print_comparison(baseline, current, threshold=PROFILE_REGRESSION_THRESHOLD):
+    """Print a stage-by-stage comparison of two reports; returns the regressed stages."""
+    rows, regressions = compare_reports(baseline, current, threshold)
+
+    def cell(record, metric, unit):
+        return f"{record[metric]:9.2f}{unit}" if record is not None else f"{'-':>10}"
+
+    print(f"\nLoad profile comparison ({baseline['created_at']} -> {current['created_at']}):")
+    print(f"  {'table':<22} {'stage':<14} {'wall before':>11} {'wall after':>11} {'cpu after':>11} {'peak MB after':>14}")
+    for row in rows:
+        flag = "  REGRESSION: " + ", ".join(row["regressed"]) if row["regressed"] else ""
+        print(
+            f"  {row['table']:<22} {row['stage']:<14} {cell(row['before'], 'wall_seconds', 's'):>11} "
+            f"{cell(row['after'], 'wall_seconds', 's'):>11} {cell(row['after'], 'cpu_seconds', 's'):>11} "
+            f"{cell(row['after'], 'peak_rss_mb', ''):>14}{flag}"
+        )
+    print(f"  {'total (wall)':<37} {baseline['total_wall_seconds']:10.2f}s {current['total_wall_seconds']:10.2f}s")
+    print(f"{len(regressions)} stage(s) regressed by more than {threshold:.0%}.")
+    return regressions
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python load_profile.py BASELINE.json CURRENT.json")
+    regressed = print_comparison(read_report(sys.argv[1]), read_report(sys.argv[2]))
+    sys.exit(1 if regressed else 0)
@@ -0,0 +1,154 @@
+import os
+import json
+import sqlite3
+import tempfile
+
+# Rough per-entry footprint of a small dict entry holding a string key and a tuple value
+ESTIMATED_ENTRY_BYTES = 200
+
+# Max number of bound parameters per SQLite statement
+SQLITE_MAX_PARAMS = 900
+
+
+def iter_json_array(path, buffer_size=1 << 20):
+    """
+    Yield the elements of a top-level JSON array one at a time.
+
+    The file is read in `buffer_size` chunks and each element is decoded as soon as
+    it is complete, so memory holds one chunk plus one element instead of the whole
+    document.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as file:
+        buffer = ""
+        position = 0
+        eof = False
+        started = False
+        while True:
+            # Skip whitespace and separators between elements
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position >= len(buffer):
+                if eof:
+                    raise ValueError(f"Unexpected end of JSON array in {path}")
+                chunk = file.read(buffer_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError(f"Expected a JSON array in {path}")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = file.read(buffer_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            # A scalar that ends exactly at the buffer boundary may continue in the next chunk
+            if end == len(buffer) and not eof:
+                chunk = file.read(buffer_size)
+                eof = not chunk
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield element
+            position = end
+
+
+def iter_chunks(iterable, chunk_size):
+    """Group an iterable into lists of at most `chunk_size` items."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class SpillableIndex:
+    """
+    Key-value index that lives in a dict until it exceeds its memory budget.
+
+    Once `len(index) * ESTIMATED_ENTRY_BYTES` passes `memory_budget_bytes`, all entries
+    move to a temporary SQLite file and later writes and lookups go there. Later
+    writes to an existing key replace it, like assigning to a dict.
+    """
+
+    def __init__(self, memory_budget_bytes, value_columns, spill_dir=None):
+        self.memory_budget_bytes = memory_budget_bytes
+        self.value_columns = value_columns
+        self.spill_dir = spill_dir
+        self._entries = {}
+        self._connection = None
+        self._path = None
+
+    @property
+    def spilled(self):
+        return self._connection is not None
+
+    def put_many(self, items):
+        """Insert `(key, value_tuple)` pairs."""
+        if self._connection is None:
+            self._entries.update(items)
+            if len(self._entries) * ESTIMATED_ENTRY_BYTES > self.memory_budget_bytes:
+                self._spill()
+        else:
+            self._insert(items)
+
+    def get_many(self, keys):
+        """Return a dict with the values of the keys that are present."""
+        if self._connection is None:
+            return {key: self._entries[key] for key in keys if key in self._entries}
+        found = {}
+        keys = list(dict.fromkeys(keys))
+        columns = ", ".join(self.value_columns)
+        for offset in range(0, len(keys), SQLITE_MAX_PARAMS):
+            batch = keys[offset:offset + SQLITE_MAX_PARAMS]
+            placeholders = ", ".join("?" * len(batch))
+            rows = self._connection.execute(
+                f"SELECT key, {columns} FROM entries WHERE key IN ({placeholders})", batch
+            )
+            for row in rows:
+                found[row[0]] = tuple(row[1:])
+        return found
+
+    def close(self):
+        """Remove the spill file, if any."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            os.remove(self._path)
+        self._entries = {}
+
+    def _spill(self):
+        file_descriptor, self._path = tempfile.mkstemp(suffix=".sqlite", dir=self.spill_dir)
+        os.close(file_descriptor)
+        self._connection = sqlite3.connect(self._path)
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+        # Columns without a declared type keep the Python value types as they are
+        columns = ", ".join(self.value_columns)
+        self._connection.execute(f"CREATE TABLE entries (key PRIMARY KEY, {columns})")
+        self._insert(self._entries.items())
+        print(f"Index exceeded {self.memory_budget_bytes} bytes; spilled {len(self._entries)} entries to {self._path}")
+        self._entries = {}
+
+    def _insert(self, items):
+        placeholders = ", ".join("?" * (len(self.value_columns) + 1))
+        self._connection.executemany(
+            f"INSERT OR REPLACE INTO entries VALUES ({placeholders})",
+            ((key, *value) for key, value in items)
+        )
+        self._connection.commit()
@@ -0,0 +1,160 @@
+import os
+
+# Bump a table's version whenever its DDL below changes; the loader then rebuilds it
+TABLE_VERSIONS = {
+    "users": 1,
+    "chargers": 1,
+    "transactions": 1,
+    "charger_daily_usage": 3
+}
+
+# Column lists (in CSV order) with types and compression encodings. The leading sort key
+# column stays RAW so zone maps on it are not hidden behind compressed blocks.
+TABLE_COLUMNS = {
+    "users": [
+        ("user_id", "VARCHAR(64) ENCODE RAW"),
+        ("full_name", "VARCHAR(256) ENCODE ZSTD"),
+        ("first_name", "VARCHAR(128) ENCODE ZSTD"),
+        ("last_name", "VARCHAR(128) ENCODE ZSTD"),
+        ("email", "VARCHAR(256) ENCODE ZSTD"),
+        ("tier", "VARCHAR(32) ENCODE BYTEDICT"),
+        ("created_at", "TIMESTAMP ENCODE AZ64")
+    ],
+    "chargers": [
+        ("charger_id", "VARCHAR(64) ENCODE RAW"),
+        ("city", "VARCHAR(128) ENCODE BYTEDICT"),
+        ("location_lat", "DOUBLE PRECISION ENCODE ZSTD"),
+        ("location_lon", "DOUBLE PRECISION ENCODE ZSTD"),
+        ("installed_at", "TIMESTAMP ENCODE AZ64")
+    ],
+    "transactions": [
+        ("session_id", "VARCHAR(64) ENCODE ZSTD"),
+        ("user_id", "VARCHAR(64) ENCODE ZSTD"),
+        ("charger_id", "VARCHAR(64) ENCODE RAW"),
+        ("start_time", "TIMESTAMP ENCODE AZ64"),
+        ("end_time", "TIMESTAMP ENCODE AZ64"),
+        ("kWh_consumed", "DOUBLE PRECISION ENCODE ZSTD"),
+        ("status", "VARCHAR(32) ENCODE BYTEDICT"),
+        ("payment_method", "VARCHAR(32) ENCODE BYTEDICT"),
+        ("amount", "DOUBLE PRECISION ENCODE ZSTD"),
+        ("currency", "VARCHAR(8) ENCODE BYTEDICT")
+    ],
+    "charger_daily_usage": [
+        ("charger_id", "VARCHAR(64) ENCODE RAW"),
+        ("usage_date", "DATE ENCODE AZ64"),
+        ("status", "VARCHAR(32) ENCODE BYTEDICT"),
+        ("session_count", "BIGINT ENCODE AZ64"),
+        ("kwh_count", "BIGINT ENCODE AZ64"),
+        ("kwh_sum", "DOUBLE PRECISION ENCODE ZSTD"),
+        ("kwh_min", "DOUBLE PRECISION ENCODE ZSTD"),
+        ("kwh_max", "DOUBLE PRECISION ENCODE ZSTD"),
+        ("max_end_time", "TIMESTAMP ENCODE AZ64"),
+        ("kwh_sketch", "VARCHAR(65535) ENCODE ZSTD"),
+        ("user_hll", "VARCHAR(65535) ENCODE ZSTD")
+    ]
+}
+
+# Distribution and sort keys. The small dimension tables are copied to every node, so
+# joining them to transactions never redistributes rows. Transactions and the rollup
+# are distributed and sorted by charger, so per-charger time ranges only read a few blocks.
+TABLE_ATTRIBUTES = {
+    "users": "DISTSTYLE ALL SORTKEY (user_id)",
+    "chargers": "DISTSTYLE ALL SORTKEY (charger_id)",
+    "transactions": "DISTKEY (charger_id) COMPOUND SORTKEY (charger_id, start_time)",
+    "charger_daily_usage": "DISTKEY (charger_id) COMPOUND SORTKEY (charger_id, usage_date)"
+}
+
+# Table recording which DDL version each loaded table was created with
+VERSIONS_TABLE = "loader_table_versions"
+
+# Run VACUUM after every load (ANALYZE always runs); set to false on busy clusters
+POST_LOAD_VACUUM = os.getenv("POST_LOAD_VACUUM", "true").lower() == "true"
+VACUUM_SORT_THRESHOLD = int(os.getenv("VACUUM_SORT_THRESHOLD", 95))
+
+
+def create_table_sql(table_name, target_name=None):
+    """Return the CREATE TABLE statement of a table, optionally under another name."""
+    columns = ",\n    ".join(f"{name} {definition}" for name, definition in TABLE_COLUMNS[table_name])
+    return f"CREATE TABLE {target_name or table_name} (\n    {columns}\n)\n{TABLE_ATTRIBUTES[table_name]};"
+
+
+def _table_exists(cursor, table_name):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_schema = current_schema() AND table_name = %s",
+        (table_name.lower(),)
+    )
+    return cursor.fetchone()[0] > 0
+
+
+def _existing_columns(cursor, table_name):
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = current_schema() AND table_name = %s",
+        (table_name.lower(),)
+    )
+    return {row[0].lower() for row in cursor.fetchall()}
+
+
+def _applied_version(cursor, table_name):
+    cursor.execute(f"SELECT MAX(version) FROM {VERSIONS_TABLE} WHERE table_name = %s", (table_name,))
+    row = cursor.fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+
+def ensure_table_layout(connection, table_name):
+    """
+    Create a table with its current DDL, or rebuild it if it was created with an older version.
+
+    A rebuild is a deep copy: the rows move into a table with the new layout,
+    which then replaces the old one, all in one transaction. Columns added by the
+    new version stay NULL until the next load fills them. Returns whether the
+    table was created or rebuilt.
+    """
+    version = TABLE_VERSIONS[table_name]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} "
+                "(table_name VARCHAR(64), version INTEGER, applied_at TIMESTAMP DEFAULT GETDATE());"
+            )
+            if _table_exists(cursor, table_name):
+                if _applied_version(cursor, table_name) >= version:
+                    connection.commit()
+                    return False
+                existing = _existing_columns(cursor, table_name)
+                columns = ", ".join(name for name, _ in TABLE_COLUMNS[table_name] if name.lower() in existing)
+                print(f"Rebuilding table {table_name} with layout version {version}.")
+                cursor.execute(f"DROP TABLE IF EXISTS {table_name}_rebuild;")
+                cursor.execute(create_table_sql(table_name, f"{table_name}_rebuild"))
+                cursor.execute(f"INSERT INTO {table_name}_rebuild ({columns}) SELECT {columns} FROM {table_name};")
+                cursor.execute(f"DROP TABLE {table_name};")
+                cursor.execute(f"ALTER TABLE {table_name}_rebuild RENAME TO {table_name};")
+            else:
+                print(f"Creating table {table_name} with layout version {version}.")
+                cursor.execute(create_table_sql(table_name))
+            cursor.execute(f"INSERT INTO {VERSIONS_TABLE} (table_name, version) VALUES (%s, %s);", (table_name, version))
+        connection.commit()
+        return True
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def run_post_load_maintenance(connection, table_name):
+    """
+    Re-sort and refresh planner statistics of a table after a load.
+
+    VACUUM cannot run inside a transaction, so autocommit is switched on for the
+    duration. Failures are reported but do not fail the load.
+    """
+    previous_autocommit = connection.autocommit
+    try:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            if POST_LOAD_VACUUM:
+                cursor.execute(f"VACUUM {table_name} TO {VACUUM_SORT_THRESHOLD} PERCENT;")
+            cursor.execute(f"ANALYZE {table_name};")
+        print(f"Vacuumed and analyzed table {table_name}." if POST_LOAD_VACUUM else f"Analyzed table {table_name}.")
+    except Exception as e:
+        print(f"Post-load maintenance of {table_name} failed: {e}")
+    finally:
+        connection.autocommit = previous_autocommit
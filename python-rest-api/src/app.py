@@ -1,24 +1,70 @@
+import threading
 from flask import Flask, request, jsonify
-from controllers.user_controller import UserController
-from controllers.charger_controller import ChargerController
-from controllers.transaction_controller import TransactionController
 from routes import register_routes
+from routes.user_routes import user_controller
+from routes.charger_routes import charger_controller
+from routes.transaction_routes import transaction_controller
+from utils.streaming import negotiate_format, stream_response
+from utils.metrics import METRICS_ENABLED
+from utils.request_metrics import init_request_metrics
+from utils.concurrency_limits import init_concurrency_limits
+from utils.statement_timeouts import QueryTimeoutError, init_statement_timeouts
+from utils.compression import init_compression
+from utils.conditional_get import init_conditional_get
+from db.backends import get_backend
 
-def create_app():
+def create_app(limit_concurrency=True):
+    """
+    Build the Flask app.
+
+    With `limit_concurrency`, each endpoint handles a bounded number of requests at
+    once (see `utils.concurrency_limits`); the ASGI entry point limits them on its
+    event loop instead and turns this off.
+    """
     app = Flask(__name__)
 
-    # Initialize controllers
-    user_controller = UserController()
-    charger_controller = ChargerController()
-    transaction_controller = TransactionController()
+    # The routes below share the blueprints' controllers, so each index and cache exists once per process.
+    # Build their in-memory indexes in the background so the first lookup does not wait for them
+    if user_controller.user_search is not None:
+        threading.Thread(target=user_controller.user_search.warm_up, daemon=True).start()
+    threading.Thread(target=charger_controller.locations.warm_up, daemon=True).start()
+
+    # Per-endpoint latency, database time, rows and bytes, served on /metrics
+    if METRICS_ENABLED:
+        init_request_metrics(app, get_backend())
+
+    # zstd/gzip response compression; registered first so its after_request hook runs after the ETag is set
+    init_compression(app)
 
-    # Middleware can be added here
+    # ETags from the load versions; unchanged GETs get a 304 before running a query, and under WSGI before
+    # taking a concurrency slot (the ASGI middleware admits the request before Flask sees it)
+    init_conditional_get(app)
+
+    # Per-endpoint concurrency limits, so slow scans cannot take every server thread
+    if limit_concurrency:
+        init_concurrency_limits(app)
+
+    # Per-endpoint statement timeouts, so unbounded scans are cancelled instead of piling up
+    init_statement_timeouts(app)
 
     register_routes(app)
 
+    @app.errorhandler(ValueError)
+    def handle_invalid_parameter(error):
+        # Invalid query parameters such as a malformed `limit` or `cursor`
+        return jsonify({"error": str(error)}), 400
+
+    @app.errorhandler(QueryTimeoutError)
+    def handle_query_timeout(error):
+        # The database cancelled a query that exceeded its endpoint's statement timeout
+        return jsonify({"error": str(error)}), 504
+
     @app.route('/users', methods=['GET'])
     def get_users():
         filters = request.args.to_dict()
+        response_format = negotiate_format(request)
+        if response_format != "json":
+            return stream_response(response_format, user_controller.stream_users(filters))
         result = user_controller.get_users(filters)
         return jsonify(result)
 
@@ -28,18 +74,14 @@ def create_app():
         result = charger_controller.get_chargers(filters)
         return jsonify(result)
 
-    @app.route('/chargers/<charger_id>/usage-analytics', methods=['GET'])
-    def get_usage_analytics(charger_id):
-        filters = request.args.to_dict()
-        result = charger_controller.get_usage_analytics(charger_id, filters)
-        return jsonify(result)
-
     @app.route('/transactions-extended', methods=['GET'])
     def get_transactions_extended():
         filters = request.args.to_dict()
+        response_format = negotiate_format(request)
+        if response_format != "json":
+            return stream_response(response_format, transaction_controller.stream_transactions_extended(filters))
         result = transaction_controller.get_transactions_extended(filters)
         return jsonify(result)
-
     return app
 
 if __name__ == "__main__":
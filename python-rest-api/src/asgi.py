@@ -0,0 +1,35 @@
+import os
+
+from dotenv import load_dotenv
+
+from app import create_app
+from utils.concurrency_limits import ConcurrencyLimitMiddleware
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:  # Only needed for the ASGI serving mode
+    WSGIMiddleware = None
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Threads per worker process that run the Flask handlers and their blocking database calls
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", 32))
+
+
+def create_asgi_app():
+    """
+    Wrap the Flask app for an ASGI server such as uvicorn.
+
+    Connections and requests waiting for an endpoint slot live on the event loop;
+    admitted requests run the Flask handlers on a pool of `ASGI_THREADS` threads,
+    since redshift_connector has no non-blocking interface.
+    """
+    if WSGIMiddleware is None:
+        raise ImportError("The ASGI serving mode requires the a2wsgi package.")
+    flask_app = create_app(limit_concurrency=False)
+    return ConcurrencyLimitMiddleware(WSGIMiddleware(flask_app, workers=ASGI_THREADS), flask_app.url_map)
+
+
+# Entry point of `uvicorn asgi:app`
+app = create_asgi_app()
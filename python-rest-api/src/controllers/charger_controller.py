@@ -1,87 +1,636 @@
 import os
-import redshift_connector
-from dotenv import load_dotenv
+import numpy as np
+from datetime import datetime, timedelta, time
+from db.backends import get_backend, fetch_all
+from db.bulk_lookup import parse_lookup, lookup_rows, build_lookup_response
+from utils.cache import ResultCache, get_shared_cache_backend
+from utils.load_version import read_load_version
+from utils.pagination import parse_row_limit
+from db.query_spec import QuerySpec, Filter, parse_text, parse_substring
+from indexes.charger_locations import ChargerLocations
+from indexes.usage_series import BUCKETS, ChargerUsageSlices, compute_usage_series, parse_timezone, parse_local_datetime
+from utils.sketches import (
+    merge_histograms,
+    decode_quantile_sketch, add_values_to_quantile_sketch, sketch_quantile,
+    decode_hll, merge_hll, add_values_to_hll, hll_estimate,
+    QUANTILE_SKETCH_RELATIVE_ACCURACY, HLL_STANDARD_ERROR
+)
+
+# Filters, projection and order of /chargers
+CHARGERS_QUERY = QuerySpec(
+    "chargers",
+    ["charger_id", "city", "location_lat", "location_lon", "installed_at"],
+    {
+        "charger_id": Filter("charger_id = %s", parse_text),
+        "city": Filter("city ILIKE %s", parse_substring)
+    },
+    key=["charger_id"]
+)
+
+# Usage analytics only change when the loader reloads transactions, so results can be cached
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", 300))
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", 4096))
+
+# Answer whole days of bounded analytics windows from the charger_daily_usage rollup
+USAGE_ROLLUP_ENABLED = os.getenv("USAGE_ROLLUP_ENABLED", "true").lower() == "true"
+
+# Limits of the nearby-chargers lookups
+NEARBY_DEFAULT_K = int(os.getenv("NEARBY_DEFAULT_K", 10))
+NEARBY_MAX_K = int(os.getenv("NEARBY_MAX_K", 100))
+NEARBY_BATCH_MAX_POINTS = int(os.getenv("NEARBY_BATCH_MAX_POINTS", 1000))
+
+# Most chargers one batch usage analytics request may cover
+ANALYTICS_BATCH_MAX_CHARGERS = int(os.getenv("ANALYTICS_BATCH_MAX_CHARGERS", 500))
+
+# Fields of the usage analytics, in the order of the list /chargers/{charger_id}/usage-analytics returns
+ANALYTICS_FIELDS = (
+    "total_transactions", "total_kWh", "biggest_transaction_kWh",
+    "smallest_transaction_kWh", "average_transaction_kWh", "median_transaction_kWh"
+)
+
+
+def normalize_datetime_filter(value):
+    """Normalize a datetime query parameter so equivalent spellings share a cache entry."""
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value).isoformat(sep=" ")
+    except ValueError:
+        # Leave values Python cannot parse for Redshift to interpret
+        return value
+
+
+def analytics_as_dict(analytics):
+    """Name the fields of an exact analytics list; approximate analytics are dicts already."""
+    if isinstance(analytics, dict):
+        return analytics
+    return dict(zip(ANALYTICS_FIELDS, analytics))
+
+
+def parse_quantiles(value):
+    """Parse a comma-separated list of quantiles in [0, 1] into a sorted tuple without duplicates."""
+    quantiles = set()
+    for item in value.split(","):
+        try:
+            q = float(item)
+        except ValueError:
+            raise ValueError(f"Invalid quantiles: {item.strip()!r} is not a number.")
+        if not 0 <= q <= 1:
+            raise ValueError(f"Invalid quantiles: {q} must be between 0 and 1.")
+        quantiles.add(q)
+    return tuple(sorted(quantiles))
+
+
+def parse_float_parameter(value, name, minimum, maximum=None):
+    """Validate a numeric query parameter, raising ValueError (a 400 response) if it is invalid."""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r} is not a number.")
+    if not np.isfinite(number):
+        raise ValueError(f"Invalid {name}: {value!r} is not a finite number.")
+    if maximum is None and number < minimum:
+        raise ValueError(f"Invalid {name}: {number} must be at least {minimum}.")
+    if maximum is not None and not minimum <= number <= maximum:
+        raise ValueError(f"Invalid {name}: {number} must be between {minimum} and {maximum}.")
+    return number
+
+
+def parse_nearby_options(options):
+    """Validate `radius_km` and `k` of a nearby lookup; without either, the `NEARBY_DEFAULT_K` nearest are returned."""
+    radius_km = options.get("radius_km")
+    k = options.get("k")
+    radius_km = parse_float_parameter(radius_km, "radius_km", 0, None) if radius_km not in (None, "") else None
+    if k not in (None, ""):
+        if isinstance(k, float) or not str(k).isdigit() or not 1 <= int(k) <= NEARBY_MAX_K:
+            raise ValueError(f"Invalid k: {k!r} must be an integer between 1 and {NEARBY_MAX_K}.")
+        k = int(k)
+    elif radius_km is None:
+        k = NEARBY_DEFAULT_K
+    else:
+        k = None
+    return radius_km, k
 
-# Load environment variables from .env file
-load_dotenv()
 
 class ChargerController:
-    def __init__(self):
-        self.connection = redshift_connector.connect(
-            host=os.getenv("REDSHIFT_HOST"),
-            port=int(os.getenv("REDSHIFT_PORT", 5439)),
-            database=os.getenv("REDSHIFT_DBNAME"),
-            user=os.getenv("REDSHIFT_USER"),
-            password=os.getenv("REDSHIFT_PASSWORD")
+    def __init__(self, backend=None, analytics_cache=None):
+        # All controllers share one query backend (a pooled Redshift or a local snapshot)
+        self.backend = backend or get_backend()
+        self.analytics_cache = analytics_cache or ResultCache(
+            "usage_analytics",
+            ttl=ANALYTICS_CACHE_TTL,
+            max_entries=ANALYTICS_CACHE_MAX_ENTRIES,
+            shared_backend=get_shared_cache_backend()
         )
-        self.connection.autocommit = True  # Enable auto-commit mode
+        self.locations = ChargerLocations(self.backend)
+        self.usage_slices = ChargerUsageSlices(self.backend)
 
     def get_chargers(self, filters=None):
         """
         GET /chargers
         Returns all chargers or filters based on charger_id and city.
+        `fields` limits the returned columns, `sort` orders the rows (charger_id by
+        default) and `limit` caps their number.
         """
-        sql = "SELECT * FROM chargers"
-        conditions = []
-        params = []
-
-        if filters:
-            if "charger_id" in filters:
-                conditions.append("charger_id = %s")
-                params.append(filters["charger_id"])
-            if "city" in filters:
-                conditions.append("city ILIKE %s")
-                params.append(f"%{filters['city']}%")
-
-        if conditions:
-            sql += " WHERE " + " AND ".join(conditions)
-
-        print(f"Executing SQL: {sql} with params: {params}")
+        filters = filters or {}
+        sql, params, _ = CHARGERS_QUERY.build(filters, parse_row_limit(filters.get("limit")))
 
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(sql, tuple(params))
-                result = cursor.fetchall()
-            return result
+            _, rows = fetch_all(self.backend, sql, params)
+            return rows
         except Exception as e:
             print(f"Error executing query in get_chargers: {e}")
             raise
 
+    def lookup_chargers(self, payload):
+        """
+        POST /chargers/lookup
+        Returns the chargers of the `ids` in the JSON body keyed by charger_id, and the
+        ids that do not exist as `missing`. `fields` limits the returned columns.
+        Answered from the in-memory charger index, or with chunked SQL if it is unavailable.
+        """
+        ids, fields = parse_lookup(payload, CHARGERS_QUERY)
+        try:
+            chargers = self.locations.current().by_id
+        except Exception as e:
+            print(f"Charger index unavailable, falling back to SQL: {e}")
+            return build_lookup_response(ids, lookup_rows(self.backend, CHARGERS_QUERY, ids, fields))
+
+        if fields is not None and "charger_id" not in fields:
+            fields += ("charger_id",)
+        found = {}
+        for charger_id in ids:
+            charger = chargers.get(charger_id)
+            if charger is not None:
+                found[charger_id] = charger if fields is None else {field: charger.get(field) for field in fields}
+        return build_lookup_response(ids, found)
+
+    def get_nearby_chargers(self, filters):
+        """
+        GET /chargers/nearby
+        Returns the chargers near `lat`/`lon`, nearest first, each with its `distance_km`.
+        Pass `radius_km` for all chargers within a radius and/or `k` for the k nearest.
+        """
+        lat = parse_float_parameter(filters.get("lat"), "lat", -90, 90)
+        lon = parse_float_parameter(filters.get("lon"), "lon", -180, 180)
+        radius_km, k = parse_nearby_options(filters)
+        return self.locations.current().nearby([lat], [lon], radius_km=radius_km, k=k)[0]
+
+    def get_nearby_chargers_batch(self, payload):
+        """
+        POST /chargers/nearby/batch
+        Runs the nearby lookup for many points at once. The JSON body holds `points`
+        (a list of `{"lat": ..., "lon": ...}`) plus the shared `radius_km` and `k`.
+        Returns one result list per point, in the same order.
+        """
+        if not isinstance(payload, dict) or not isinstance(payload.get("points"), list):
+            raise ValueError("Invalid body: expected a JSON object with a list of points.")
+        points = payload["points"]
+        if len(points) > NEARBY_BATCH_MAX_POINTS:
+            raise ValueError(f"Invalid body: at most {NEARBY_BATCH_MAX_POINTS} points per request.")
+        lats, lons = [], []
+        for position, point in enumerate(points):
+            if not isinstance(point, dict):
+                raise ValueError(f"Invalid point {position}: expected an object with lat and lon.")
+            lats.append(parse_float_parameter(point.get("lat"), f"lat of point {position}", -90, 90))
+            lons.append(parse_float_parameter(point.get("lon"), f"lon of point {position}", -180, 180))
+        radius_km, k = parse_nearby_options(payload)
+        if not points:
+            return []
+        return self.locations.current().nearby(lats, lons, radius_km=radius_km, k=k)
+
     def get_usage_analytics(self, charger_id, filters=None):
         """
         GET /chargers/{charger_id}/usage-analytics
         Returns usage analytics for a specific charger.
+        With `approx=true` the analytics are merged from the rollup's sketches and
+        include distinct users, optional kWh `quantiles` and their error bounds.
+        Results are cached per normalized filter set until the next transactions load.
+        """
+        filters = filters or {}
+        if self._is_approx(filters):
+            quantiles = parse_quantiles(filters["quantiles"]) if "quantiles" in filters else ()
+            compute = lambda: self._query_usage_analytics_approx([charger_id], filters, quantiles)[charger_id]
+        else:
+            compute = lambda: self._query_usage_analytics([charger_id], filters)[charger_id]
+        return self.analytics_cache.get_or_compute(
+            self._analytics_cache_key(charger_id, filters), compute, version=read_load_version("transactions")
+        )
+
+    def get_usage_analytics_batch(self, filters=None):
+        """
+        GET /chargers/usage-analytics
+        Returns usage analytics for many chargers at once, keyed by charger_id.
+        Chargers are given as comma-separated `charger_ids` or selected by `city`;
+        the start_datetime/end_datetime/status/approx filters apply to all of them.
+        Cached results are reused and the rest is computed with grouped queries, the
+        same way as for a single charger, so both endpoints share cache entries.
+        Each charger's analytics are an object with the fields of `ANALYTICS_FIELDS`.
+        """
+        filters = filters or {}
+        charger_ids = self._resolve_batch_chargers(filters)
+        approx = self._is_approx(filters)
+        quantiles = parse_quantiles(filters["quantiles"]) if approx and "quantiles" in filters else ()
+        version = read_load_version("transactions")
+
+        results = {}
+        missing = []
+        for charger_id in charger_ids:
+            found, value = self.analytics_cache.get(self._analytics_cache_key(charger_id, filters), version)
+            if found:
+                results[charger_id] = value
+            else:
+                missing.append(charger_id)
+
+        if missing:
+            if approx:
+                computed = self._query_usage_analytics_approx(missing, filters, quantiles)
+            else:
+                computed = self._query_usage_analytics(missing, filters)
+            for charger_id in missing:
+                self.analytics_cache.set(self._analytics_cache_key(charger_id, filters), computed[charger_id], version)
+                results[charger_id] = computed[charger_id]
+        return {charger_id: analytics_as_dict(results[charger_id]) for charger_id in charger_ids}
+
+    def _resolve_batch_chargers(self, filters):
+        """Return the distinct charger_ids a batch request covers, enforcing `ANALYTICS_BATCH_MAX_CHARGERS`."""
+        if "charger_ids" in filters:
+            charger_ids = list(dict.fromkeys(
+                charger_id.strip() for charger_id in filters["charger_ids"].split(",") if charger_id.strip()
+            ))
+        elif "city" in filters:
+            charger_ids = [row[0] for row in self.get_chargers({"city": filters["city"]})]
+        else:
+            raise ValueError("Invalid request: pass charger_ids or city.")
+        if not charger_ids:
+            raise ValueError("Invalid request: no chargers selected.")
+        if len(charger_ids) > ANALYTICS_BATCH_MAX_CHARGERS:
+            raise ValueError(
+                f"Invalid request: {len(charger_ids)} chargers selected, at most {ANALYTICS_BATCH_MAX_CHARGERS} allowed."
+            )
+        return charger_ids
+
+    def _is_approx(self, filters):
+        approx = filters.get("approx", "false").lower()
+        if approx not in ("true", "false"):
+            raise ValueError(f"Invalid approx: {approx!r} must be true or false.")
+        return approx == "true"
+
+    def _analytics_cache_key(self, charger_id, filters):
+        """Cache key of one charger's analytics under normalized filters."""
+        key = (
+            charger_id,
+            normalize_datetime_filter(filters.get("start_datetime")),
+            normalize_datetime_filter(filters.get("end_datetime")),
+            filters.get("status")
+        )
+        if self._is_approx(filters):
+            key += ("approx", parse_quantiles(filters["quantiles"]) if "quantiles" in filters else ())
+        return key
+
+    def get_usage_timeseries(self, charger_id, filters=None):
+        """
+        GET /chargers/{charger_id}/usage-timeseries
+        Returns session counts and kWh per `bucket` (hour, day or week) for a charger.
+        Buckets start on wall-clock boundaries in `tz` (default UTC), naive
+        start_datetime/end_datetime are read in that timezone, and empty buckets are
+        included unless `fill=false`. Computed with NumPy from a cached per-charger slice.
+        """
+        filters = filters or {}
+        bucket = filters.get("bucket", "hour")
+        if bucket not in BUCKETS:
+            raise ValueError(f"Invalid bucket: {bucket!r} must be one of {', '.join(BUCKETS)}.")
+        tz_name = filters.get("tz", "UTC")
+        tz = parse_timezone(tz_name)
+        start = parse_local_datetime(filters["start_datetime"], "start_datetime", tz) if "start_datetime" in filters else None
+        end = parse_local_datetime(filters["end_datetime"], "end_datetime", tz) if "end_datetime" in filters else None
+        if start is not None and end is not None and start >= end:
+            raise ValueError("Invalid range: start_datetime must be before end_datetime.")
+        fill = filters.get("fill", "true").lower()
+        if fill not in ("true", "false"):
+            raise ValueError(f"Invalid fill: {fill!r} must be true or false.")
+
+        usage_slice = self.usage_slices.get(charger_id)
+        series = compute_usage_series(
+            usage_slice, bucket, tz, start=start, end=end, status=filters.get("status"), fill=fill == "true"
+        )
+        return {"charger_id": charger_id, "bucket": bucket, "tz": tz_name, "series": series}
+
+    def _query_usage_analytics(self, charger_ids, filters):
+        """
+        Compute usage analytics of chargers from the daily rollup where possible, else
+        from raw transactions; returns a dict of charger_id to analytics list.
+        """
+        window = self._rollup_window(filters) if USAGE_ROLLUP_ENABLED else None
+        if window is not None:
+            try:
+                return self._query_usage_analytics_from_rollup(charger_ids, filters, *window)
+            except Exception as e:
+                print(f"Rollup query failed in get_usage_analytics, using raw transactions: {e}")
+        return self._query_usage_analytics_from_transactions(charger_ids, filters)
+
+    def _rollup_window(self, filters):
+        """
+        Split a bounded window into the whole days the rollup can answer.
+
+        Returns `(start, end, first_day, end_day)` where the days in
+        [first_day, end_day) lie completely inside [start, end], or None if the window
+        is open, timezone-aware or shorter than one whole day.
+        """
+        try:
+            start = datetime.fromisoformat(filters["start_datetime"])
+            end = datetime.fromisoformat(filters["end_datetime"])
+        except (KeyError, ValueError):
+            return None
+        if start.tzinfo is not None or end.tzinfo is not None:
+            return None
+        first_day = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+        end_day = end.date()
+        if first_day >= end_day:
+            return None
+        return start, end, first_day, end_day
+
+    def _query_usage_analytics_from_rollup(self, charger_ids, filters, start, end, first_day, end_day):
+        """
+        Combine charger_daily_usage rows for whole days with raw rows for the partial days.
+
+        A rollup day is only used if all of its sessions ended before `end`
+        (`max_end_time`); from a charger's first day where that fails, its raw rows
+        are read instead. Count, sum, min, max and average are exact. The median is
+        merged from the days' kWh quantile sketches and the raw kWh values, so it is
+        within `QUANTILE_SKETCH_RELATIVE_ACCURACY` of the exact value.
+        """
+        placeholders = ", ".join(["%s"] * len(charger_ids))
+        status_condition = " AND status = %s" if "status" in filters else ""
+        status_params = [filters["status"]] if "status" in filters else []
+        rollup_sql = f"""
+        SELECT charger_id, usage_date, session_count, kwh_count, kwh_sum, kwh_min, kwh_max, max_end_time, kwh_sketch
+        FROM charger_daily_usage
+        WHERE charger_id IN ({placeholders}) AND usage_date >= %s AND usage_date < %s{status_condition}
+        """
+        raw_sql = f"""
+        SELECT charger_id, start_time, kwh_consumed
+        FROM transactions
+        WHERE charger_id IN ({placeholders}) AND start_time >= %s AND end_time <= %s
+          AND (start_time < %s OR start_time >= %s){status_condition}
+        """
+        first_start = datetime.combine(first_day, time.min)
+
+        try:
+            with self.backend.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(rollup_sql, (*charger_ids, first_day, end_day, *status_params))
+                    rollup_rows = cursor.fetchall()
+
+                    # Days with sessions ending after the window must be read raw
+                    rollup_end_days = dict.fromkeys(charger_ids, end_day)
+                    for row in rollup_rows:
+                        if row[7] is not None and row[7] > end:
+                            rollup_end_days[row[0]] = min(rollup_end_days[row[0]], row[1])
+                    rollup_rows = [row for row in rollup_rows if row[1] < rollup_end_days[row[0]]]
+
+                    earliest_end_start = datetime.combine(min(rollup_end_days.values()), time.min)
+                    cursor.execute(raw_sql, (*charger_ids, start, end, first_start, earliest_end_start, *status_params))
+                    raw_rows = [
+                        row for row in cursor.fetchall()
+                        if row[1] < first_start or row[1] >= datetime.combine(rollup_end_days[row[0]], time.min)
+                    ]
+        except Exception as e:
+            print(f"Error executing query in get_usage_analytics: {e}")
+            raise
+        if any(row[8] is None for row in rollup_rows):
+            # Rows written before the sketch columns existed; the next load fills them
+            raise ValueError("rollup rows have no kWh sketches")
+
+        days_by_charger = {charger_id: [] for charger_id in charger_ids}
+        for row in rollup_rows:
+            days_by_charger[row[0]].append(row)
+        raw_by_charger = {charger_id: [] for charger_id in charger_ids}
+        for row in raw_rows:
+            raw_by_charger[row[0]].append(row[2])
+
+        results = {}
+        for charger_id in charger_ids:
+            days, raw = days_by_charger[charger_id], raw_by_charger[charger_id]
+            raw_kwh = [float(kwh) for kwh in raw if kwh is not None]
+            total_transactions = sum(row[2] for row in days) + len(raw)
+            kwh_count = sum(row[3] for row in days) + len(raw_kwh)
+            if kwh_count == 0:
+                results[charger_id] = [total_transactions, None, None, None, None, None]
+                continue
+            total_kwh = sum(float(row[4]) for row in days if row[4] is not None) + sum(raw_kwh)
+            biggest = max([float(row[6]) for row in days if row[6] is not None] + raw_kwh)
+            smallest = min([float(row[5]) for row in days if row[5] is not None] + raw_kwh)
+            sketch = {}
+            for row in days:
+                merge_histograms(sketch, decode_quantile_sketch(row[8]))
+            if raw_kwh:
+                add_values_to_quantile_sketch(sketch, raw_kwh)
+            median = sketch_quantile(sketch, 0.5, smallest, biggest)
+            results[charger_id] = [total_transactions, total_kwh, biggest, smallest, total_kwh / kwh_count, median]
+        return results
+
+    def _query_usage_analytics_approx(self, charger_ids, filters, quantiles=()):
         """
-        sql = """
-        SELECT COUNT(*) AS total_transactions,
+        Merge the kWh quantile sketches and user HyperLogLogs of the rollup days in the window,
+        for all chargers in one grouped pass; returns a dict of charger_id to analytics dict.
+
+        Works for open windows too. Sessions the rollup cannot answer (on partial
+        days, on days with sessions ending after the window, or without timestamps)
+        are read raw and added to the sketches. Count, sum, min, max and average
+        are exact; quantiles are within `QUANTILE_SKETCH_RELATIVE_ACCURACY` of the
+        exact value and distinct users have a relative standard error of
+        `HLL_STANDARD_ERROR`.
+        """
+        start = self._parse_naive_datetime(filters, "start_datetime")
+        end = self._parse_naive_datetime(filters, "end_datetime")
+        first_day = None
+        if start is not None:
+            first_day = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+        end_day = end.date() if end is not None else None
+        use_rollup = first_day is None or end_day is None or first_day < end_day
+
+        placeholders = ", ".join(["%s"] * len(charger_ids))
+        rollup_sql = f"""
+        SELECT charger_id, usage_date, session_count, kwh_count, kwh_sum, kwh_min, kwh_max, max_end_time, kwh_sketch, user_hll
+        FROM charger_daily_usage
+        WHERE charger_id IN ({placeholders})
+        """
+        rollup_params = list(charger_ids)
+        raw_sql = f"""
+        SELECT charger_id, start_time, end_time, kwh_consumed, user_id
+        FROM transactions
+        WHERE charger_id IN ({placeholders})
+        """
+        raw_params = list(charger_ids)
+        if first_day is not None:
+            rollup_sql += " AND usage_date >= %s"
+            rollup_params.append(first_day)
+        if end_day is not None:
+            rollup_sql += " AND usage_date < %s"
+            rollup_params.append(end_day)
+        if start is not None:
+            raw_sql += " AND start_time >= %s"
+            raw_params.append(start)
+        if end is not None:
+            raw_sql += " AND end_time <= %s"
+            raw_params.append(end)
+        if "status" in filters:
+            rollup_sql += " AND status = %s"
+            rollup_params.append(filters["status"])
+            raw_sql += " AND status = %s"
+            raw_params.append(filters["status"])
+
+        try:
+            with self.backend.connection() as connection:
+                with connection.cursor() as cursor:
+                    rollup_rows = []
+                    if use_rollup:
+                        cursor.execute(rollup_sql, tuple(rollup_params))
+                        rollup_rows = cursor.fetchall()
+                    if any(row[8] is None or row[9] is None for row in rollup_rows):
+                        # Rows written before the sketch columns existed; the next load fills them
+                        print("Rollup rows have no sketches, reading raw transactions.")
+                        rollup_rows, use_rollup = [], False
+
+                    # Days with sessions ending after the window must be read raw
+                    rollup_end_days = dict.fromkeys(charger_ids, end_day)
+                    for row in rollup_rows:
+                        if end is not None and row[7] is not None and row[7] > end:
+                            rollup_end_days[row[0]] = min(rollup_end_days[row[0]], row[1])
+                    rollup_rows = [
+                        row for row in rollup_rows if end_day is None or row[1] < rollup_end_days[row[0]]
+                    ]
+
+                    if use_rollup:
+                        uncovered = ["start_time IS NULL", "end_time IS NULL"]
+                        if first_day is not None:
+                            uncovered.append("start_time < %s")
+                            raw_params.append(datetime.combine(first_day, time.min))
+                        if end_day is not None:
+                            uncovered.append("start_time >= %s")
+                            raw_params.append(datetime.combine(min(rollup_end_days.values()), time.min))
+                        raw_sql += f" AND ({' OR '.join(uncovered)})"
+                    cursor.execute(raw_sql, tuple(raw_params))
+                    raw_rows = cursor.fetchall()
+        except Exception as e:
+            print(f"Error executing query in get_usage_analytics: {e}")
+            raise
+
+        if use_rollup and end_day is not None:
+            # The raw query reads from the earliest cut-off of all chargers; drop the days each one has in the rollup
+            raw_rows = [
+                row for row in raw_rows
+                if row[1] is None or row[2] is None
+                or (first_day is not None and row[1] < datetime.combine(first_day, time.min))
+                or row[1] >= datetime.combine(rollup_end_days[row[0]], time.min)
+            ]
+
+        days_by_charger = {charger_id: [] for charger_id in charger_ids}
+        for row in rollup_rows:
+            days_by_charger[row[0]].append(row)
+        raw_by_charger = {charger_id: [] for charger_id in charger_ids}
+        for row in raw_rows:
+            raw_by_charger[row[0]].append(row)
+        return {
+            charger_id: self._merge_approx_analytics(days_by_charger[charger_id], raw_by_charger[charger_id], quantiles)
+            for charger_id in charger_ids
+        }
+
+    def _merge_approx_analytics(self, rollup_rows, raw_rows, quantiles):
+        """Merge one charger's rollup days and raw rows into its approximate analytics."""
+        raw_kwh = [float(row[3]) for row in raw_rows if row[3] is not None]
+        users = {}
+        for row in rollup_rows:
+            merge_hll(users, decode_hll(row[9]))
+        add_values_to_hll(users, (row[4] for row in raw_rows))
+        result = {
+            "total_transactions": sum(row[2] for row in rollup_rows) + len(raw_rows),
+            "total_kWh": None,
+            "biggest_transaction_kWh": None,
+            "smallest_transaction_kWh": None,
+            "average_transaction_kWh": None,
+            "median_transaction_kWh": None,
+            "distinct_users": hll_estimate(users),
+            "approximate": True,
+            "error_bounds": {
+                "kwh_quantiles_relative_error": QUANTILE_SKETCH_RELATIVE_ACCURACY,
+                "distinct_users_relative_standard_error": round(HLL_STANDARD_ERROR, 4)
+            }
+        }
+        if quantiles:
+            result["kwh_quantiles"] = {str(q): None for q in quantiles}
+        kwh_count = sum(row[3] for row in rollup_rows) + len(raw_kwh)
+        if kwh_count == 0:
+            return result
+
+        total_kwh = sum(float(row[4]) for row in rollup_rows if row[4] is not None) + sum(raw_kwh)
+        biggest = max([float(row[6]) for row in rollup_rows if row[6] is not None] + raw_kwh)
+        smallest = min([float(row[5]) for row in rollup_rows if row[5] is not None] + raw_kwh)
+        sketch = {}
+        for row in rollup_rows:
+            merge_histograms(sketch, decode_quantile_sketch(row[8]))
+        if raw_kwh:
+            add_values_to_quantile_sketch(sketch, raw_kwh)
+        result.update({
+            "total_kWh": total_kwh,
+            "biggest_transaction_kWh": biggest,
+            "smallest_transaction_kWh": smallest,
+            "average_transaction_kWh": total_kwh / kwh_count,
+            "median_transaction_kWh": sketch_quantile(sketch, 0.5, smallest, biggest)
+        })
+        if quantiles:
+            result["kwh_quantiles"] = {str(q): sketch_quantile(sketch, q, smallest, biggest) for q in quantiles}
+        return result
+
+    def _parse_naive_datetime(self, filters, name):
+        """Parse an optional naive ISO datetime filter of the approximate analytics."""
+        if name not in filters:
+            return None
+        try:
+            value = datetime.fromisoformat(filters[name])
+        except ValueError:
+            raise ValueError(f"Invalid {name}: {filters[name]!r} is not an ISO datetime.")
+        if value.tzinfo is not None:
+            raise ValueError(f"Invalid {name}: approx=true needs a datetime without timezone.")
+        return value
+
+    def _query_usage_analytics_from_transactions(self, charger_ids, filters):
+        """Run the usage analytics aggregate against the raw transactions table, grouped by charger."""
+        placeholders = ", ".join(["%s"] * len(charger_ids))
+        sql = f"""
+        SELECT charger_id,
+               COUNT(*) AS total_transactions,
                SUM(kwh_consumed) AS total_kWh,
                MAX(kwh_consumed) AS biggest_transaction_kWh,
                MIN(kwh_consumed) AS smallest_transaction_kWh,
                AVG(kwh_consumed) AS average_transaction_kWh,
                PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY kwh_consumed) AS median_transaction_kWh
         FROM transactions
-        WHERE charger_id = %s
+        WHERE charger_id IN ({placeholders})
         """
-        params = [charger_id]
+        params = list(charger_ids)
 
-        if filters:
-            if "start_datetime" in filters:
-                sql += " AND start_time >= %s"
-                params.append(filters["start_datetime"])
-            if "end_datetime" in filters:
-                sql += " AND end_time <= %s"
-                params.append(filters["end_datetime"])
-            if "status" in filters:
-                sql += " AND status = %s"
-                params.append(filters["status"])
-
-        print(f"Executing SQL: {sql} with params: {params}")
+        if "start_datetime" in filters:
+            sql += " AND start_time >= %s"
+            params.append(filters["start_datetime"])
+        if "end_datetime" in filters:
+            sql += " AND end_time <= %s"
+            params.append(filters["end_datetime"])
+        if "status" in filters:
+            sql += " AND status = %s"
+            params.append(filters["status"])
+        sql += " GROUP BY charger_id"
 
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(sql, tuple(params))
-                result = cursor.fetchone()
-            return result
+            with self.backend.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, tuple(params))
+                    rows = cursor.fetchall()
         except Exception as e:
             print(f"Error executing query in get_usage_analytics: {e}")
-            raise
\ No newline at end of file
+            raise
+        found = {row[0]: list(row[1:]) for row in rows}
+        # Chargers without matching transactions get an empty result
+        return {charger_id: found.get(charger_id, [0, None, None, None, None, None]) for charger_id in charger_ids}
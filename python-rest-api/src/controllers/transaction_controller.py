@@ -1,66 +1,76 @@
-import os
-import redshift_connector
-from dotenv import load_dotenv
+from db.backends import get_backend, fetch_all
+from db.bulk_lookup import parse_lookup, lookup_rows, build_lookup_response
+from db.query_spec import QuerySpec, Filter, parse_text, parse_number, parse_datetime
+from utils.pagination import parse_page_size, parse_row_limit, build_page
 
-# Load environment variables from .env file
-load_dotenv()
+# Filters, projection and keyset order of /transactions-extended
+TRANSACTIONS_QUERY = QuerySpec(
+    "transactions",
+    [
+        "session_id", "user_id", "charger_id", "start_time", "end_time",
+        "kWh_consumed", "status", "payment_method", "amount", "currency"
+    ],
+    {
+        "min_kwh": Filter("kWh_consumed >= %s", parse_number),
+        "max_kwh": Filter("kWh_consumed <= %s", parse_number),
+        "min_amount_charged": Filter("amount >= %s", parse_number),
+        "max_amount_charged": Filter("amount <= %s", parse_number),
+        "user_id": Filter("user_id = %s", parse_text),
+        "charger_id": Filter("charger_id = %s", parse_text),
+        "start_datetime": Filter("start_time >= %s", parse_datetime),
+        "end_datetime": Filter("end_time <= %s", parse_datetime)
+    },
+    key=["start_time", "session_id"]
+)
 
 class TransactionController:
-    def __init__(self):
-        self.connection = redshift_connector.connect(
-            host=os.getenv("REDSHIFT_HOST"),
-            port=int(os.getenv("REDSHIFT_PORT", 5439)),
-            database=os.getenv("REDSHIFT_DBNAME"),
-            user=os.getenv("REDSHIFT_USER"),
-            password=os.getenv("REDSHIFT_PASSWORD")
-        )
-        self.connection.autocommit = True  # Enable auto-commit mode
+    def __init__(self, backend=None):
+        # All controllers share one query backend (a pooled Redshift or a local snapshot)
+        self.backend = backend or get_backend()
 
     def get_transactions_extended(self, filters=None):
         """
         GET /transactions-extended
         Returns all transactions in extended format with optional filters.
+        Results are paginated by (start_time, session_id), or by `sort` and then those;
+        pass the returned `next_cursor` as `cursor` to fetch the next page of at most
+        `limit` rows. `fields` limits the returned columns.
         """
-        sql = "SELECT * FROM transactions"
-        conditions = []
-        params = []
-
-        if filters:
-            if "min_kwh" in filters:
-                conditions.append("kWh_consumed >= %s")
-                params.append(filters["min_kwh"])
-            if "max_kwh" in filters:
-                conditions.append("kWh_consumed <= %s")
-                params.append(filters["max_kwh"])
-            if "min_amount_charged" in filters:
-                conditions.append("amount >= %s")
-                params.append(filters["min_amount_charged"])
-            if "max_amount_charged" in filters:
-                conditions.append("amount <= %s")
-                params.append(filters["max_amount_charged"])
-            if "user_id" in filters:
-                conditions.append("user_id = %s")
-                params.append(filters["user_id"])
-            if "charger_id" in filters:
-                conditions.append("charger_id = %s")
-                params.append(filters["charger_id"])
-            if "start_datetime" in filters:
-                conditions.append("start_time >= %s")
-                params.append(filters["start_datetime"])
-            if "end_datetime" in filters:
-                conditions.append("end_time <= %s")
-                params.append(filters["end_datetime"])
-
-        if conditions:
-            sql += " WHERE " + " AND ".join(conditions)
-
-        print(f"Executing SQL: {sql} with params: {params}")
+        filters = filters or {}
+        limit = parse_page_size(filters.get("limit"))
+        # Keyset pagination: one extra row tells whether there is a next page
+        sql, params, order_columns = TRANSACTIONS_QUERY.build(filters, limit + 1)
 
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(sql, tuple(params))
-                result = cursor.fetchall()
-            return result
+            columns, rows = fetch_all(self.backend, sql, params)
+            return build_page(columns, rows, limit, order_columns)
         except Exception as e:
             print(f"Error executing query in get_transactions_extended: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def lookup_transactions(self, payload):
+        """
+        POST /transactions/extended/lookup
+        Returns the transactions of the session `ids` in the JSON body keyed by session_id,
+        and the ids that do not exist as `missing`. `fields` limits the returned columns.
+        """
+        ids, fields = parse_lookup(payload, TRANSACTIONS_QUERY)
+        try:
+            found = lookup_rows(self.backend, TRANSACTIONS_QUERY, ids, fields)
+        except Exception as e:
+            print(f"Error executing query in lookup_transactions: {e}")
+            raise
+        return build_lookup_response(ids, found)
+
+    def stream_transactions_extended(self, filters=None):
+        """
+        GET /transactions-extended in a streaming format
+        Returns a generator of `(columns, rows)` batches of all matching transactions in keyset order,
+        starting after `cursor` if given and stopping after `limit` rows if given.
+        """
+        filters = filters or {}
+        # Streams hold one batch in memory at a time, so the page size cap does not apply
+        limit = parse_row_limit(filters.get("limit"))
+        sql, params, _ = TRANSACTIONS_QUERY.build(filters, limit)
+
+        return self.backend.stream(sql, params)
@@ -1,57 +1,119 @@
-import os
 import re
-import redshift_connector
-from dotenv import load_dotenv
+from db.backends import get_backend, fetch_all
+from db.bulk_lookup import parse_lookup, lookup_rows, build_lookup_response
+from db.query_spec import QuerySpec, Filter, parse_text, parse_substring
+from utils.pagination import parse_page_size, parse_row_limit, decode_cursor, encode_cursor, build_page, rows_to_dicts
+from indexes.user_search import SEARCH_FIELDS, USER_SEARCH_INDEX_ENABLED, UserSearch
 
-# Load environment variables from .env file
-load_dotenv()
+# Filters, projection and keyset order of /users
+USERS_QUERY = QuerySpec(
+    "users",
+    ["user_id", "full_name", "first_name", "last_name", "email", "tier", "created_at"],
+    {
+        "user_id": Filter("user_id = %s", parse_text),
+        "first_name": Filter("LOWER(first_name) ILIKE %s", parse_substring),
+        "last_name": Filter("LOWER(last_name) ILIKE %s", parse_substring),
+        "full_name": Filter("LOWER(full_name) ILIKE %s", parse_substring),
+        "email": Filter("LOWER(email) ILIKE %s", parse_substring)
+    },
+    key=["user_id"]
+)
 
 class UserController:
-    def __init__(self):
-        self.connection = redshift_connector.connect(
-            host=os.getenv("REDSHIFT_HOST"),
-            port=int(os.getenv("REDSHIFT_PORT", 5439)),
-            database=os.getenv("REDSHIFT_DBNAME"),
-            user=os.getenv("REDSHIFT_USER"),
-            password=os.getenv("REDSHIFT_PASSWORD")
-        )
-        self.connection.autocommit = True  # Enable auto-commit mode
+    def __init__(self, backend=None, user_search=None):
+        # All controllers share one query backend (a pooled Redshift or a local snapshot)
+        self.backend = backend or get_backend()
+        self.user_search = user_search or (UserSearch(self.backend) if USER_SEARCH_INDEX_ENABLED else None)
 
     def get_users(self, filters=None):
         """
         GET /users
-        Returns all users or filters based on user_id, first_name, last_name, and email.
+        Returns all users or filters based on user_id, first_name, last_name, full_name and email.
+        Results are paginated by user_id, or by `sort` and then user_id; pass the
+        returned `next_cursor` as `cursor` to fetch the next page of at most `limit`
+        users. `fields` limits the returned columns. Substring searches without `sort`
+        are answered from the user search index and ranked by match quality instead;
+        terms with the ILIKE wildcards `%` or `_` use SQL, which treats them as wildcards.
         """
-        sql = """
-        SELECT * FROM users
+        filters = filters or {}
+        limit = parse_page_size(filters.get("limit"))
+        queries = {field: filters[field] for field in SEARCH_FIELDS if field in filters}
+        # The index matches terms literally, so wildcard searches keep their ILIKE meaning in SQL
+        literal = not any("%" in query or "_" in query for query in queries.values())
+        if queries and literal and self.user_search is not None and "sort" not in filters:
+            try:
+                index = self.user_search.current()
+            except Exception as e:
+                print(f"User search index unavailable, falling back to SQL: {e}")
+            else:
+                return self._search_users(index, queries, filters, limit)
+
+        # Keyset pagination: one extra row tells whether there is a next page
+        sql, params, order_columns = USERS_QUERY.build(filters, limit + 1)
+
+        try:
+            columns, rows = fetch_all(self.backend, sql, params)
+            return build_page(columns, rows, limit, order_columns)
+        except Exception as e:
+            print(f"Error executing query: {e}")
+            raise
+
+    def lookup_users(self, payload):
         """
-        conditions = []
-        params = []
+        POST /users/lookup
+        Returns the users of the `ids` in the JSON body keyed by user_id, and the ids
+        that do not exist as `missing`. `fields` limits the returned columns.
+        """
+        ids, fields = parse_lookup(payload, USERS_QUERY)
+        try:
+            found = lookup_rows(self.backend, USERS_QUERY, ids, fields)
+        except Exception as e:
+            print(f"Error executing query in lookup_users: {e}")
+            raise
+        return build_lookup_response(ids, found)
 
-        if filters:
-            if "user_id" in filters:
-                conditions.append("user_id = %s")
-                params.append(filters["user_id"])
-            if "first_name" in filters:
-                conditions.append("LOWER(first_name) ILIKE %s")
-                params.append(f"%{filters['first_name'].lower()}%")
-            if "last_name" in filters:
-                conditions.append("LOWER(last_name) ILIKE %s")
-                params.append(f"%{filters['last_name'].lower()}%")
-            if "email" in filters:
-                conditions.append("LOWER(email) ILIKE %s")
-                params.append(f"%{filters['email'].lower()}%")
+    def _search_users(self, index, queries, filters, limit):
+        """
+        Page through the users matching substring `queries`, best matches first.
 
-        if conditions:
-            sql += " WHERE " + " AND ".join(conditions)
+        The index ranks the matching user_ids; only the users of the requested page
+        are fetched. The cursor is the `(score, user_id)` of the last returned user.
+        """
+        after = decode_cursor(filters["cursor"], 2) if "cursor" in filters else None
+        fields = USERS_QUERY.parse_fields(filters.get("fields"))
+        ranked = index.search(queries, limit=None if "user_id" in filters else limit + 1, after=after)
+        if "user_id" in filters:
+            ranked = [result for result in ranked if result[1] == filters["user_id"]][:limit + 1]
+        if not ranked:
+            return {"data": [], "next_cursor": None}
 
-        print(f"Executing SQL: {sql} with params: {params}")
+        page = ranked[:limit]
+        placeholders = ", ".join(["%s"] * len(page))
+        projection = "*" if fields is None else ", ".join(dict.fromkeys(fields + ("user_id",)))
+        sql = f"SELECT {projection} FROM users WHERE user_id IN ({placeholders})"
+        params = [user_id for _, user_id in page]
 
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute(sql, tuple(params))
-                result = cursor.fetchall()
-                return result
+            columns, rows = fetch_all(self.backend, sql, params)
         except Exception as e:
             print(f"Error executing query: {e}")
-            raise
\ No newline at end of file
+            raise
+
+        users = {user["user_id"]: user for user in rows_to_dicts(columns, rows)}
+        # A user deleted since the index was built is skipped
+        items = [users[user_id] for _, user_id in page if user_id in users]
+        next_cursor = encode_cursor(list(page[-1])) if len(ranked) > limit else None
+        return {"data": items, "next_cursor": next_cursor}
+
+    def stream_users(self, filters=None):
+        """
+        GET /users in a streaming format
+        Returns a generator of `(columns, rows)` batches of all matching users ordered by
+        user_id, starting after `cursor` if given and stopping after `limit` rows if given.
+        """
+        filters = filters or {}
+        # Streams hold one batch in memory at a time, so the page size cap does not apply
+        limit = parse_row_limit(filters.get("limit"))
+        sql, params, _ = USERS_QUERY.build(filters, limit)
+
+        return self.backend.stream(sql, params)
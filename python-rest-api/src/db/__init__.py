@@ -0,0 +1,3 @@
+"""
+This is the initialization file for the db package.
+"""
@@ -0,0 +1,401 @@
+import os
+import time
+import weakref
+import threading
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+from db.connection_pool import get_connection_pool
+from db.server_side_cursor import STREAM_BATCH_SIZE, iter_batches
+from utils.metrics import METRICS_ENABLED, record_pool_wait, record_query
+from utils.single_flight import SingleFlight
+from utils.statement_timeouts import current_statement_timeout, query_timed_out
+
+try:
+    import duckdb
+except ImportError:  # The embedded backend is optional
+    duckdb = None
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Which database the controllers query: "redshift" or "duckdb"
+API_BACKEND = os.getenv("API_BACKEND", "redshift").lower()
+# Columnar snapshot the loader writes and the duckdb backend serves from
+DUCKDB_SNAPSHOT_PATH = os.getenv(
+    "DUCKDB_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "snapshot", "autosense.duckdb")
+)
+
+
+def _is_statement_timeout(error):
+    # redshift_connector reports the server's SQLSTATE; 57014 is a cancelled query
+    message = str(error)
+    return "57014" in message or "statement timeout" in message
+
+
+class RedshiftBackend:
+    """
+    Backend that runs the controllers' queries on Redshift through the shared connection pool.
+
+    Each checkout applies the statement timeout of the current request with
+    `SET statement_timeout`, so Redshift itself cancels queries that run too long.
+    The setting stays on the pooled connection and is only changed when it differs.
+    """
+
+    name = "redshift"
+
+    def __init__(self, pool=None):
+        self.pool = pool or get_connection_pool()
+        self._statement_timeouts = weakref.WeakKeyDictionary()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager yielding a DB-API connection for one or more queries."""
+        statement_timeout = current_statement_timeout()
+        with self.pool.connection(timeout) as connection:
+            with self._statement_timeout(connection, statement_timeout):
+                yield connection
+
+    def stream(self, sql, params=(), batch_size=STREAM_BATCH_SIZE):
+        """Yield `(columns, rows)` batches of a large result, see `db.server_side_cursor`."""
+        # Read now: the body is consumed after the request handler has returned
+        return self._stream(sql, params, batch_size, current_statement_timeout())
+
+    def _stream(self, sql, params, batch_size, statement_timeout):
+        # The connection is checked out for the lifetime of the streamed query
+        with self.pool.connection() as connection:
+            with self._statement_timeout(connection, statement_timeout):
+                yield from iter_batches(connection, sql, params, batch_size)
+
+    @contextmanager
+    def _statement_timeout(self, connection, statement_timeout):
+        milliseconds = statement_timeout[1] if statement_timeout is not None else 0
+        if self._statement_timeouts.get(connection) != milliseconds:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET statement_timeout TO {int(milliseconds)}")
+            self._statement_timeouts[connection] = milliseconds
+        try:
+            yield
+        except Exception as e:
+            if statement_timeout is not None and _is_statement_timeout(e):
+                raise query_timed_out(self.name, statement_timeout) from e
+            raise
+
+
+class DuckDBCursor:
+    """
+    DB-API cursor adapter over a DuckDB connection.
+
+    Accepts the `%s` placeholders the controllers write for redshift_connector
+    and can be used as a context manager like a redshift_connector cursor.
+    DuckDB has no statement timeout setting, so a timer interrupts queries that
+    run longer than `statement_timeout`.
+    """
+
+    def __init__(self, connection, statement_timeout=None):
+        self._connection = connection
+        self._statement_timeout = statement_timeout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def description(self):
+        return self._connection.description
+
+    def execute(self, sql, params=()):
+        # Controllers never put a literal % into SQL text, only into bound parameters
+        sql = sql.replace("%s", "?")
+        if self._statement_timeout is None:
+            self._connection.execute(sql, list(params))
+            return self
+        timed_out = threading.Event()
+
+        def interrupt():
+            # Set before interrupting, so the InterruptException can never arrive first
+            timed_out.set()
+            self._connection.interrupt()
+
+        timer = threading.Timer(self._statement_timeout[1] / 1000, interrupt)
+        timer.start()
+        try:
+            self._connection.execute(sql, list(params))
+        except duckdb.InterruptException as e:
+            if timed_out.is_set():
+                raise query_timed_out("duckdb", self._statement_timeout) from e
+            raise
+        finally:
+            timer.cancel()
+        return self
+
+    def fetchone(self):
+        return self._connection.fetchone()
+
+    def fetchall(self):
+        return self._connection.fetchall()
+
+    def fetchmany(self, size=1):
+        return self._connection.fetchmany(size)
+
+    def close(self):
+        pass  # The connection owns the result; it is closed with the connection
+
+
+class DuckDBConnection:
+    """Per-checkout connection to the snapshot; reads need no transactions, so commit is a no-op."""
+
+    autocommit = True
+
+    def __init__(self, connection, statement_timeout=None):
+        self._connection = connection
+        self._statement_timeout = statement_timeout
+
+    def cursor(self):
+        return DuckDBCursor(self._connection, self._statement_timeout)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self._connection.close()
+
+
+class DuckDBBackend:
+    """
+    Backend that serves queries from a local read-only DuckDB snapshot.
+
+    The loader writes the snapshot from the same cleaned CSV files it COPYs into
+    Redshift and swaps it in atomically. Every checkout gets its own DuckDB
+    connection to the shared database, so requests run in parallel. The file is
+    reopened once the loader has replaced it.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, path=DUCKDB_SNAPSHOT_PATH):
+        if duckdb is None:
+            raise ImportError("The duckdb backend requires the duckdb package.")
+        self.path = path
+        self._database = None
+        self._mtime_ns = None
+        self._lock = threading.Lock()
+
+    def connection(self, timeout=None):
+        """Context manager yielding a connection to the current snapshot."""
+        return self._connection(current_statement_timeout())
+
+    @contextmanager
+    def _connection(self, statement_timeout):
+        connection = DuckDBConnection(self._current_database().cursor(), statement_timeout)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def stream(self, sql, params=(), batch_size=STREAM_BATCH_SIZE):
+        """Yield `(columns, rows)` batches; DuckDB results are fetched incrementally from the engine."""
+        # Read now: the body is consumed after the request handler has returned
+        return self._stream(sql, params, batch_size, current_statement_timeout())
+
+    def _stream(self, sql, params, batch_size, statement_timeout):
+        with self._connection(statement_timeout) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                columns = [column[0] for column in cursor.description]
+                first = True
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if rows or first:
+                        yield columns, rows
+                    first = False
+                    if len(rows) < batch_size:
+                        break
+
+    def _current_database(self):
+        """Return the database handle, reopening it if the snapshot file was replaced."""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"DuckDB snapshot {self.path} does not exist; run the loader with --snapshot.")
+        with self._lock:
+            if self._database is None or mtime_ns != self._mtime_ns:
+                print(f"Opening DuckDB snapshot {self.path}")
+                # Connections checked out from the old handle keep it alive until they close
+                self._database = duckdb.connect(self.path, read_only=True)
+                self._mtime_ns = mtime_ns
+            return self._database
+
+
+class InstrumentedCursor:
+    """
+    Cursor wrapper timing each query from `execute` through its last fetch.
+
+    A query is recorded once the next one starts or the cursor is closed.
+    """
+
+    def __init__(self, cursor, backend_name):
+        self._cursor = cursor
+        self._backend_name = backend_name
+        self._sql = None
+        self._seconds = 0.0
+        self._rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def execute(self, sql, params=()):
+        self._finish()
+        self._sql = sql
+        started = time.perf_counter()
+        try:
+            self._cursor.execute(sql, params)
+        finally:
+            self._seconds += time.perf_counter() - started
+        return self
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        self._rows += row is not None
+        return row
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def fetchmany(self, size=1):
+        rows = self._timed(self._cursor.fetchmany, size)
+        self._rows += len(rows)
+        return rows
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def _timed(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            self._seconds += time.perf_counter() - started
+
+    def _finish(self):
+        if self._sql is not None:
+            record_query(self._backend_name, self._sql, self._seconds, self._rows)
+        self._sql, self._seconds, self._rows = None, 0.0, 0
+
+
+class InstrumentedConnection:
+    """Connection wrapper handing out `InstrumentedCursor`s."""
+
+    def __init__(self, connection, backend_name):
+        self._connection = connection
+        self._backend_name = backend_name
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self):
+        return InstrumentedCursor(self._connection.cursor(), self._backend_name)
+
+
+class InstrumentedBackend:
+    """Backend wrapper recording pool waits, query durations and rows in `utils.metrics`."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        started = time.perf_counter()
+        with self.backend.connection(timeout) as connection:
+            record_pool_wait(self.name, time.perf_counter() - started)
+            yield InstrumentedConnection(connection, self.name)
+
+    def stream(self, sql, params=(), batch_size=STREAM_BATCH_SIZE):
+        """Yield the batches of the wrapped backend, timing only the fetching, not the consumer."""
+        return self._timed_stream(self.backend.stream(sql, params, batch_size), sql)
+
+    def _timed_stream(self, batches, sql):
+        seconds = 0.0
+        rows = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    columns, batch = next(batches)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += time.perf_counter() - started
+                rows += len(batch)
+                yield columns, batch
+        finally:
+            batches.close()
+            record_query(self.name, sql, seconds, rows)
+
+
+_queries = SingleFlight("queries")
+
+
+def fetch_all(backend, sql, params=()):
+    """
+    Run a read query and return its `(columns, rows)`.
+
+    Concurrent calls with the same SQL (up to whitespace) and parameters share one
+    database call, so a burst of identical requests costs a single query. The
+    parameters are already parsed by the query specs, so "10" and "10.0" match.
+    Only calls under the same statement timeout are shared, so no caller waits on
+    a query allowed to run longer than its own limit. Callers get the same rows
+    and must not modify them.
+    """
+    def run():
+        with backend.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+                columns = [column[0] for column in cursor.description]
+        return columns, rows
+
+    params = tuple(params)
+    statement_timeout = current_statement_timeout()
+    milliseconds = statement_timeout[1] if statement_timeout is not None else None
+    return _queries.do((backend.name, " ".join(sql.split()), params, milliseconds), run)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide query backend selected by `API_BACKEND`."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if API_BACKEND == "duckdb":
+                _backend = DuckDBBackend()
+            elif API_BACKEND == "redshift":
+                _backend = RedshiftBackend()
+            else:
+                raise ValueError(f"Unknown API_BACKEND '{API_BACKEND}'; use redshift or duckdb.")
+            if METRICS_ENABLED:
+                _backend = InstrumentedBackend(_backend)
+        return _backend
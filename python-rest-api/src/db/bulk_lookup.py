@@ -0,0 +1,97 @@
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Most IDs one bulk lookup request may resolve
+LOOKUP_MAX_IDS = int(os.getenv("LOOKUP_MAX_IDS", 10000))
+# Most IDs per IN list; a request is resolved with one query per chunk
+LOOKUP_CHUNK_SIZE = int(os.getenv("LOOKUP_CHUNK_SIZE", 1000))
+
+
+def parse_lookup(payload, spec):
+    """
+    Validate the body of a bulk lookup against the columns of `spec`.
+
+    The body is a JSON object with a list of `ids` and optional `fields` (a list
+    or comma-separated string). Returns the distinct IDs in request order and the
+    requested columns, or None for all of them.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("ids"), list):
+        raise ValueError("Invalid body: expected a JSON object with a list of ids.")
+    ids = payload["ids"]
+    if len(ids) > LOOKUP_MAX_IDS:
+        raise ValueError(f"Invalid body: at most {LOOKUP_MAX_IDS} ids per request.")
+    for position, value in enumerate(ids):
+        if not isinstance(value, str) or not value:
+            raise ValueError(f"Invalid id {position}: expected a non-empty string.")
+    fields = payload.get("fields")
+    if isinstance(fields, list):
+        if not all(isinstance(field, str) for field in fields):
+            raise ValueError("Invalid fields: expected a list of column names.")
+        fields = ",".join(fields)
+    elif fields is not None and not isinstance(fields, str):
+        raise ValueError("Invalid fields: expected a list or a comma-separated string of column names.")
+    return list(dict.fromkeys(ids)), spec.parse_fields(fields)
+
+
+def _padded_size(count, chunk_size):
+    # Chunks are padded to a power of two, so a few statement texts cover every request size
+    size = 1
+    while size < count:
+        size *= 2
+    return min(size, chunk_size)
+
+
+@lru_cache(maxsize=256)
+def _lookup_sql(table, id_column, fields, size):
+    projection = "*" if fields is None else ", ".join(fields)
+    placeholders = ", ".join(["%s"] * size)
+    return f"SELECT {projection} FROM {table} WHERE {id_column} IN ({placeholders})"
+
+
+def lookup_rows(backend, spec, ids, fields=None, chunk_size=LOOKUP_CHUNK_SIZE):
+    """
+    Fetch the rows of `ids` by the unique key column of `spec`; returns a dict of ID to row dict.
+
+    IDs are resolved `chunk_size` at a time with `IN` lists on one connection, so
+    thousands of IDs cost a handful of queries instead of one request each.
+    Unknown IDs are left out.
+    """
+    id_column = spec.key[-1]
+    if fields is not None and id_column not in fields:
+        fields += (id_column,)
+    found = {}
+    if not ids:
+        return found
+    with backend.connection() as connection:
+        with connection.cursor() as cursor:
+            for start in range(0, len(ids), chunk_size):
+                chunk = ids[start:start + chunk_size]
+                size = _padded_size(len(chunk), chunk_size)
+                # Padding repeats the last ID, which IN ignores
+                params = tuple(chunk) + (chunk[-1],) * (size - len(chunk))
+                cursor.execute(_lookup_sql(spec.table, id_column, fields, size), params)
+                rows = cursor.fetchall()
+                columns = [column[0] for column in cursor.description]
+                position = _column_position(columns, id_column)
+                for row in rows:
+                    found[row[position]] = dict(zip(columns, row))
+    return found
+
+
+def _column_position(columns, name):
+    # Redshift returns column names in lower case
+    lowered = [column.lower() for column in columns]
+    return lowered.index(name.lower())
+
+
+def build_lookup_response(ids, found):
+    """Key the found rows by ID in request order and list the IDs that do not exist."""
+    return {
+        "data": {value: found[value] for value in ids if value in found},
+        "missing": [value for value in ids if value not in found]
+    }
@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import redshift_connector
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out before the timeout expired."""
+
+
+def connect_to_redshift():
+    """Open a new auto-commit connection to the Redshift database."""
+    connection = redshift_connector.connect(
+        host=os.getenv("REDSHIFT_HOST"),
+        port=int(os.getenv("REDSHIFT_PORT", 5439)),
+        database=os.getenv("REDSHIFT_DBNAME"),
+        user=os.getenv("REDSHIFT_USER"),
+        password=os.getenv("REDSHIFT_PASSWORD")
+    )
+    connection.autocommit = True  # Enable auto-commit mode
+    return connection
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of database connections shared by all controllers.
+
+    Connections are opened lazily: the first checkout warms the pool up to `min_size`
+    connections and further ones are opened on demand, at most `max_size` at a time.
+    Connections that sat idle for longer than `health_check_interval` seconds are
+    validated with `health_check_query` before being handed out.
+    """
+
+    def __init__(self, connect=connect_to_redshift, min_size=1, max_size=10, timeout=30.0,
+                 health_check_interval=30.0, health_check_query="SELECT 1"):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.health_check_query = health_check_query
+
+        self._condition = threading.Condition()
+        self._idle = []  # Stack of (connection, last_used) tuples, most recently used last
+        self._size = 0  # Number of open connections, idle or checked out
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        """Check out a healthy connection, waiting up to `timeout` seconds for one to free up."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            connection, last_used = self._reserve(deadline)
+            if connection is None:
+                return self._open()
+            if time.monotonic() - last_used < self.health_check_interval or self._is_healthy(connection):
+                return connection
+            self._discard(connection)
+
+    def release(self, connection, broken=False, validate=False):
+        """Return a connection to the pool, closing it if it is broken or the pool is closed."""
+        with self._condition:
+            keep = not broken and not self._closed
+            if keep:
+                # A last-used time of -inf forces a health check on the next checkout
+                last_used = float("-inf") if validate else time.monotonic()
+                self._idle.append((connection, last_used))
+                self._condition.notify()
+        if not keep:
+            self._discard(connection)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks out a connection and always returns it to the pool."""
+        connection = self.acquire(timeout)
+        try:
+            yield connection
+        except (redshift_connector.InterfaceError, redshift_connector.OperationalError):
+            self.release(connection, broken=True)
+            raise
+        except BaseException:
+            self.release(connection, validate=True)
+            raise
+        else:
+            self.release(connection)
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts."""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        """Return a snapshot of the pool size for monitoring."""
+        with self._condition:
+            return {"size": self._size, "idle": len(self._idle), "max_size": self.max_size}
+
+    def _reserve(self, deadline):
+        """Pop an idle connection or reserve a slot for a new one; `(None, None)` means open one."""
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("Connection pool is closed.")
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(f"Timed out waiting for a database connection ({self.max_size} in use).")
+                self._condition.wait(remaining)
+
+    def _open(self):
+        """Open a new connection in a slot reserved by `_reserve`, warming the pool up to `min_size`."""
+        try:
+            connection = self._connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self._warm_up()
+        return connection
+
+    def _warm_up(self):
+        """Open idle connections until `min_size` connections exist."""
+        while True:
+            with self._condition:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                connection = self._connect()
+            except Exception as e:
+                print(f"Failed to open warm-up connection: {e}")
+                with self._condition:
+                    self._size -= 1
+                return
+            self.release(connection)
+
+    def _is_healthy(self, connection):
+        """Run the health check query on a connection."""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(self.health_check_query)
+                cursor.fetchone()
+            return True
+        except Exception as e:
+            print(f"Discarding unhealthy connection: {e}")
+            return False
+
+    def _discard(self, connection):
+        """Close a connection and free its slot."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """Return the process-wide connection pool, configured from environment variables."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                min_size=int(os.getenv("REDSHIFT_POOL_MIN_SIZE", 1)),
+                max_size=int(os.getenv("REDSHIFT_POOL_MAX_SIZE", 10)),
+                timeout=float(os.getenv("REDSHIFT_POOL_TIMEOUT", 30)),
+                health_check_interval=float(os.getenv("REDSHIFT_POOL_HEALTH_CHECK_INTERVAL", 30))
+            )
+        return _pool
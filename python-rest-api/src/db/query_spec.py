@@ -0,0 +1,154 @@
+import os
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
+
+from utils.pagination import decode_cursor
+
+# Distinct query shapes whose SQL text is kept per listing
+QUERY_PLAN_CACHE_SIZE = int(os.getenv("QUERY_PLAN_CACHE_SIZE", 512))
+
+
+def parse_text(value, name):
+    """Pass a text parameter through unchanged."""
+    return value
+
+
+def parse_number(value, name):
+    """Parse a numeric query parameter, raising ValueError (a 400 response) if it is not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r} is not a number.")
+
+
+def parse_datetime(value, name):
+    """Parse an ISO date or datetime query parameter."""
+    try:
+        return datetime.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r} is not an ISO datetime.")
+
+
+def parse_substring(value, name):
+    """Turn a search term into a case-insensitive `%term%` pattern."""
+    return f"%{value.lower()}%"
+
+
+# One filterable query parameter: its SQL condition with a single %s and the parser of its value
+Filter = namedtuple("Filter", ["condition", "parse"])
+
+
+class QuerySpec:
+    """
+    Declarative description of a listing endpoint: its table, columns, filters and keyset order.
+
+    `build` validates and types the request parameters, and returns SQL for the
+    requested projection (`fields`), order (`sort`), cursor and limit. The SQL text
+    depends only on the shape of a request (which filters, fields and sort), not on
+    the values, so it is built once per shape. Identical statement text is also what
+    lets redshift_connector reuse its per-connection prepared statements and Redshift
+    its compiled query plans.
+    """
+
+    def __init__(self, table, columns, filters, key):
+        self.table = table
+        self.columns = tuple(columns)
+        self.filters = filters
+        # Keyset columns; the last one is unique and never NULL
+        self.key = tuple(key)
+        self._columns_by_name = {column.lower(): column for column in self.columns}
+        self._sql = lru_cache(maxsize=QUERY_PLAN_CACHE_SIZE)(self._build_sql)
+
+    def parse_fields(self, value):
+        """Return the requested columns as a tuple in request order, or None for all columns."""
+        if not value:
+            return None
+        fields = []
+        for name in value.split(","):
+            column = self._column(name, "fields")
+            if column not in fields:
+                fields.append(column)
+        return tuple(fields)
+
+    def parse_sort(self, value):
+        """
+        Return the `(column, descending)` order of a `sort` parameter such as `-amount,start_time`.
+
+        The key columns are appended, so the order is total and keyset pagination
+        stays exact for any sort.
+        """
+        order = []
+        unique = self.key[-1]
+        for name in (value.split(",") if value else []):
+            name = name.strip()
+            descending = name.startswith("-")
+            column = self._column(name.lstrip("-+"), "sort")
+            if column in (ordered for ordered, _ in order):
+                raise ValueError(f"Invalid sort: {column} is given more than once.")
+            order.append((column, descending))
+            if column == unique:
+                return tuple(order)
+        ordered = {column for column, _ in order}
+        return tuple(order) + tuple((column, False) for column in self.key if column not in ordered)
+
+    def build(self, filters, limit=None):
+        """
+        Return `(sql, params, order_columns)` of a request.
+
+        `order_columns` are the columns whose values make up the page cursor; they
+        are always part of the projection.
+        """
+        fields = self.parse_fields(filters.get("fields"))
+        order = self.parse_sort(filters.get("sort"))
+        if fields is not None:
+            fields += tuple(column for column, _ in order if column not in fields)
+        active = tuple(name for name in self.filters if name in filters)
+        params = [self.filters[name].parse(filters[name], name) for name in active]
+
+        cursor_nulls = None
+        if "cursor" in filters:
+            values = decode_cursor(filters["cursor"], len(order))
+            cursor_nulls = tuple(value is None for value in values)
+        sql, cursor_positions = self._sql(fields, active, order, cursor_nulls, limit)
+        if cursor_nulls is not None:
+            params += [values[position] for position in cursor_positions]
+        return sql, params, [column for column, _ in order]
+
+    def _column(self, name, parameter):
+        column = self._columns_by_name.get(name.strip().lower())
+        if column is None:
+            raise ValueError(f"Invalid {parameter}: unknown column {name.strip()!r}.")
+        return column
+
+    def _build_sql(self, fields, active, order, cursor_nulls, limit):
+        """Build the SQL text of one query shape and the cursor value feeding each cursor placeholder."""
+        sql = f"SELECT {'*' if fields is None else ', '.join(fields)} FROM {self.table}"
+        conditions = [self.filters[name].condition for name in active]
+        cursor_positions = []
+        if cursor_nulls is not None:
+            condition, cursor_positions = self._after(order, cursor_nulls, 0)
+            conditions.append(condition)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY " + ", ".join(
+            f"{column} {'DESC' if descending else 'ASC'}" + (" NULLS LAST" if column != self.key[-1] else "")
+            for column, descending in order
+        )
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return sql, cursor_positions
+
+    def _after(self, order, cursor_nulls, position):
+        """Keyset condition selecting the rows after the cursor, with NULLs sorting last in every column."""
+        column, descending = order[position]
+        operator = "<" if descending else ">"
+        if position == len(order) - 1:
+            return f"{column} {operator} %s", [position]
+        rest, rest_positions = self._after(order, cursor_nulls, position + 1)
+        if cursor_nulls[position]:
+            return f"({column} IS NULL AND {rest})", rest_positions
+        return (
+            f"({column} {operator} %s OR ({column} = %s AND {rest}) OR {column} IS NULL)",
+            [position, position] + rest_positions
+        )
@@ -0,0 +1,42 @@
+import os
+import itertools
+
+# Number of rows fetched from the server per round trip when streaming
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 5000))
+
+_cursor_ids = itertools.count()
+
+
+def iter_batches(connection, sql, params=(), batch_size=STREAM_BATCH_SIZE):
+    """
+    Run a query through a server-side cursor and yield `(columns, rows)` batches.
+
+    redshift_connector buffers the complete result set on `execute`, so a large
+    result is declared as a cursor and fetched `batch_size` rows at a time; only one
+    batch is held in the API process at any moment. Cursors only live inside a
+    transaction, which is committed (or rolled back) once the generator finishes.
+    At least one batch is always yielded so callers can read the column names.
+    """
+    cursor_name = f"stream_cursor_{next(_cursor_ids)}"
+    connection.autocommit = False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DECLARE {cursor_name} CURSOR FOR {sql}", tuple(params))
+            first = True
+            while True:
+                cursor.execute(f"FETCH FORWARD {batch_size} FROM {cursor_name}")
+                rows = cursor.fetchall()
+                columns = [column[0] for column in cursor.description]
+                if rows or first:
+                    yield columns, rows
+                first = False
+                if len(rows) < batch_size:
+                    break
+            cursor.execute(f"CLOSE {cursor_name}")
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.autocommit = True
+
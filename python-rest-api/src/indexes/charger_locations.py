@@ -0,0 +1,135 @@
+import threading
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from utils.load_version import read_load_version
+from utils.pagination import rows_to_dicts
+
+# Mean Earth radius used for all distances
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_vectors(lat, lon):
+    """Map latitudes/longitudes in degrees to 3D points on the unit sphere."""
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def km_to_chord(distance_km):
+    """Straight-line distance through the unit sphere between points `distance_km` apart on the surface."""
+    angle = np.minimum(np.asarray(distance_km, dtype=float) / EARTH_RADIUS_KM, np.pi)
+    return 2.0 * np.sin(angle / 2.0)
+
+
+def chord_to_km(chord):
+    """Reverse `km_to_chord`."""
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=float) / 2.0, 0.0, 1.0))
+
+
+class ChargerLocationIndex:
+    """
+    Immutable k-d tree over the charger locations, plus every charger keyed by charger_id.
+
+    Chargers are indexed as points on the unit sphere, where the straight-line
+    (chord) distance grows monotonically with the great-circle distance. Radius and
+    k-nearest queries are therefore exact, with no haversine evaluated per charger
+    and no special cases at the poles or the antimeridian.
+    """
+
+    def __init__(self, columns, rows):
+        chargers = rows_to_dicts(columns, rows)
+        # The chargers table is small, so bulk lookups are answered from memory
+        self.by_id = {charger["charger_id"]: charger for charger in chargers}
+        self.chargers = [
+            charger for charger in chargers
+            if charger.get("location_lat") is not None and charger.get("location_lon") is not None
+        ]
+        points = to_unit_vectors(
+            [charger["location_lat"] for charger in self.chargers],
+            [charger["location_lon"] for charger in self.chargers]
+        ).reshape(-1, 3)
+        self.tree = cKDTree(points) if len(self.chargers) else None
+
+    def __len__(self):
+        return len(self.chargers)
+
+    def nearby(self, lats, lons, radius_km=None, k=None):
+        """
+        Return, for every query point, the matching chargers ordered by distance.
+
+        With `k` the (at most) k nearest chargers are returned, optionally only
+        those within `radius_km`; with only `radius_km` all chargers within the
+        radius. Each charger dict gets a `distance_km` entry.
+        """
+        if self.tree is None:
+            return [[] for _ in lats]
+        points = to_unit_vectors(lats, lons)
+        max_chord = km_to_chord(radius_km) if radius_km is not None else np.inf
+        results = []
+        if k is not None:
+            k = min(k, len(self.chargers))
+            chords, positions = self.tree.query(points, k=k, distance_upper_bound=max_chord * (1 + 1e-12))
+            chords, positions = chords.reshape(len(points), k), positions.reshape(len(points), k)
+            for point_chords, point_positions in zip(chords, positions):
+                found = point_positions < len(self.chargers)  # Misses beyond the radius come back as n
+                results.append(self._with_distances(point_positions[found], point_chords[found]))
+            return results
+        for point, neighbours in zip(points, self.tree.query_ball_point(points, max_chord * (1 + 1e-12))):
+            neighbours = np.asarray(neighbours, dtype=int)
+            chords = np.linalg.norm(self.tree.data[neighbours] - point, axis=1) if len(neighbours) else np.empty(0)
+            order = np.argsort(chords, kind="stable")
+            results.append(self._with_distances(neighbours[order], chords[order]))
+        return results
+
+    def _with_distances(self, positions, chords):
+        distances = chord_to_km(chords)
+        return [
+            {**self.chargers[position], "distance_km": round(float(distance), 4)}
+            for position, distance in zip(positions.tolist(), distances.tolist())
+        ]
+
+
+class ChargerLocations:
+    """
+    Keeps a `ChargerLocationIndex` in step with the loaded chargers table.
+
+    The tree is rebuilt from the backend whenever the chargers load version changes.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._index = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Return an index of the current chargers table, building it first if needed."""
+        version = read_load_version("chargers")
+        if self._index is not None and self._version == version:
+            return self._index
+        with self._lock:
+            if self._index is None or self._version != version:
+                self._index = self._build()
+                self._version = version
+            return self._index
+
+    def warm_up(self):
+        """Build the index ahead of the first lookup, e.g. in a background thread at startup."""
+        try:
+            self.current()
+        except Exception as e:
+            print(f"Failed to build the charger location index: {e}")
+
+    def _build(self):
+        sql = "SELECT * FROM chargers"
+        print(f"Building charger location index: {sql}")
+        with self.backend.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                rows = cursor.fetchall()
+                columns = [column[0] for column in cursor.description]
+        index = ChargerLocationIndex(columns, rows)
+        print(f"Indexed {len(index)} charger locations.")
+        return index
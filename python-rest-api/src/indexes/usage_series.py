@@ -0,0 +1,167 @@
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+import pandas as pd
+
+from utils.cache import ResultCache
+from utils.load_version import read_load_version
+
+# Bucket widths of the usage time series
+BUCKETS = ("hour", "day", "week")
+# Per-charger transaction slices kept in memory; they are dropped after each transactions load
+USAGE_SLICE_CACHE_TTL = float(os.getenv("USAGE_SLICE_CACHE_TTL", 3600))
+USAGE_SLICE_CACHE_MAX_ENTRIES = int(os.getenv("USAGE_SLICE_CACHE_MAX_ENTRIES", 256))
+# Guard against series with more buckets than a client can reasonably plot
+MAX_SERIES_BUCKETS = int(os.getenv("MAX_SERIES_BUCKETS", 10000))
+
+
+class ChargerUsageSlice:
+    """Columnar copy of one charger's transactions: UTC start times in epoch seconds, kWh and status."""
+
+    def __init__(self, rows):
+        # rows: (start_time, kwh_consumed, status) ordered by start_time; timestamps are stored in UTC
+        self.start_times = np.array([row[0] for row in rows], dtype="datetime64[s]").astype(np.int64)
+        self.kwh = np.array([np.nan if row[1] is None else float(row[1]) for row in rows], dtype=float)
+        self.statuses = np.array([row[2] for row in rows], dtype=object)
+
+    def __len__(self):
+        return len(self.start_times)
+
+
+def parse_timezone(name):
+    """Return the ZoneInfo of an IANA timezone name, raising ValueError (a 400 response) if unknown."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Invalid tz: unknown timezone {name!r}.")
+
+
+def parse_local_datetime(value, name, tz):
+    """Parse an ISO datetime; naive values are wall-clock times in `tz`. Returns UTC epoch seconds."""
+    try:
+        moment = datetime.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r} is not an ISO datetime.")
+    timestamp = pd.Timestamp(moment)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize(tz, ambiguous=True, nonexistent="shift_forward")
+    return int(timestamp.timestamp())
+
+
+def bucket_edges(first_second, last_second, bucket, tz):
+    """
+    Return the UTC start (epoch seconds) of every bucket covering [first_second, last_second].
+
+    Buckets start on wall-clock boundaries in `tz` (whole hours, midnights, Monday
+    midnights), so days are 23 or 25 hours long across DST changes and hours
+    follow the local offset, including half-hour zones.
+    """
+    first_local = pd.Timestamp(first_second, unit="s", tz="UTC").tz_convert(tz).tz_localize(None)
+    if bucket == "hour":
+        first_local = first_local.floor("h")
+    else:
+        first_local = first_local.normalize()
+        if bucket == "week":
+            first_local -= pd.Timedelta(days=first_local.weekday())
+    first_edge = first_local.tz_localize(tz, ambiguous=True, nonexistent="shift_forward")
+    last_edge = pd.Timestamp(last_second, unit="s", tz="UTC").tz_convert(tz)
+    if bucket == "hour":
+        # Hours are absolute: a repeated wall-clock hour at the end of DST is its own bucket
+        count = int((last_edge - first_edge) // pd.Timedelta(hours=1)) + 1
+        if count > MAX_SERIES_BUCKETS:
+            raise ValueError(f"Invalid range: the series would have more than {MAX_SERIES_BUCKETS} buckets.")
+        return int(first_edge.timestamp()) + 3600 * np.arange(count, dtype=np.int64)
+
+    step = 7 if bucket == "week" else 1
+    days = (last_edge.tz_localize(None).normalize() - first_local).days // step + 1
+    if days > MAX_SERIES_BUCKETS:
+        raise ValueError(f"Invalid range: the series would have more than {MAX_SERIES_BUCKETS} buckets.")
+    # Calendar days: step the wall clock, then map every local midnight back to UTC
+    local_edges = pd.DatetimeIndex([first_local + pd.Timedelta(days=step * i) for i in range(days)])
+    utc_edges = local_edges.tz_localize(tz, ambiguous=True, nonexistent="shift_forward").tz_convert("UTC")
+    return utc_edges.as_unit("s").asi8
+
+
+def compute_usage_series(usage_slice, bucket, tz, start=None, end=None, status=None, fill=True):
+    """
+    Bin a charger's transactions into time buckets in one vectorized pass.
+
+    Transactions count towards the bucket their start_time falls into, restricted
+    to [start, end) when given (UTC epoch seconds). Returns a list of
+    `{bucket_start, session_count, kwh_sum, kwh_avg}` dicts; with `fill`, empty
+    buckets between the first and the last are included with zero sessions.
+    """
+    mask = np.ones(len(usage_slice), dtype=bool)
+    if start is not None:
+        mask &= usage_slice.start_times >= start
+    if end is not None:
+        mask &= usage_slice.start_times < end
+    if status is not None:
+        mask &= usage_slice.statuses == status
+    times = usage_slice.start_times[mask]
+    kwh = usage_slice.kwh[mask]
+
+    if start is not None:
+        first_second = start
+    elif len(times):
+        first_second = int(times.min())
+    else:
+        return []
+    if end is not None:
+        last_second = end - 1
+    elif len(times):
+        last_second = int(times.max())
+    else:
+        last_second = first_second
+    edges = bucket_edges(first_second, last_second, bucket, tz)
+
+    positions = np.searchsorted(edges, times, side="right") - 1
+    session_counts = np.bincount(positions, minlength=len(edges))
+    has_kwh = ~np.isnan(kwh)
+    kwh_sums = np.bincount(positions[has_kwh], weights=kwh[has_kwh], minlength=len(edges))
+    kwh_counts = np.bincount(positions[has_kwh], minlength=len(edges))
+
+    labels = pd.to_datetime(edges, unit="s", utc=True).tz_convert(tz)
+    series = []
+    for label, sessions, kwh_sum, kwh_count in zip(labels, session_counts.tolist(), kwh_sums.tolist(), kwh_counts.tolist()):
+        if not fill and sessions == 0:
+            continue
+        series.append({
+            "bucket_start": label.isoformat(),
+            "session_count": sessions,
+            "kwh_sum": round(kwh_sum, 6),
+            "kwh_avg": round(kwh_sum / kwh_count, 6) if kwh_count else None
+        })
+    return series
+
+
+class ChargerUsageSlices:
+    """
+    Cache of per-charger `ChargerUsageSlice`s, fetched with one indexed query per charger.
+
+    Slices are tagged with the transactions load version, so a new load drops them.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.cache = ResultCache("usage_slices", ttl=USAGE_SLICE_CACHE_TTL, max_entries=USAGE_SLICE_CACHE_MAX_ENTRIES)
+
+    def get(self, charger_id):
+        return self.cache.get_or_compute(
+            charger_id, lambda: self._fetch(charger_id), version=read_load_version("transactions")
+        )
+
+    def _fetch(self, charger_id):
+        sql = """
+        SELECT start_time, kwh_consumed, status
+        FROM transactions
+        WHERE charger_id = %s AND start_time IS NOT NULL
+        ORDER BY start_time
+        """
+        with self.backend.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, (charger_id,))
+                rows = cursor.fetchall()
+        return ChargerUsageSlice(rows)
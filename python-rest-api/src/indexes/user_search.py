@@ -0,0 +1,149 @@
+import os
+import heapq
+import threading
+
+from utils.load_version import read_load_version
+
+# Fields the support tool searches by substring
+SEARCH_FIELDS = ("first_name", "last_name", "full_name", "email")
+# Longest n-gram kept in the index; longer queries intersect the postings of their trigrams
+MAX_GRAM_LENGTH = 3
+# Answer substring filters from the in-process index instead of ILIKE scans
+USER_SEARCH_INDEX_ENABLED = os.getenv("USER_SEARCH_INDEX_ENABLED", "true").lower() == "true"
+
+# Ranking of a field match, best first
+EXACT_MATCH, PREFIX_MATCH, WORD_PREFIX_MATCH, SUBSTRING_MATCH = 3, 2, 1, 0
+
+
+def ngrams(text, length):
+    """Return the distinct substrings of `text` with the given length."""
+    return {text[i:i + length] for i in range(len(text) - length + 1)}
+
+
+def match_score(value, query):
+    """Score how well a lower-cased field value matches a query it contains."""
+    if value == query:
+        return EXACT_MATCH
+    if value.startswith(query):
+        return PREFIX_MATCH
+    if any(word.startswith(query) for word in value.replace("@", " ").replace(".", " ").split()):
+        return WORD_PREFIX_MATCH
+    return SUBSTRING_MATCH
+
+
+class UserSearchIndex:
+    """
+    Immutable n-gram index over the searchable user fields.
+
+    Every lower-cased field value is split into its 1-, 2- and 3-grams, each mapped to
+    the set of users containing it. A query is answered by intersecting the postings
+    of its n-grams (the longest available, smallest set first) and checking the few
+    remaining candidates for the actual substring, so the results are the same as
+    `LOWER(field) ILIKE '%query%'` without scanning every user.
+    """
+
+    def __init__(self, rows):
+        # rows: (user_id, first_name, last_name, full_name, email)
+        self.user_ids = []
+        self.values = {field: [] for field in SEARCH_FIELDS}
+        self.postings = {field: {} for field in SEARCH_FIELDS}
+        for row in rows:
+            doc = len(self.user_ids)
+            self.user_ids.append(row[0])
+            for field, value in zip(SEARCH_FIELDS, row[1:]):
+                value = value.lower() if isinstance(value, str) else None
+                self.values[field].append(value)
+                if value is None:
+                    continue
+                postings = self.postings[field]
+                for length in range(1, MAX_GRAM_LENGTH + 1):
+                    for gram in ngrams(value, length):
+                        postings.setdefault(gram, set()).add(doc)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def _candidates(self, field, query):
+        """Return the documents whose `field` contains `query`."""
+        postings = self.postings[field]
+        if not query:
+            return {doc for doc, value in enumerate(self.values[field]) if value is not None}
+        length = min(len(query), MAX_GRAM_LENGTH)
+        sets = sorted((postings.get(gram, set()) for gram in ngrams(query, length)), key=len)
+        candidates = set(sets[0]).intersection(*sets[1:]) if sets else set()
+        if len(query) <= MAX_GRAM_LENGTH:
+            return candidates
+        values = self.values[field]
+        return {doc for doc in candidates if query in values[doc]}
+
+    def search(self, queries, limit=None, after=None):
+        """
+        Return `(score, user_id)` pairs of users matching every `{field: query}` substring filter.
+
+        Results are ordered by descending score (the sum of the field match ranks)
+        and then by user_id. `after` is the `(score, user_id)` of the last result of
+        the previous page.
+        """
+        queries = {field: query.lower() for field, query in queries.items()}
+        candidates = None
+        for field, query in sorted(queries.items(), key=lambda item: -len(item[1])):
+            matches = self._candidates(field, query)
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return []
+
+        results = (
+            (sum(match_score(self.values[field][doc], query) for field, query in queries.items()), self.user_ids[doc])
+            for doc in candidates
+        )
+        if after is not None:
+            after_key = (-after[0], after[1])
+            results = (result for result in results if (-result[0], result[1]) > after_key)
+        sort_key = lambda result: (-result[0], result[1])
+        if limit is None:
+            return sorted(results, key=sort_key)
+        return heapq.nsmallest(limit, results, key=sort_key)
+
+
+class UserSearch:
+    """
+    Keeps a `UserSearchIndex` in step with the loaded users table.
+
+    The index is rebuilt from the backend whenever the users load version changes;
+    searches keep using the previous index until the new one is swapped in.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._index = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Return an index of the current users table, building it first if needed."""
+        version = read_load_version("users")
+        if self._index is not None and self._version == version:
+            return self._index
+        with self._lock:
+            if self._index is None or self._version != version:
+                self._index = self._build()
+                self._version = version
+            return self._index
+
+    def warm_up(self):
+        """Build the index ahead of the first search, e.g. in a background thread at startup."""
+        try:
+            self.current()
+        except Exception as e:
+            print(f"Failed to build the user search index: {e}")
+
+    def _build(self):
+        sql = f"SELECT user_id, {', '.join(SEARCH_FIELDS)} FROM users"
+        print(f"Building user search index: {sql}")
+        with self.backend.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                rows = cursor.fetchall()
+        index = UserSearchIndex(rows)
+        print(f"Indexed {len(index)} users for search.")
+        return index
@@ -17,6 +17,46 @@ def get_chargers():
     result = charger_controller.get_chargers(filters)
     return jsonify(result)
 
+@charger_routes.route("/lookup", methods=["POST"])
+def lookup_chargers():
+    """
+    POST /chargers/lookup
+    Returns the chargers of the ids in the request body, keyed by charger_id.
+    """
+    payload = request.get_json(silent=True)
+    result = charger_controller.lookup_chargers(payload)
+    return jsonify(result)
+
+@charger_routes.route("/nearby", methods=["GET"])
+def get_nearby_chargers():
+    """
+    GET /chargers/nearby
+    Returns the chargers nearest to a point, optionally within a radius.
+    """
+    filters = request.args.to_dict()
+    result = charger_controller.get_nearby_chargers(filters)
+    return jsonify(result)
+
+@charger_routes.route("/nearby/batch", methods=["POST"])
+def get_nearby_chargers_batch():
+    """
+    POST /chargers/nearby/batch
+    Returns the nearby chargers for every point in the request body.
+    """
+    payload = request.get_json(silent=True)
+    result = charger_controller.get_nearby_chargers_batch(payload)
+    return jsonify(result)
+
+@charger_routes.route("/usage-analytics", methods=["GET"])
+def get_usage_analytics_batch():
+    """
+    GET /chargers/usage-analytics
+    Returns usage analytics for several chargers, keyed by charger_id.
+    """
+    filters = request.args.to_dict()
+    result = charger_controller.get_usage_analytics_batch(filters)
+    return jsonify(result)
+
 @charger_routes.route("/<charger_id>/usage-analytics", methods=["GET"])
 def get_usage_analytics(charger_id):
     """
@@ -25,4 +65,14 @@ def get_usage_analytics(charger_id):
     """
     filters = request.args.to_dict()
     result = charger_controller.get_usage_analytics(charger_id, filters)
+    return jsonify(result)
+
+@charger_routes.route("/<charger_id>/usage-timeseries", methods=["GET"])
+def get_usage_timeseries(charger_id):
+    """
+    GET /chargers/<charger_id>/usage-timeseries
+    Returns hourly, daily or weekly usage of a specific charger.
+    """
+    filters = request.args.to_dict()
+    result = charger_controller.get_usage_timeseries(charger_id, filters)
     return jsonify(result)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from controllers.transaction_controller import TransactionController
+from utils.streaming import negotiate_format, stream_response
 
 # Create a blueprint for transaction routes
 transaction_routes = Blueprint("transaction_routes", __name__)
@@ -14,5 +15,18 @@ def get_transactions_extended():
     Returns all transactions in extended format with optional filters.
     """
     filters = request.args.to_dict()
+    response_format = negotiate_format(request)
+    if response_format != "json":
+        return stream_response(response_format, transaction_controller.stream_transactions_extended(filters))
     result = transaction_controller.get_transactions_extended(filters)
+    return jsonify(result)
+
+@transaction_routes.route("/extended/lookup", methods=["POST"])
+def lookup_transactions():
+    """
+    POST /transactions/extended/lookup
+    Returns the transactions of the session ids in the request body, keyed by session_id.
+    """
+    payload = request.get_json(silent=True)
+    result = transaction_controller.lookup_transactions(payload)
     return jsonify(result)
\ No newline at end of file
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from controllers.user_controller import UserController
+from utils.streaming import negotiate_format, stream_response
 
 # Create a blueprint for user routes
 user_routes = Blueprint("user_routes", __name__)
@@ -14,5 +15,18 @@ def get_users():
     Returns all users or filters based on query parameters.
     """
     filters = request.args.to_dict()
+    response_format = negotiate_format(request)
+    if response_format != "json":
+        return stream_response(response_format, user_controller.stream_users(filters))
     result = user_controller.get_users(filters)
+    return jsonify(result)
+
+@user_routes.route("/lookup", methods=["POST"])
+def lookup_users():
+    """
+    POST /users/lookup
+    Returns the users of the ids in the request body, keyed by user_id.
+    """
+    payload = request.get_json(silent=True)
+    result = user_controller.lookup_users(payload)
     return jsonify(result)
\ No newline at end of file
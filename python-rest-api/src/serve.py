@@ -0,0 +1,98 @@
+import os
+import argparse
+import importlib.util
+
+from dotenv import load_dotenv
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # Not available on Windows; uvicorn's own supervisor is used instead
+    BaseApplication = None
+
+# Load environment variables from .env file
+load_dotenv()
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Worker processes; each has its own connection pool, caches and indexes
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", os.cpu_count() or 1))
+SERVER_BIND = os.getenv("SERVER_BIND", "0.0.0.0:8000")
+# Threads per worker process in wsgi mode
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", 32))
+# Seconds a worker may stay silent before gunicorn restarts it; long exports keep it busy
+SERVER_TIMEOUT = int(os.getenv("SERVER_TIMEOUT", 300))
+
+
+def _uvicorn_worker_class():
+    # The gunicorn worker moved from uvicorn into the uvicorn-worker package
+    if importlib.util.find_spec("uvicorn_worker") is not None:
+        return "uvicorn_worker.UvicornWorker"
+    if importlib.util.find_spec("uvicorn") is None:
+        raise ImportError("The asgi mode requires the uvicorn package.")
+    return "uvicorn.workers.UvicornWorker"
+
+
+if BaseApplication is not None:
+    class PreforkServer(BaseApplication):
+        """gunicorn master that forks the workers; each worker builds its own app after the fork."""
+
+        def __init__(self, mode, options):
+            self.mode = mode
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            # Imported in the worker, so no connection, DuckDB handle or warm-up thread crosses the fork
+            if self.mode == "asgi":
+                from asgi import app
+                return app
+            from app import create_app
+            return create_app()
+
+
+def serve(mode="asgi", bind=SERVER_BIND, workers=SERVER_WORKERS):
+    """
+    Serve the API with `workers` pre-forked processes.
+
+    In asgi mode every worker runs an event loop (uvicorn) in front of a bounded
+    thread pool, see `asgi.py`; in wsgi mode every worker runs `WSGI_THREADS`
+    threads (gunicorn's gthread). Without gunicorn, asgi mode falls back to
+    uvicorn's own multi-process supervisor.
+    """
+    if BaseApplication is not None:
+        options = {
+            "bind": bind,
+            "workers": workers,
+            "timeout": SERVER_TIMEOUT,
+            "graceful_timeout": 30,
+            "preload_app": False
+        }
+        if mode == "asgi":
+            options["worker_class"] = _uvicorn_worker_class()
+        else:
+            options.update(worker_class="gthread", threads=WSGI_THREADS)
+        PreforkServer(mode, options).run()
+        return
+
+    if mode != "asgi":
+        raise ImportError("The wsgi mode requires the gunicorn package.")
+    try:
+        import uvicorn
+    except ImportError:
+        raise ImportError("The asgi mode requires the uvicorn package.")
+    host, _, port = bind.rpartition(":")
+    uvicorn.run("asgi:app", host=host or "0.0.0.0", port=int(port), workers=workers, app_dir=SRC_DIR)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the REST API with multiple worker processes.")
+    parser.add_argument("--mode", choices=["asgi", "wsgi"], default="asgi")
+    parser.add_argument("--bind", default=SERVER_BIND, help="host:port to listen on.")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    args = parser.parse_args()
+
+    serve(args.mode, args.bind, args.workers)
@@ -0,0 +1,217 @@
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+
+from utils.metrics import CACHE_LOOKUPS
+from utils.single_flight import SingleFlight
+
+try:
+    import redis
+except ImportError:  # The shared Redis backend is optional
+    redis = None
+
+# Load environment variables from .env file
+load_dotenv()
+
+
+class TTLLRUCache:
+    """Thread-safe in-process cache with per-entry expiry and least-recently-used eviction."""
+
+    def __init__(self, ttl=300.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return `(True, value)` for a live entry and `(False, None)` otherwise."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+
+class LocalCacheBackend:
+    """
+    Stand-in for the shared cache backend that keeps pickled values in process memory.
+
+    It has the same interface as `RedisCacheBackend`, so the shared cache path can be
+    exercised without a Redis server.
+    """
+
+    def __init__(self):
+        self._values = {}  # key -> (expires_at, payload)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._values.pop(key, None)
+                return None
+            return entry[1]
+
+    def set(self, key, payload, ttl):
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl, payload)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._values if key.startswith(prefix)]:
+                del self._values[key]
+
+
+class RedisCacheBackend:
+    """Shared cache backend storing pickled values in Redis with a server-side expiry."""
+
+    def __init__(self, url):
+        if redis is None:
+            raise ImportError("The shared Redis cache backend requires the redis package.")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, payload, ttl):
+        self.client.set(key, payload, ex=max(1, int(ttl)))
+
+    def delete_prefix(self, prefix):
+        for key in self.client.scan_iter(match=f"{prefix}*"):
+            self.client.delete(key)
+
+
+def get_shared_cache_backend():
+    """Return the shared cache backend selected by `CACHE_BACKEND`, or None for in-process only."""
+    backend = os.getenv("CACHE_BACKEND", "").lower()
+    if backend == "redis":
+        return RedisCacheBackend(os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+    if backend == "local":
+        return LocalCacheBackend()
+    return None
+
+
+class ResultCache:
+    """
+    Two-level result cache: an in-process TTL/LRU cache in front of an optional shared backend.
+
+    Entries are tagged with a data version (the load version of the underlying table),
+    so a new load makes every older entry unreachable and clears the local cache.
+    Concurrent misses of the same entry are computed once.
+    """
+
+    def __init__(self, namespace, ttl=300.0, max_entries=1024, shared_backend=None):
+        self.namespace = namespace
+        self.local = TTLLRUCache(ttl, max_entries)
+        self.shared_backend = shared_backend
+        self._version = None
+        self._version_lock = threading.Lock()
+        self._in_flight = SingleFlight(namespace)
+
+    def get_or_compute(self, key, compute, version="0"):
+        """
+        Return the cached value for `key` at `version`, calling `compute()` on a miss.
+
+        Requests missing the same entry at once wait for the first one's `compute()`.
+        """
+        found, value = self.get(key, version)
+        if found:
+            return value
+        return self._in_flight.do((version, key), lambda: self._compute(key, compute, version))
+
+    def _compute(self, key, compute, version):
+        # A call that finished between the lookup and now has already cached its value
+        found, value = self.local.get((version, key))
+        if found:
+            return value
+        value = compute()
+        self.set(key, value, version)
+        return value
+
+    def get(self, key, version="0"):
+        """Return `(True, value)` if `key` is cached at `version`, locally or in the shared backend."""
+        self._check_version(version)
+        local_key = (version, key)
+        found, value = self.local.get(local_key)
+        if found:
+            CACHE_LOOKUPS.inc(cache=self.namespace, result="hit")
+            return True, value
+
+        if self.shared_backend is not None:
+            try:
+                payload = self.shared_backend.get(self._shared_key(key, version))
+            except Exception as e:
+                print(f"Shared cache lookup failed for {self.namespace}: {e}")
+                payload = None
+            if payload is not None:
+                value = pickle.loads(payload)
+                self.local.set(local_key, value)
+                CACHE_LOOKUPS.inc(cache=self.namespace, result="shared_hit")
+                return True, value
+        CACHE_LOOKUPS.inc(cache=self.namespace, result="miss")
+        return False, None
+
+    def set(self, key, value, version="0"):
+        """Cache `value` for `key` at `version`."""
+        self.local.set((version, key), value)
+        if self.shared_backend is not None:
+            try:
+                self.shared_backend.set(self._shared_key(key, version), pickle.dumps(value), self.local.ttl)
+            except Exception as e:
+                print(f"Shared cache store failed for {self.namespace}: {e}")
+
+    def _shared_key(self, key, version):
+        return f"{self.namespace}:{version}:{key!r}"
+
+    def invalidate(self):
+        """Drop all cached entries, locally and in the shared backend."""
+        self.local.clear()
+        if self.shared_backend is not None:
+            self.shared_backend.delete_prefix(f"{self.namespace}:")
+
+    def stats(self):
+        return self.local.stats()
+
+    def _check_version(self, version):
+        """Clear the local cache once a newer data version shows up."""
+        with self._version_lock:
+            if version == self._version:
+                return
+            self._version = version
+        self.local.clear()
@@ -0,0 +1,107 @@
+import os
+import gzip
+import zlib
+
+from dotenv import load_dotenv
+from flask import request
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+# Load environment variables from .env file
+load_dotenv()
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Smaller bodies are sent as they are; compressing them costs more than it saves
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", 3))
+
+
+def available_encodings():
+    """Content codings the server can produce, in order of preference."""
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def negotiate_encoding(accept_encodings):
+    """Pick the content coding for a request's Accept-Encoding, or None to send the body as is."""
+    encoding = accept_encodings.best_match(available_encodings())
+    if encoding is None or accept_encodings[encoding] <= 0:
+        return None
+    return encoding
+
+
+def compress(data, encoding):
+    """Compress a complete body."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    # A fixed mtime keeps the output, and so the representation behind its ETag, stable
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def iter_compressed(chunks, encoding):
+    """
+    Compress a streamed body chunk by chunk.
+
+    Every chunk is flushed, so the client can decode each batch as soon as it
+    arrives instead of waiting for the end of the stream.
+    """
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        flush_mode = zlib.Z_SYNC_FLUSH
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(flush_mode)
+        yield compressor.flush()
+    finally:
+        # The wrapped body may hold a database connection until it is closed
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def init_compression(app, min_bytes=COMPRESSION_MIN_BYTES):
+    """
+    Compress responses with zstd or gzip, as negotiated with Accept-Encoding.
+
+    Bodies under `min_bytes` are sent uncompressed. Streamed responses are always
+    compressed, chunk by chunk. A strong ETag gets the coding as a suffix, since
+    the compressed bytes are a different representation.
+    """
+    if not COMPRESSION_ENABLED:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        response.vary.add("Accept-Encoding")
+        if (
+            request.method == "HEAD"
+            or response.status_code != 200
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        encoding = negotiate_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = iter_compressed(response.response, encoding)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < min_bytes:
+                return response
+            response.set_data(compress(data, encoding))
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
@@ -0,0 +1,228 @@
+import os
+import json
+import asyncio
+import threading
+
+from dotenv import load_dotenv
+from flask import g, jsonify, request
+from werkzeug.exceptions import HTTPException
+
+from utils.metrics import Counter, Gauge
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Requests an endpoint handles at once unless ENDPOINT_CONCURRENCY_LIMITS says otherwise; 0 disables the limits
+DEFAULT_ENDPOINT_CONCURRENCY = int(os.getenv("DEFAULT_ENDPOINT_CONCURRENCY", 32))
+# Per-endpoint overrides as "url rule=limit" pairs, e.g. "/transactions-extended=8,/users=64"
+ENDPOINT_CONCURRENCY_LIMITS = os.getenv("ENDPOINT_CONCURRENCY_LIMITS", "/transactions-extended=8")
+# Requests allowed to wait for a slot per endpoint, and for how long, before they get a 503
+ENDPOINT_MAX_QUEUE = int(os.getenv("ENDPOINT_MAX_QUEUE", 512))
+ENDPOINT_QUEUE_TIMEOUT = float(os.getenv("ENDPOINT_QUEUE_TIMEOUT", 30))
+
+
+def parse_concurrency_limits(value, setting="ENDPOINT_CONCURRENCY_LIMITS"):
+    """Parse "rule=limit,..." into a dict of URL rules to limits, raising ValueError if malformed."""
+    limits = {}
+    for pair in (value or "").split(","):
+        if not pair.strip():
+            continue
+        rule, separator, limit = pair.rpartition("=")
+        if not separator or not rule.strip() or not limit.strip().isdigit():
+            raise ValueError(f"Invalid {setting} entry: {pair.strip()!r}.")
+        limits[rule.strip()] = int(limit)
+    return limits
+
+
+def limit_for(endpoint, limits=None):
+    """Concurrency limit of an endpoint (its URL rule), or None if it is not limited."""
+    limits = parse_concurrency_limits(ENDPOINT_CONCURRENCY_LIMITS) if limits is None else limits
+    limit = limits.get(endpoint, DEFAULT_ENDPOINT_CONCURRENCY)
+    # /metrics must stay reachable while the endpoints are saturated
+    return limit if limit > 0 and endpoint not in ("unmatched", "/metrics") else None
+
+
+HTTP_REQUESTS_REJECTED = Counter(
+    "http_requests_rejected_total", "Requests answered with 503 because their endpoint was at its concurrency limit.",
+    ["endpoint", "reason"]
+)
+
+_limiters = []
+
+
+def _collect_endpoint_concurrency():
+    values = {}
+    for limiters in _limiters:
+        for endpoint, limiter in list(limiters.items()):
+            values[(endpoint, "in_flight")] = values.get((endpoint, "in_flight"), 0) + limiter.in_flight
+            values[(endpoint, "waiting")] = values.get((endpoint, "waiting"), 0) + limiter.waiting
+    return values
+
+
+ENDPOINT_CONCURRENCY = Gauge(
+    "http_endpoint_concurrency", "Requests per endpoint being handled or waiting for a slot.", ["endpoint", "state"],
+    _collect_endpoint_concurrency
+)
+
+
+def _rejection_message(endpoint):
+    return f"Too many concurrent requests to {endpoint}; retry later."
+
+
+class _ThreadLimiter:
+    """Slots of one endpoint for thread-per-request servers; waiting requests hold their thread."""
+
+    def __init__(self, limit):
+        self.semaphore = threading.BoundedSemaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+        self.semaphore.release()
+
+
+def init_concurrency_limits(app, limits=None, max_queue=ENDPOINT_MAX_QUEUE, queue_timeout=ENDPOINT_QUEUE_TIMEOUT):
+    """
+    Limit how many requests each endpoint handles at once under a WSGI server.
+
+    A request over the limit waits up to `queue_timeout` seconds for a slot, holding
+    its server thread, and gets a 503 with Retry-After if none frees up or more than
+    `max_queue` requests are already waiting. The slot is released once the response
+    (including a streamed body) has been sent. Under the ASGI entry point,
+    `ConcurrencyLimitMiddleware` does this without holding threads instead.
+    """
+    limits = parse_concurrency_limits(ENDPOINT_CONCURRENCY_LIMITS) if limits is None else limits
+    limiters = {}
+    limiters_lock = threading.Lock()
+    _limiters.append(limiters)
+
+    @app.before_request
+    def acquire_endpoint_slot():
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        limit = limit_for(endpoint, limits)
+        if limit is None:
+            return None
+        with limiters_lock:
+            limiter = limiters.setdefault(endpoint, _ThreadLimiter(limit))
+        with limiter.lock:
+            queue_full = limiter.waiting >= max_queue
+            if not queue_full:
+                limiter.waiting += 1
+        acquired = False
+        if not queue_full:
+            try:
+                acquired = limiter.semaphore.acquire(timeout=queue_timeout)
+            finally:
+                with limiter.lock:
+                    limiter.waiting -= 1
+                    limiter.in_flight += acquired
+        if not acquired:
+            HTTP_REQUESTS_REJECTED.inc(endpoint=endpoint, reason="queue_full" if queue_full else "timeout")
+            response = jsonify({"error": _rejection_message(endpoint)})
+            response.status_code = 503
+            response.headers["Retry-After"] = "1"
+            return response
+        g.concurrency_limiter = limiter
+        return None
+
+    @app.after_request
+    def release_after_response(response):
+        limiter = g.pop("concurrency_limiter", None)
+        if limiter is not None:
+            # Runs when the server closes the body, i.e. after the last streamed chunk
+            response.call_on_close(limiter.release)
+        return response
+
+    @app.teardown_request
+    def release_on_error(error):
+        # Requests that failed before after_request still hold their slot
+        limiter = g.pop("concurrency_limiter", None)
+        if limiter is not None:
+            limiter.release()
+
+
+class _AsyncLimiter:
+    """Slots of one endpoint on the event loop; waiting requests are coroutines, not threads."""
+
+    def __init__(self, limit):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    ASGI middleware limiting how many requests each endpoint handles at once.
+
+    Endpoints are the Flask URL rules of `url_map`, as in the metrics. Requests
+    over the limit wait on the event loop, so hundreds of them cost no threads;
+    only admitted requests reach the wrapped app and its bounded thread pool. A
+    request gets a 503 with Retry-After when more than `max_queue` are waiting or
+    no slot frees up within `queue_timeout` seconds.
+    """
+
+    def __init__(self, app, url_map, limits=None, max_queue=ENDPOINT_MAX_QUEUE, queue_timeout=ENDPOINT_QUEUE_TIMEOUT):
+        self.app = app
+        # Only used on the event loop thread
+        self.adapter = url_map.bind("localhost")
+        self.limits = parse_concurrency_limits(ENDPOINT_CONCURRENCY_LIMITS) if limits is None else limits
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.limiters = {}
+        _limiters.append(self.limiters)
+
+    def endpoint(self, scope):
+        try:
+            rule, _ = self.adapter.match(scope["path"], method=scope["method"], return_rule=True)
+        except HTTPException:
+            # 404, 405 and redirects are answered by Flask without touching the database
+            return "unmatched"
+        return rule.rule
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        endpoint = self.endpoint(scope)
+        limit = limit_for(endpoint, self.limits)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters.get(endpoint)
+        if limiter is None:
+            limiter = self.limiters[endpoint] = _AsyncLimiter(limit)
+        if limiter.waiting >= self.max_queue:
+            await self.reject(send, endpoint, "queue_full")
+            return
+        limiter.waiting += 1
+        try:
+            await asyncio.wait_for(limiter.semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            await self.reject(send, endpoint, "timeout")
+            return
+        finally:
+            limiter.waiting -= 1
+        limiter.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.in_flight -= 1
+            limiter.semaphore.release()
+
+    async def reject(self, send, endpoint, reason):
+        HTTP_REQUESTS_REJECTED.inc(endpoint=endpoint, reason=reason)
+        body = json.dumps({"error": _rejection_message(endpoint)}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"retry-after", b"1")
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+
+from dotenv import load_dotenv
+from flask import Response, g, request
+
+from utils.load_version import LOAD_VERSION_DIR, read_load_version
+from utils.streaming import negotiate_format
+from utils.compression import available_encodings
+
+# Load environment variables from .env file
+load_dotenv()
+
+CONDITIONAL_GET_ENABLED = os.getenv("CONDITIONAL_GET_ENABLED", "true").lower() == "true"
+
+# Tables whose data each endpoint serves, by URL rule prefix; the first match wins
+ENDPOINT_TABLES = (
+    ("/chargers/usage-analytics", ("chargers", "transactions", "charger_daily_usage")),
+    ("/chargers/<charger_id>/", ("transactions", "charger_daily_usage")),
+    ("/chargers", ("chargers",)),
+    ("/users", ("users",)),
+    ("/transactions", ("transactions",))
+)
+
+
+def tables_for(endpoint):
+    """Tables an endpoint (its URL rule) reads, or None if its responses do not follow the loaded data."""
+    for prefix, tables in ENDPOINT_TABLES:
+        if endpoint.startswith(prefix):
+            return tables
+    return None
+
+
+def compute_etag(path, args, response_format, versions):
+    """
+    Strong ETag of a GET response, without running its query.
+
+    The data only changes when the loader runs, so the response is determined by
+    the request (path, query parameters and format) and `versions`, the load
+    versions of the tables the endpoint reads. The path rather than the URL rule
+    is hashed, so each charger of `/chargers/<charger_id>/...` gets its own tag.
+    """
+    key = json.dumps([
+        path,
+        sorted(args.items(multi=True)),
+        response_format,
+        versions
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def init_conditional_get(app):
+    """
+    Tag GET responses with an ETag derived from the load versions and answer
+    matching If-None-Match requests with 304 Not Modified before the handler runs,
+    so polling clients cost no database query until the next load.
+
+    Responses of tables without a load stamp get no ETag, since their data may
+    change without the version changing. Must be registered after
+    `init_compression`, so the ETag is set before the response is compressed.
+    """
+    if not CONDITIONAL_GET_ENABLED:
+        return
+    if not os.path.isdir(LOAD_VERSION_DIR):
+        print(
+            f"Warning: LOAD_VERSION_DIR {LOAD_VERSION_DIR} does not exist; "
+            "responses get no ETag until the loader stamps the tables."
+        )
+
+    @app.before_request
+    def check_not_modified():
+        if request.method not in ("GET", "HEAD") or request.url_rule is None:
+            return None
+        tables = tables_for(request.url_rule.rule)
+        if tables is None:
+            return None
+        try:
+            response_format = negotiate_format(request)
+        except ValueError:
+            return None  # The handler answers with 400
+        versions = {table: read_load_version(table) for table in tables}
+        if "0" in versions.values():
+            return None  # Unstamped data may have changed since any earlier response
+        etag = compute_etag(request.path, request.args, response_format, versions)
+        g.etag = etag
+        # A client may hold any content coding of the current representation
+        for tag in [etag] + [f"{etag}-{encoding}" for encoding in available_encodings()]:
+            if request.if_none_match.contains(tag):
+                response = Response(status=304)
+                _tag(response, tag)
+                return response
+        return None
+
+    @app.after_request
+    def set_etag(response):
+        etag = g.pop("etag", None)
+        if etag is not None and response.status_code == 200:
+            _tag(response, etag)
+        return response
+
+
+def _tag(response, etag):
+    response.set_etag(etag)
+    response.vary.add("Accept")
+    # Clients may keep the response but have to revalidate it on every use
+    response.headers["Cache-Control"] = "no-cache"
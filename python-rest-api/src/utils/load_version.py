@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Directory where the loader stamps a new version for every table it finishes loading
+LOAD_VERSION_DIR = os.getenv(
+    "LOAD_VERSION_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "load_versions")
+)
+
+_cache = {}  # table -> (mtime_ns, version)
+_cache_lock = threading.Lock()
+
+
+def _stamp_path(table_name):
+    return os.path.join(LOAD_VERSION_DIR, f"{table_name}.json")
+
+
+def read_load_version(table_name):
+    """
+    Return the current load version of a table, or "0" if it was never stamped.
+
+    The stamp file is only re-read when its modification time changes, so this is
+    cheap enough to call on every request.
+    """
+    path = _stamp_path(table_name)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+    with _cache_lock:
+        cached = _cache.get(table_name)
+        if cached and cached[0] == mtime_ns:
+            return cached[1]
+    try:
+        with open(path, "r") as file:
+            version = str(json.load(file)["version"])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Failed to read load version for {table_name}: {e}")
+        return "0"
+    with _cache_lock:
+        _cache[table_name] = (mtime_ns, version)
+    return version
+
+
+def bump_load_version(table_name):
+    """Stamp a new load version for a table after it has been (re)loaded; returns the version."""
+    os.makedirs(LOAD_VERSION_DIR, exist_ok=True)
+    version = str(time.time_ns())
+    stamp = {
+        "table": table_name,
+        "version": version,
+        "loaded_at": datetime.now(timezone.utc).isoformat()
+    }
+    # Write to a temporary file first so readers never see a partial stamp
+    path = _stamp_path(table_name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(stamp, file)
+    os.replace(tmp_path, path)
+    print(f"Stamped load version {version} for table {table_name}.")
+    return version
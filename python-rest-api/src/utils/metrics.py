@@ -0,0 +1,210 @@
+import os
+import json
+import logging
+import time
+import bisect
+import threading
+import contextvars
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Record request and query metrics and expose them on /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Queries slower than this are written to the log as one JSON line each
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 500))
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in the Prometheus text format."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            if position < len(self.buckets):
+                state[position] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, [("le", _format_number(float(bound)))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{labels} {state[-1]}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_number(float(state[-2]))}")
+                lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose labelled values are read from `collect()` when the metrics are rendered."""
+
+    def __init__(self, name, documentation, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.collect()
+        except Exception as e:
+            print(f"Failed to collect {self.name}: {e}")
+            values = {}
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}")
+        return lines
+
+
+REGISTRY = []
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to handle a request, including streaming the response.",
+    ["endpoint", "method", "status"]
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time a request spent waiting for and running database queries.", ["endpoint"]
+)
+HTTP_REQUEST_APP_SECONDS = Histogram(
+    "http_request_app_seconds", "Time a request spent outside the database: Python work and serialization.",
+    ["endpoint"]
+)
+HTTP_RESPONSE_BYTES = Histogram("http_response_bytes", "Size of the response body.", ["endpoint"], BYTES_BUCKETS)
+HTTP_RESPONSE_ROWS = Histogram("http_response_rows", "Rows fetched from the database per request.", ["endpoint"], ROWS_BUCKETS)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Time to run a query and fetch its rows.", ["backend"])
+DB_POOL_WAIT_SECONDS = Histogram("db_pool_wait_seconds", "Time to check out a database connection.", ["backend"])
+DB_SLOW_QUERIES = Counter("db_slow_queries_total", "Queries slower than SLOW_QUERY_THRESHOLD_MS.", ["backend"])
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Result cache lookups by outcome.", ["cache", "result"])
+COALESCED_CALLS = Counter(
+    "coalesced_calls_total", "Calls answered by an identical call that was already in flight.", ["group"]
+)
+DB_QUERY_TIMEOUTS = Counter(
+    "db_query_timeouts_total", "Queries cancelled after their endpoint's statement timeout.", ["backend", "endpoint"]
+)
+
+
+class RequestStats:
+    """Database time and rows of the request being handled, filled in by the instrumented backend."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def start_request_stats(endpoint):
+    """Start collecting the stats of a request in the current context and return them."""
+    stats = RequestStats(endpoint)
+    _request_stats.set(stats)
+    return stats
+
+
+def current_request_stats():
+    return _request_stats.get()
+
+
+def record_pool_wait(backend_name, seconds):
+    DB_POOL_WAIT_SECONDS.observe(seconds, backend=backend_name)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+
+
+def record_query(backend_name, sql, seconds, rows):
+    """Record one query's duration and rows, and log it if it was slow."""
+    DB_QUERY_SECONDS.observe(seconds, backend=backend_name)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+        stats.rows += rows
+    if seconds * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+        DB_SLOW_QUERIES.inc(backend=backend_name)
+        # Parameters are left out: they can hold user data such as emails
+        logger.warning(json.dumps({
+            "event": "slow_query",
+            "backend": backend_name,
+            "endpoint": stats.endpoint if stats is not None else None,
+            "duration_ms": round(seconds * 1000, 1),
+            "rows": rows,
+            "sql": " ".join(sql.split())[:2000]
+        }))
+
+
+def render_metrics():
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,90 @@
+import os
+import json
+import base64
+import binascii
+from datetime import datetime, date
+
+# Page size used when the client does not pass `limit`, and the hard cap on `limit`
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+
+
+def parse_row_limit(value):
+    """Validate an optional `limit` query parameter; returns None when it is absent."""
+    if value is None or value == "":
+        return None
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid limit: {value!r} is not an integer.")
+    if limit < 1:
+        raise ValueError(f"Invalid limit: {limit} must be at least 1.")
+    return limit
+
+
+def parse_page_size(value):
+    """Validate the `limit` query parameter and clamp it to `MAX_PAGE_SIZE`."""
+    limit = parse_row_limit(value)
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _encode_value(value):
+    """Tag datetimes so they survive the JSON round trip."""
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    """Reverse `_encode_value`."""
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(values):
+    """Encode the sort key of the last row of a page as an opaque, URL-safe token."""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, key_length):
+    """Decode a token produced by `encode_cursor` back into the sort key values."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != key_length:
+            raise ValueError("unexpected key length")
+        return [_decode_value(value) for value in values]
+    except (ValueError, TypeError, binascii.Error, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def rows_to_dicts(columns, rows):
+    """Combine column names from `cursor.description` with row tuples."""
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def build_page(columns, rows, limit, key_columns):
+    """
+    Turn `limit + 1` fetched rows into a page.
+
+    The extra row only signals that another page exists; the cursor points at the
+    last row that is actually returned.
+    """
+    has_more = len(rows) > limit
+    items = rows_to_dicts(columns, rows[:limit])
+    next_cursor = None
+    if has_more and items:
+        # Redshift returns column names in lower case, whatever case the query used
+        lowered = [column.lower() for column in columns]
+        last = rows[limit - 1]
+        next_cursor = encode_cursor([last[lowered.index(column.lower())] for column in key_columns])
+    return {"data": items, "next_cursor": next_cursor}
@@ -0,0 +1,80 @@
+import time
+
+from flask import Response, request
+
+from utils.metrics import (
+    Gauge, HTTP_REQUEST_SECONDS, HTTP_REQUEST_DB_SECONDS, HTTP_REQUEST_APP_SECONDS, HTTP_RESPONSE_BYTES,
+    HTTP_RESPONSE_ROWS, start_request_stats, current_request_stats, render_metrics
+)
+
+
+_pools = []
+
+
+def _collect_pool_connections():
+    values = {}
+    for pool in _pools:
+        stats = pool.stats()
+        values[("open",)] = values.get(("open",), 0) + stats["size"]
+        values[("idle",)] = values.get(("idle",), 0) + stats["idle"]
+    return values
+
+
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Open and idle connections of the Redshift pool.", ["state"], _collect_pool_connections
+)
+
+
+def _record_request(stats, method, status, size):
+    seconds = time.perf_counter() - stats.started
+    HTTP_REQUEST_SECONDS.observe(seconds, endpoint=stats.endpoint, method=method, status=str(status))
+    HTTP_REQUEST_DB_SECONDS.observe(stats.db_seconds, endpoint=stats.endpoint)
+    HTTP_REQUEST_APP_SECONDS.observe(max(seconds - stats.db_seconds, 0.0), endpoint=stats.endpoint)
+    HTTP_RESPONSE_BYTES.observe(size, endpoint=stats.endpoint)
+    HTTP_RESPONSE_ROWS.observe(stats.rows, endpoint=stats.endpoint)
+
+
+def _measured_stream(chunks, stats, method, status):
+    """Encode and pass on a streamed body, recording the request once the last chunk is sent."""
+    size = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            size += len(chunk)
+            yield chunk
+    finally:
+        _record_request(stats, method, status, size)
+
+
+def init_request_metrics(app, backend=None):
+    """
+    Record latency, database time, rows and bytes of every request, and serve them on GET /metrics.
+
+    Endpoints are labelled by their URL rule (e.g. `/chargers/<charger_id>/usage-analytics`),
+    so the number of series stays bounded. Streamed responses are recorded when
+    their last chunk has been sent.
+    """
+
+    @app.before_request
+    def start_request_metrics():
+        start_request_stats(request.url_rule.rule if request.url_rule is not None else "unmatched")
+
+    @app.after_request
+    def record_request_metrics(response):
+        stats = current_request_stats()
+        if stats is None:
+            return response
+        if response.is_streamed:
+            response.response = _measured_stream(response.response, stats, request.method, response.status_code)
+        else:
+            _record_request(stats, request.method, response.status_code, response.calculate_content_length() or 0)
+        return response
+
+    pool = getattr(backend, "pool", None)
+    if pool is not None and pool not in _pools:
+        _pools.append(pool)
+
+    @app.route("/metrics", methods=["GET"])
+    def get_metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
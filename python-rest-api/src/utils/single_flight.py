@@ -0,0 +1,53 @@
+import threading
+
+from utils.metrics import COALESCED_CALLS
+
+
+class _Call:
+    """One in-flight call and, once `done` is set, its outcome."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs concurrent calls with the same key once and shares their outcome.
+
+    The first caller of a key runs `compute()`; callers arriving while it runs wait
+    for it and get the same value, or the same exception. Nothing is kept once the
+    call has finished, so this deduplicates bursts without caching anything.
+    Coalesced calls are counted in `coalesced_calls_total` under `name`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, compute):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED_CALLS.inc(group=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = compute()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
@@ -0,0 +1,75 @@
+import os
+import json
+import logging
+import contextvars
+
+from dotenv import load_dotenv
+from flask import request
+
+from utils.concurrency_limits import parse_concurrency_limits
+from utils.metrics import DB_QUERY_TIMEOUTS
+
+# Load environment variables from .env file
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Milliseconds a query may run before the database cancels it, unless ENDPOINT_STATEMENT_TIMEOUTS says otherwise; 0 disables it
+DEFAULT_STATEMENT_TIMEOUT_MS = int(os.getenv("DEFAULT_STATEMENT_TIMEOUT_MS", 30000))
+# Per-endpoint overrides as "url rule=milliseconds" pairs, e.g. "/transactions-extended=10000,/users=5000"
+ENDPOINT_STATEMENT_TIMEOUTS = os.getenv("ENDPOINT_STATEMENT_TIMEOUTS", "/transactions-extended=10000")
+
+
+class QueryTimeoutError(Exception):
+    """A query ran longer than the statement timeout of its endpoint and was cancelled."""
+
+
+def statement_timeout_for(endpoint, timeouts=None):
+    """Statement timeout of an endpoint (its URL rule) in milliseconds, or None if its queries are not limited."""
+    if timeouts is None:
+        timeouts = parse_concurrency_limits(ENDPOINT_STATEMENT_TIMEOUTS, "ENDPOINT_STATEMENT_TIMEOUTS")
+    milliseconds = timeouts.get(endpoint, DEFAULT_STATEMENT_TIMEOUT_MS)
+    return milliseconds if milliseconds > 0 else None
+
+
+_statement_timeout = contextvars.ContextVar("statement_timeout", default=None)
+
+
+def set_statement_timeout(endpoint, milliseconds):
+    """Limit the queries run in the current context to `milliseconds`, or lift the limit with None."""
+    _statement_timeout.set((endpoint, milliseconds) if milliseconds is not None else None)
+
+
+def current_statement_timeout():
+    """`(endpoint, milliseconds)` of the queries run in the current context, or None without a limit."""
+    return _statement_timeout.get()
+
+
+def query_timed_out(backend_name, statement_timeout):
+    """Count and log a cancelled query; returns the `QueryTimeoutError` to raise."""
+    endpoint, milliseconds = statement_timeout
+    DB_QUERY_TIMEOUTS.inc(backend=backend_name, endpoint=endpoint)
+    logger.warning(json.dumps({
+        "event": "query_timeout",
+        "backend": backend_name,
+        "endpoint": endpoint,
+        "timeout_ms": milliseconds
+    }))
+    return QueryTimeoutError(f"The query exceeded the {milliseconds} ms limit of {endpoint}; narrow the filters.")
+
+
+def init_statement_timeouts(app, timeouts=None):
+    """
+    Cancel queries that run longer than their endpoint's statement timeout.
+
+    Every request sets the timeout of its URL rule for the queries it runs; the
+    backends enforce it (see `db.backends`) and raise `QueryTimeoutError`. Queries
+    outside requests, such as index warm-ups, are not limited.
+    """
+    if timeouts is None:
+        timeouts = parse_concurrency_limits(ENDPOINT_STATEMENT_TIMEOUTS, "ENDPOINT_STATEMENT_TIMEOUTS")
+
+    @app.before_request
+    def start_statement_timeout():
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        set_statement_timeout(endpoint, statement_timeout_for(endpoint, timeouts))
@@ -0,0 +1,155 @@
+import io
+import csv
+import json
+from datetime import datetime, date
+from decimal import Decimal
+
+from flask import Response
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:  # Arrow output is optional
+    pa = None
+
+# Streaming formats, keyed by the value of the `format` query parameter
+STREAM_MIMETYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def negotiate_format(request):
+    """
+    Pick the response format from the `format` query parameter or the Accept header.
+
+    Returns "json" for the regular paginated response or one of `STREAM_MIMETYPES`.
+    """
+    requested = request.args.get("format")
+    if requested:
+        if requested != "json" and requested not in STREAM_MIMETYPES:
+            raise ValueError(f"Unsupported format: {requested!r}.")
+        return requested
+    best = request.accept_mimetypes.best_match(["application/json", *STREAM_MIMETYPES.values()])
+    for response_format, mimetype in STREAM_MIMETYPES.items():
+        if best == mimetype:
+            return response_format
+    return "json"
+
+
+def _json_default(value):
+    """Serialize database types that the json module does not know."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def iter_ndjson(batches):
+    """Write one JSON object per row, one chunk per batch."""
+    for columns, rows in batches:
+        if rows:
+            yield "".join(json.dumps(dict(zip(columns, row)), default=_json_default) + "\n" for row in rows)
+
+
+def iter_csv(batches):
+    """Write a header row followed by the rows of every batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for columns, rows in batches:
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+class _ChunkSink:
+    """File-like object collecting what the Arrow writer emits so it can be yielded."""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_arrow(batches):
+    """Write an Arrow IPC stream with one record batch per fetched batch."""
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+    for columns, rows in batches:
+        arrays = [pa.array([row[i] for row in rows]) for i in range(len(columns))]
+        if schema is None:
+            # Columns that are entirely null in the first batch fall back to strings
+            schema = pa.schema([
+                pa.field(name, pa.string() if array.type == pa.null() else array.type)
+                for name, array in zip(columns, arrays)
+            ])
+            writer = pa_ipc.new_stream(sink, schema)
+        batch = pa.RecordBatch.from_arrays(
+            [array.cast(field.type) for array, field in zip(arrays, schema)], schema=schema
+        )
+        writer.write_batch(batch)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+
+def _primed(batches):
+    """
+    Fetch the first batch now and return an iterator over all batches.
+
+    The query runs while the request is still handled, so its errors, such as a
+    statement timeout (504), become the response status instead of cutting off a
+    body that has already started.
+    """
+    first = next(batches)
+
+    def resume():
+        try:
+            yield first
+            yield from batches
+        finally:
+            batches.close()
+    return resume()
+
+
+def stream_response(response_format, batches):
+    """
+    Build a streaming Flask response that serializes `(columns, rows)` batches as they arrive.
+
+    The query is run up to its first batch before the response starts, see `_primed`.
+    """
+    if response_format == "arrow" and pa is None:
+        raise ValueError("Arrow output requires the pyarrow package.")
+    if response_format not in STREAM_MIMETYPES:
+        raise ValueError(f"Unsupported streaming format: {response_format!r}.")
+    batches = _primed(batches)
+    if response_format == "ndjson":
+        body = iter_ndjson(batches)
+    elif response_format == "csv":
+        body = iter_csv(batches)
+    else:
+        body = iter_arrow(batches)
+    return Response(body, mimetype=STREAM_MIMETYPES[response_format])
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The API imports its modules from src/, the loader from load_to_redshift_script/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "load_to_redshift_script"))
@@ -0,0 +1,124 @@
+import pytest
+from flask import Flask, jsonify
+
+import utils.conditional_get as conditional_get
+import utils.load_version as load_version
+from utils.compression import init_compression
+from utils.conditional_get import init_conditional_get
+from utils.load_version import bump_load_version
+
+
+@pytest.fixture
+def version_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(load_version, "LOAD_VERSION_DIR", str(tmp_path))
+    monkeypatch.setattr(conditional_get, "LOAD_VERSION_DIR", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def app(version_dir):
+    app = Flask(__name__)
+    app.handled = 0
+
+    @app.route("/chargers", methods=["GET", "POST"])
+    def chargers():
+        app.handled += 1
+        return jsonify([{"charger_id": f"c{i}", "city": "Zurich"} for i in range(100)])
+
+    @app.route("/chargers/<charger_id>/usage-analytics")
+    def usage_analytics(charger_id):
+        return jsonify({"charger_id": charger_id})
+
+    @app.route("/metrics")
+    def metrics():
+        return "up"
+
+    init_compression(app)
+    init_conditional_get(app)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def get(client, path="/chargers", **headers):
+    response = client.get(path, headers=headers)
+    response.close()
+    return response
+
+
+def test_unstamped_tables_get_no_etag(client):
+    response = get(client)
+    assert response.status_code == 200
+    assert response.headers.get("ETag") is None
+    assert get(client, **{"If-None-Match": "*"}).status_code == 200
+
+
+def test_matching_etag_is_answered_without_running_the_handler(app, client):
+    bump_load_version("chargers")
+    etag = get(client).headers["ETag"]
+    assert app.handled == 1
+
+    response = get(client, **{"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert app.handled == 1
+
+
+def test_new_load_changes_the_etag(client):
+    bump_load_version("chargers")
+    etag = get(client).headers["ETag"]
+    bump_load_version("chargers")
+    response = get(client, **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_etag_follows_query_parameters_and_format(client):
+    bump_load_version("chargers")
+    etags = {
+        get(client).headers["ETag"],
+        get(client, "/chargers?city=Zurich").headers["ETag"],
+        get(client, "/chargers?format=ndjson").headers.get("ETag"),
+        get(client, "/chargers?city=Zurich&limit=5").headers["ETag"]
+    }
+    assert len(etags) == 4
+    assert get(client, "/chargers?limit=5&city=Zurich").headers["ETag"] in etags
+
+
+def test_etag_follows_path_parameters(client):
+    bump_load_version("transactions")
+    bump_load_version("charger_daily_usage")
+    first = get(client, "/chargers/c1/usage-analytics").headers["ETag"]
+    second = get(client, "/chargers/c2/usage-analytics").headers["ETag"]
+    assert first != second
+    assert get(client, "/chargers/c2/usage-analytics", **{"If-None-Match": first}).status_code == 200
+
+
+def test_compressed_representation_has_its_own_etag(client):
+    bump_load_version("chargers")
+    plain = get(client).headers["ETag"]
+    response = get(client, **{"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == f'{plain[:-1]}-gzip"'
+
+    revalidated = get(client, **{"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+def test_only_data_endpoints_are_tagged(client):
+    bump_load_version("chargers")
+    assert get(client, "/metrics").headers.get("ETag") is None
+    response = client.post("/chargers")
+    response.close()
+    assert response.headers.get("ETag") is None
+
+
+def test_missing_version_directory_is_reported_at_startup(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(conditional_get, "LOAD_VERSION_DIR", str(tmp_path / "missing"))
+    init_conditional_get(Flask(__name__))
+    assert "LOAD_VERSION_DIR" in capsys.readouterr().out
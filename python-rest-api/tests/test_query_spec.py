@@ -0,0 +1,114 @@
+from datetime import date, datetime
+
+import duckdb
+import pytest
+
+from db.backends import DuckDBCursor
+from db.query_spec import QuerySpec, Filter, parse_number, parse_text
+from utils.pagination import build_page, decode_cursor, encode_cursor
+
+READINGS_QUERY = QuerySpec(
+    "readings",
+    ["reading_id", "city", "kwh", "taken_at"],
+    {
+        "city": Filter("city = %s", parse_text),
+        "min_kwh": Filter("kwh >= %s", parse_number)
+    },
+    key=["reading_id"]
+)
+
+READINGS = [
+    ("r1", "Zurich", 3.5, datetime(2024, 1, 1, 8)),
+    ("r2", "Zurich", None, datetime(2024, 1, 1, 9)),
+    ("r3", "Basel", 3.5, None),
+    ("r4", "Basel", 1.0, datetime(2024, 1, 2, 8)),
+    ("r5", "Bern", None, None),
+    ("r6", "Zurich", 7.25, datetime(2024, 1, 1, 8)),
+    ("r7", "Bern", 3.5, datetime(2024, 1, 3, 8))
+]
+
+
+@pytest.fixture
+def cursor():
+    connection = duckdb.connect()
+    connection.execute("CREATE TABLE readings (reading_id VARCHAR, city VARCHAR, kwh DOUBLE, taken_at TIMESTAMP)")
+    connection.executemany("INSERT INTO readings VALUES (?, ?, ?, ?)", READINGS)
+    yield DuckDBCursor(connection)
+    connection.close()
+
+
+def fetch_all_pages(cursor, filters, limit):
+    """Follow `next_cursor` through every page; returns the reading_ids in page order."""
+    seen = []
+    filters = dict(filters)
+    while True:
+        sql, params, order_columns = READINGS_QUERY.build(filters, limit + 1)
+        cursor.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        page = build_page(columns, cursor.fetchall(), limit, order_columns)
+        seen += [row["reading_id"] for row in page["data"]]
+        if page["next_cursor"] is None:
+            return seen
+        filters["cursor"] = page["next_cursor"]
+
+
+def test_cursor_round_trips_typed_values():
+    values = [datetime(2024, 5, 1, 12, 30, 15, 250), date(2024, 5, 1), None, 3.5, 7, "r'1/+"]
+    token = encode_cursor(values)
+    assert "=" not in token and "+" not in token and "/" not in token
+    assert decode_cursor(token, len(values)) == values
+
+
+@pytest.mark.parametrize("token", ["not base64!", encode_cursor(["r1"])[:-2] + "%%", "e30"])
+def test_decode_cursor_rejects_malformed_tokens(token):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(token, 1)
+
+
+def test_decode_cursor_rejects_other_key_length():
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(encode_cursor(["Zurich", "r1"]), 1)
+
+
+def test_cursor_values_are_bound_as_parameters():
+    token = encode_cursor([3.5, "r3"])
+    sql, params, order_columns = READINGS_QUERY.build({"sort": "-kwh", "city": "Basel", "cursor": token}, 11)
+    assert order_columns == ["kwh", "reading_id"]
+    assert "r3" not in sql and "LIMIT 11" in sql
+    assert params == ["Basel", 3.5, 3.5, "r3"]
+
+
+def test_cursor_with_null_value_changes_the_statement_shape():
+    with_value, _, _ = READINGS_QUERY.build({"sort": "kwh", "cursor": encode_cursor([3.5, "r3"])})
+    with_null, params, _ = READINGS_QUERY.build({"sort": "kwh", "cursor": encode_cursor([None, "r2"])})
+    assert with_value != with_null
+    assert "kwh IS NULL" in with_null
+    assert params == ["r2"]
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"sort": "kwh"},
+    {"sort": "-kwh"},
+    {"sort": "city,-taken_at"},
+    {"sort": "-taken_at,kwh"},
+    {"sort": "-reading_id"},
+    {"sort": "kwh", "min_kwh": "2"}
+])
+@pytest.mark.parametrize("limit", [1, 2, 3])
+def test_pages_return_every_row_once_in_order(cursor, filters, limit):
+    sql, params, _ = READINGS_QUERY.build(filters)
+    cursor.execute(sql, params)
+    expected = [row[0] for row in cursor.fetchall()]
+    assert fetch_all_pages(cursor, filters, limit) == expected
+    if "min_kwh" not in filters:
+        assert sorted(expected) == sorted(row[0] for row in READINGS)
+
+
+def test_cursor_matches_key_columns_whatever_case_the_driver_returns():
+    # Redshift lower-cases "kWh_consumed" in cursor.description
+    columns = ["session_id", "kwh_consumed"]
+    rows = [("s1", 1.5), ("s2", 2.5), ("s3", 3.5)]
+    page = build_page(columns, rows, 2, ["kWh_consumed", "session_id"])
+    assert [row["session_id"] for row in page["data"]] == ["s1", "s2"]
+    assert decode_cursor(page["next_cursor"], 2) == [2.5, "s2"]
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import duckdb
+import numpy as np
+import pytest
+
+from duckdb_snapshot import rollup_rebuild_sql, snapshot_table_sql
+from utils.sketches import (
+    QUANTILE_SKETCH_GAMMA, QUANTILE_SKETCH_MIN_VALUE, QUANTILE_SKETCH_RELATIVE_ACCURACY,
+    HLL_REGISTERS, HLL_STANDARD_ERROR,
+    add_values_to_quantile_sketch, decode_quantile_sketch, encode_quantile_sketch, merge_histograms, sketch_quantile,
+    add_values_to_hll, decode_hll, encode_hll, merge_hll, hll_estimate
+)
+
+QUANTILES = (0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0)
+
+
+@pytest.fixture
+def kwh_values():
+    # Session energy is skewed: many short top-ups and a long tail of full charges
+    return np.random.default_rng(7).lognormal(mean=2.5, sigma=1.0, size=20000).round(3)
+
+
+@pytest.mark.parametrize("q", QUANTILES)
+def test_sketch_quantile_is_within_relative_accuracy(kwh_values, q):
+    sketch = add_values_to_quantile_sketch({}, kwh_values)
+    exact = np.quantile(kwh_values, q)  # Linear interpolation, like PERCENTILE_CONT
+    estimate = sketch_quantile(sketch, q, kwh_values.min(), kwh_values.max())
+    assert abs(estimate - exact) <= QUANTILE_SKETCH_RELATIVE_ACCURACY * exact + 1e-12
+
+
+def test_merged_sketches_equal_the_sketch_of_all_values(kwh_values):
+    merged = {}
+    for part in np.array_split(kwh_values, 5):
+        # Every day of the rollup is stored and read back as text
+        merge_histograms(merged, decode_quantile_sketch(encode_quantile_sketch(add_values_to_quantile_sketch({}, part))))
+    assert merged == add_values_to_quantile_sketch({}, kwh_values)
+    for q in QUANTILES:
+        assert sketch_quantile(merged, q) == sketch_quantile(add_values_to_quantile_sketch({}, kwh_values), q)
+
+
+def test_sketch_keeps_sessions_without_energy_in_the_zero_bucket():
+    values = [0.0, 0.0, 0.0, 5.0]
+    sketch = decode_quantile_sketch(encode_quantile_sketch(add_values_to_quantile_sketch({}, values)))
+    assert '"z":3' in encode_quantile_sketch(sketch)
+    assert sketch_quantile(sketch, 0.5) == 0.0
+    assert sketch_quantile(sketch, 1.0, 0.0, 5.0) == pytest.approx(5.0, rel=QUANTILE_SKETCH_RELATIVE_ACCURACY)
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert sketch_quantile({}, 0.5) is None
+    assert decode_quantile_sketch(None) == {}
+
+
+@pytest.mark.parametrize("distinct", [1, 100, 5000, 200000])
+def test_hll_estimate_is_within_error_bounds(distinct):
+    registers = add_values_to_hll({}, (f"user_{i}" for i in range(distinct)))
+    # Three standard errors, and exact counts for tiny sets thanks to linear counting
+    assert abs(hll_estimate(registers) - distinct) <= max(1, 3 * HLL_STANDARD_ERROR * distinct)
+
+
+def test_merged_hlls_estimate_the_union():
+    first = add_values_to_hll({}, (f"user_{i}" for i in range(0, 30000)))
+    second = add_values_to_hll({}, (f"user_{i}" for i in range(20000, 50000)))
+    merged = merge_hll(decode_hll(encode_hll(first)), decode_hll(encode_hll(second)))
+    assert merged == add_values_to_hll({}, (f"user_{i}" for i in range(50000)))
+    assert abs(hll_estimate(merged) - 50000) <= 3 * HLL_STANDARD_ERROR * 50000
+
+
+def test_hll_ignores_missing_and_repeated_users():
+    registers = add_values_to_hll({}, ["a", "b", None, "a", "b"])
+    assert hll_estimate(registers) == 2
+
+
+def test_loader_rollup_sql_builds_the_same_sketches(kwh_values):
+    connection = duckdb.connect()
+    connection.execute(snapshot_table_sql("transactions"))
+    connection.execute(snapshot_table_sql("charger_daily_usage"))
+    start = datetime(2024, 3, 1, 8)
+    rows = [
+        (f"s{i}", f"user_{i % 700}", "c1", start + timedelta(minutes=i), start + timedelta(minutes=i + 30),
+         float(kwh), "completed", "card", 1.0, "CHF")
+        for i, kwh in enumerate(kwh_values[:2000])
+    ]
+    rows.append(("s-zero", "user_0", "c1", start, start + timedelta(minutes=5), 0.0, "completed", "card", 0.0, "CHF"))
+    connection.executemany(f"INSERT INTO transactions VALUES ({', '.join(['?'] * 10)})", rows)
+    connection.execute(rollup_rebuild_sql(
+        "charger_daily_usage", QUANTILE_SKETCH_GAMMA, QUANTILE_SKETCH_MIN_VALUE, HLL_REGISTERS
+    ))
+
+    days = connection.execute(
+        "SELECT usage_date, kwh_sketch, user_hll FROM charger_daily_usage ORDER BY usage_date"
+    ).fetchall()
+    assert len(days) == 2
+    for usage_date, kwh_sketch, user_hll in days:
+        day_rows = [row for row in rows if row[3].date() == usage_date]
+        assert decode_quantile_sketch(kwh_sketch) == add_values_to_quantile_sketch({}, [row[5] for row in day_rows])
+        assert decode_hll(user_hll) == add_values_to_hll({}, [row[1] for row in day_rows])
+    connection.close()
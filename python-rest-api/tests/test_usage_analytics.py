@@ -0,0 +1,157 @@
+import csv
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import controllers.charger_controller as charger_controller
+from controllers.charger_controller import ChargerController, analytics_as_dict
+from db.backends import DuckDBBackend, DuckDBCursor
+from duckdb_snapshot import refresh_duckdb_snapshot
+from table_design import TABLE_COLUMNS
+from utils.cache import ResultCache
+from utils.sketches import (
+    QUANTILE_SKETCH_GAMMA, QUANTILE_SKETCH_MIN_VALUE, QUANTILE_SKETCH_RELATIVE_ACCURACY, HLL_REGISTERS
+)
+
+CHARGER_IDS = ["c1", "c2", "c3", "c-unused"]
+START = "2024-03-02T06:30:00"
+END = "2024-03-08T13:00:00"
+
+FILTER_SETS = [
+    {},
+    {"start_datetime": START, "end_datetime": END},
+    {"start_datetime": START, "end_datetime": END, "status": "completed"},
+    {"start_datetime": "2024-03-03T10:00:00", "end_datetime": "2024-03-03T18:00:00"},
+    {"approx": "true"},
+    {"approx": "true", "start_datetime": START, "end_datetime": END, "quantiles": "0.5,0.9"},
+    {"approx": "true", "end_datetime": END, "status": "failed"}
+]
+
+
+def generate_transactions():
+    rng = random.Random(3)
+    base = datetime(2024, 3, 1)
+    rows = []
+    for i in range(900):
+        start = base + timedelta(minutes=rng.randrange(10 * 24 * 60))
+        failed = rng.random() < 0.1
+        # Some sessions run past midnight or past the end of the window
+        end = None if failed and rng.random() < 0.5 else start + timedelta(minutes=rng.randrange(10, 900))
+        rows.append({
+            "session_id": f"s{i}",
+            "user_id": f"u{rng.randrange(120)}",
+            "charger_id": rng.choice(CHARGER_IDS[:3]),
+            "start_time": start.isoformat(sep=" "),
+            "end_time": end.isoformat(sep=" ") if end else "",
+            "kWh_consumed": "" if rng.random() < 0.05 else f"{rng.lognormvariate(2.5, 1.0):.2f}",
+            "status": "failed" if failed else "completed",
+            "payment_method": "card",
+            "amount": "1.00",
+            "currency": "CHF"
+        })
+    return rows
+
+
+def write_csv(path, table_name, rows):
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=[name for name, _ in TABLE_COLUMNS[table_name]])
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    return generate_transactions()
+
+
+@pytest.fixture(scope="module")
+def backend(tmp_path_factory, transactions):
+    folder = tmp_path_factory.mktemp("snapshot")
+    chargers = [
+        {"charger_id": charger_id, "city": "Zurich", "location_lat": "47.37", "location_lon": "8.54",
+         "installed_at": "2023-01-01 00:00:00"}
+        for charger_id in CHARGER_IDS
+    ]
+    csv_files = [
+        (write_csv(folder / "chargers.csv", "chargers", chargers), "chargers"),
+        (write_csv(folder / "transactions.csv", "transactions", transactions), "transactions")
+    ]
+    # Incremental snapshots rebuild the rollup from the transactions in DuckDB
+    path = refresh_duckdb_snapshot(
+        csv_files, str(folder / "test.duckdb"), True, "charger_daily_usage",
+        QUANTILE_SKETCH_GAMMA, QUANTILE_SKETCH_MIN_VALUE, HLL_REGISTERS
+    )
+    return DuckDBBackend(path)
+
+
+def new_controller(backend):
+    return ChargerController(backend=backend, analytics_cache=ResultCache("test_usage_analytics"))
+
+
+@pytest.mark.parametrize("filters", FILTER_SETS)
+def test_batch_and_single_requests_agree(backend, filters):
+    batch = new_controller(backend).get_usage_analytics_batch(dict(filters, charger_ids=",".join(CHARGER_IDS)))
+    single = new_controller(backend)
+    assert batch == {
+        charger_id: analytics_as_dict(single.get_usage_analytics(charger_id, dict(filters)))
+        for charger_id in CHARGER_IDS
+    }
+
+
+@pytest.mark.parametrize("filters", FILTER_SETS)
+def test_cached_results_agree_whichever_endpoint_computed_them(backend, filters):
+    controller = new_controller(backend)
+    singles = {charger_id: controller.get_usage_analytics(charger_id, dict(filters)) for charger_id in CHARGER_IDS[:2]}
+    batch = controller.get_usage_analytics_batch(dict(filters, charger_ids=",".join(CHARGER_IDS)))
+    fresh = new_controller(backend).get_usage_analytics_batch(dict(filters, charger_ids=",".join(CHARGER_IDS)))
+    assert batch == fresh
+    for charger_id, value in singles.items():
+        assert analytics_as_dict(value) == batch[charger_id]
+    for charger_id in CHARGER_IDS[2:]:
+        assert analytics_as_dict(controller.get_usage_analytics(charger_id, dict(filters))) == batch[charger_id]
+
+
+def test_rollup_answers_match_raw_transactions_within_the_sketch_accuracy(backend, transactions, monkeypatch):
+    filters = {"start_datetime": START, "end_datetime": END}
+    from_rollup = new_controller(backend)._query_usage_analytics(CHARGER_IDS, filters)
+    monkeypatch.setattr(charger_controller, "USAGE_ROLLUP_ENABLED", False)
+    from_raw = new_controller(backend)._query_usage_analytics(CHARGER_IDS, filters)
+    # Everything but the median is exact
+    assert {charger_id: values[:5] for charger_id, values in from_rollup.items()} == {
+        charger_id: pytest.approx([value if value is None else float(value) for value in values[:5]])
+        for charger_id, values in from_raw.items()
+    }
+
+    start, end = datetime.fromisoformat(START), datetime.fromisoformat(END)
+    for charger_id in CHARGER_IDS[:3]:
+        kwh = [
+            float(row["kWh_consumed"]) for row in transactions
+            if row["charger_id"] == charger_id and row["end_time"] and row["kWh_consumed"]
+            and datetime.fromisoformat(row["start_time"]) >= start and datetime.fromisoformat(row["end_time"]) <= end
+        ]
+        assert from_rollup[charger_id][5] == pytest.approx(float(np.median(kwh)), rel=QUANTILE_SKETCH_RELATIVE_ACCURACY)
+
+
+def test_rollup_answers_run_two_queries(backend, monkeypatch):
+    executed = []
+    execute = DuckDBCursor.execute
+    monkeypatch.setattr(DuckDBCursor, "execute", lambda self, sql, params=(): executed.append(sql) or execute(self, sql, params))
+    new_controller(backend)._query_usage_analytics(CHARGER_IDS, {"start_datetime": START, "end_datetime": END})
+    assert len(executed) == 2
+    assert "PERCENTILE_CONT" not in " ".join(executed)
+
+
+def test_approx_batch_runs_the_same_queries_for_any_number_of_chargers(backend, monkeypatch):
+    executed = []
+    execute = DuckDBCursor.execute
+    monkeypatch.setattr(DuckDBCursor, "execute", lambda self, sql, params=(): executed.append(sql) or execute(self, sql, params))
+    filters = {"approx": "true", "start_datetime": START, "end_datetime": END}
+
+    new_controller(backend).get_usage_analytics_batch(dict(filters, charger_ids="c1"))
+    one = len(executed)
+    executed.clear()
+    new_controller(backend).get_usage_analytics_batch(dict(filters, charger_ids=",".join(CHARGER_IDS)))
+    assert len(executed) == one == 2